@@ -0,0 +1,133 @@
+# -*- coding: utf-8 -*-
+"""Card swipe and barcode scanner input for the Tutor Center login system.
+
+USB card readers and barcode scanners ("keyboard wedge" devices) type the
+contents of a card as a burst of keystrokes, much faster than anyone can type
+by hand, usually followed by Return. This module contains the code the login
+system (TCLogin.py) uses to tell a scanned card from typing: the time between
+keystrokes is watched, and a run of keystrokes that arrive close enough
+together is treated as a single scan. The A-number is then read from what the
+card held.
+
+Nothing in this module depends on Tkinter, so a scan can be checked with a
+made-up stream of keystrokes and times (see benchmarks/ScannerBenchmark.py).
+
+Routine Listings
+-----------------
+PAYLOAD_PATTERN Finds an A-number in the contents of a scanned card.
+TRACK_PATTERN   Finds the digits of an A-number on a magnetic stripe track.
+parse_payload   Returns the A-number held by a scanned card.
+BurstDetector   Tells scanned cards apart from keys typed by hand.
+
+"""
+
+import re
+
+# An A-number ("A" followed by 8 digits) anywhere in the contents of a card,
+# for example "A01234567" from a barcode or "%A01234567^STUDENT?" from a
+# magnetic stripe.
+PAYLOAD_PATTERN = re.compile(r'(?<![0-9A-Za-z])[Aa]([0-9]{8})(?![0-9])')
+
+# The 8 digits of an A-number as the first field of track 2 of a magnetic
+# stripe (";01234567=...?"), which can only hold digits.
+TRACK_PATTERN = re.compile(r';([0-9]{8})[=?]')
+
+
+def parse_payload(payload):
+    """Returns the A-number held by a scanned card.
+
+    Parameters
+    ------------
+    payload : str
+        The characters typed by the scanner, without the final Return.
+
+    Returns
+    -------
+    anumber : str or None
+        The A-number, as "A" followed by 8 digits, or None if the card does
+        not hold one.
+
+    """
+    match = PAYLOAD_PATTERN.search(payload) or TRACK_PATTERN.search(payload)
+    if match is None:
+        return None
+    return 'A' + match.group(1)
+
+
+class BurstDetector:
+    """BurstDetector tells scanned cards apart from keys typed by hand.
+
+    Each keystroke is passed to `feed` with the time it was pressed. The
+    keystrokes are collected for as long as each one follows the last within
+    `max_gap` seconds; the collected keystrokes (the burst) end with a
+    terminator (Return), with a longer gap, or with a call to `finish`. A
+    burst of at least `min_length` characters is a scan; shorter bursts were
+    typed by hand and are dropped.
+
+    Attributes
+    ------------
+    max_gap : float
+        The longest time, in seconds, between two keystrokes of a scan.
+        Scanners type a character every few milliseconds; people take 50 ms
+        or more between keys.
+    min_length : int
+        The fewest characters a scan can have.
+    terminators : str
+        The characters that end a scan. They are not part of the payload.
+
+    """
+
+    def __init__(self, max_gap=0.035, min_length=8, terminators='\r\n'):
+        self.max_gap = max_gap
+        self.min_length = min_length
+        self.terminators = terminators
+        self._chars = []
+        self._last = None
+
+    def __len__(self):
+        return len(self._chars)
+
+    def feed(self, char, when):
+        """Adds a single keystroke.
+
+        Parameters
+        ------------
+        char : str
+            The character typed ("\\r" or "\\n" for Return).
+        when : float
+            The time the key was pressed, in seconds (from any fixed start).
+
+        Returns
+        -------
+        payload : str or None
+            The characters of a scan, if this keystroke ended one.
+
+        """
+        payload = None
+        if self._last is not None and when - self._last > self.max_gap:
+            payload = self.finish()
+        if char in self.terminators:
+            if payload is None:
+                payload = self.finish()
+            else:
+                self.finish()
+            return payload
+        self._chars.append(char)
+        self._last = when
+        return payload
+
+    def finish(self):
+        """Ends the current burst of keystrokes.
+
+        Returns
+        -------
+        payload : str or None
+            The characters of the burst, if it was a scan.
+
+        """
+        chars = self._chars
+        self._chars = []
+        self._last = None
+        if len(chars) < self.min_length:
+            return None
+        return ''.join(chars)
@@ -0,0 +1,617 @@
+# -*- coding: utf-8 -*-
+"""Integer codes for the majors, class ranks and courses of the sign-ins.
+
+Every sign-in repeats the same few hundred strings, such as "MEEN/AERO",
+"Graduate Student" and "MAE 5510: Dynamics of Atmospheric Flight". This
+module gives each of those values a small integer code, taken from the
+catalog (CourseCatalog.json, see CourseInfo.py), so the analysis scripts can
+hold years of sign-ins as a few small NumPy arrays instead of millions of
+Python strings.
+
+The codes are kept in a code table file (CategoryCodes.json). A value keeps
+its code for good: codes are only ever added, never changed or reused, so a
+history saved with an older version of the table can always be read with a
+newer one. Each time the catalog changes, the table records a new catalog
+version, and a course that was renamed (the same course number with a new
+name) is linked to its new name, so its sign-ins can be counted under either.
+
+Routine Listings
+-----------------
+FIELDS          The fields of a sign-in given codes.
+CodeTable       The code of every major, class rank and course.
+CodedHistory    Sign-in history held as arrays of codes.
+
+Notes
+------
+To bring the code table up to date with the catalog, or to save the sign-in
+history as codes, run this script from the command line:
+
+    python CategoryCodes.py sync
+    python CategoryCodes.py save --backend sqlite --output SignIns.npz
+
+The saved history can then be loaded by the analysis scripts (for example
+with `--history SignIns.npz` in StaffingForecast.py) in a fraction of a
+second. Code 0 always stands for a missing value. Values not in the catalog
+(for example, courses removed from it before the table was made) are given
+codes the first time they are seen.
+
+"""
+
+import array
+import datetime
+import hashlib
+import json
+import os
+
+import numpy as np
+import pandas as pd
+
+import CourseInfo
+import SignInAnalytics
+import SignInService
+import SignInStorage
+
+# The fields of a SignInRecord given codes, in the order they are in the
+# record (after the A-number).
+FIELDS = ['class_rank', 'major', 'course_prefix', 'course_name']
+
+# The code table file, kept in the same directory as this script.
+TABLE_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                          'CategoryCodes.json')
+
+# The most codes a field can have, so that every code fits in an int16.
+MAX_CODES = np.iinfo(np.int16).max
+
+# The times are held as whole seconds since 1970, with NaT (the smallest
+# int64) for a missing time.
+EPOCH = datetime.datetime(1970, 1, 1)
+SECOND = datetime.timedelta(seconds=1)
+MISSING_TIME = np.iinfo(np.int64).min
+
+
+def _catalog_values(catalog):
+    # Returns the values of each field listed in a CourseCatalog.
+    courses = []
+    for prefix in catalog.prefixes:
+        courses.extend(catalog.courses(prefix))
+    return {'class_rank': list(catalog.ranks), 'major': list(catalog.majors),
+            'course_prefix': list(catalog.prefixes), 'course_name': courses}
+
+
+class CodeTable:
+    """CodeTable holds the code of every major, class rank and course.
+
+    Attributes
+    ------------
+    path : str
+        The code table file.
+    versions : list of dict
+        Each catalog version, oldest first, with its "version" number, the
+        "digest" (SHA-256 hash) of the catalog values, the "date" it was
+        recorded and the number of codes of each field at that time.
+    renamed : dict
+        The code of the new name of each renamed course, by the code of its
+        old name.
+
+    See Also
+    -----------
+    CourseInfo.load_catalog : Reads the catalog the codes are taken from.
+
+    """
+
+    def __init__(self, path=TABLE_FILE):
+        self.path = path
+        try:
+            with open(path, encoding='utf-8') as file:
+                data = json.load(file)
+        except FileNotFoundError:
+            data = {'values': {}, 'renamed': {}, 'versions': []}
+        self._values = {field: data['values'].get(field, [])
+                        for field in FIELDS}
+        self._codes = {field: {value: code for code, value
+                               in enumerate(values, start=1)}
+                       for field, values in self._values.items()}
+        self.renamed = {int(old): new
+                        for old, new in data['renamed'].items()}
+        self.versions = data['versions']
+        self._changed = False
+
+    @property
+    def version(self):
+        """The number of the latest catalog version (0 if there is none)."""
+        return self.versions[-1]['version'] if self.versions else 0
+
+    def __len__(self):
+        return sum(len(values) for values in self._values.values())
+
+    def save(self):
+        """Saves the code table file, if any code was added."""
+        if not self._changed:
+            return
+        data = {'values': self._values,
+                'renamed': {str(old): new
+                            for old, new in sorted(self.renamed.items())},
+                'versions': self.versions}
+        with open(self.path + '.tmp', 'w', encoding='utf-8') as file:
+            json.dump(data, file, indent=1)
+        os.replace(self.path + '.tmp', self.path)
+        self._changed = False
+
+    def sync(self, catalog):
+        """Adds the values of a catalog to the table, as a new version.
+
+        Nothing is added if the catalog has not changed since the latest
+        version. Courses in the table but no longer in the catalog, whose
+        course number is now used by exactly one other course, are recorded
+        as renamed.
+
+        Parameters
+        ------------
+        catalog : CourseInfo.CourseCatalog
+            The catalog.
+
+        Returns
+        -------
+        added : bool
+            True if a new version was recorded.
+
+        """
+        values = _catalog_values(catalog)
+        digest = hashlib.sha256(json.dumps(values, sort_keys=True)
+                                .encode('utf-8')).hexdigest()
+        if self.versions and self.versions[-1]['digest'] == digest:
+            return False
+        for field in FIELDS:
+            for value in values[field]:
+                self.encode(field, value)
+
+        current = set(values['course_name'])
+        for code, name in enumerate(self._values['course_name'], start=1):
+            if name in current:
+                self.renamed.pop(code, None)
+                continue
+            names = catalog.find(name.split(':')[0].strip())
+            if len(names) == 1:
+                self.renamed[code] = self._codes['course_name'][names[0]]
+
+        self.versions.append({
+            'version': self.version + 1, 'digest': digest,
+            'date': datetime.date.today().isoformat(),
+            'sizes': {field: len(self._values[field]) for field in FIELDS}})
+        self._changed = True
+        self.save()
+        return True
+
+    def encode(self, field, value):
+        """Returns the code of a value, giving it a code if it has none.
+
+        Parameters
+        ------------
+        field : str
+            One of `FIELDS`.
+        value : str or None
+            The value. None and "" have code 0.
+
+        Returns
+        -------
+        code : int
+            The code of `value`.
+
+        Raises
+        -------
+        ValueError
+            If the field already has `MAX_CODES` codes.
+
+        """
+        if value is None or value == '':
+            return 0
+        codes = self._codes[field]
+        code = codes.get(value)
+        if code is None:
+            values = self._values[field]
+            if len(values) >= MAX_CODES:
+                raise ValueError("%s has no codes left for %r"
+                                 % (field, value))
+            values.append(value)
+            code = codes[value] = len(values)
+            self._changed = True
+        return code
+
+    def encode_column(self, field, values):
+        """Returns the codes of a column of values, as an int16 array."""
+        indices, unique = pd.factorize(pd.Series(values, dtype=object),
+                                       use_na_sentinel=True)
+        codes = np.array([self.encode(field, value) for value in unique]
+                         + [0], dtype=np.int16)
+        # The missing values have index -1, the 0 at the end of `codes`.
+        return codes[indices]
+
+    def decode(self, field, code):
+        """Returns the value with a code, or None for code 0."""
+        return self._values[field][code - 1] if code else None
+
+    def lookup(self, field):
+        """Returns the values of a field as an array indexed by their code.
+
+        A column of codes is decoded all at once with `lookup(field)[codes]`.
+
+        """
+        return np.array([None] + self._values[field], dtype=object)
+
+    def current(self, field):
+        """Returns the latest code of each code, as an array indexed by code.
+
+        The latest code of a renamed course is the code of its newest name;
+        every other value keeps its own code. A column of codes is mapped to
+        the latest codes all at once with `current(field)[codes]`.
+
+        """
+        latest = np.arange(len(self._values[field]) + 1, dtype=np.int16)
+        if field == 'course_name':
+            for old in self.renamed:
+                new = old
+                seen = set()
+                while new in self.renamed and new not in seen:
+                    seen.add(new)
+                    new = self.renamed[new]
+                latest[old] = new
+        return latest
+
+
+class _AnumberCoder:
+    # Codes A-numbers as int32s. "A" followed by 8 digits is coded as its
+    # digits. Any other A-number (the login system accepts any 9 characters
+    # starting with "A" or "a") is kept in `others`, and coded as -2 minus
+    # its place there, so every A-number can be decoded as it was saved. -1
+    # stands for a missing A-number.
+
+    def __init__(self, others=()):
+        self.others = list(others)
+        self._places = {anumber: place
+                        for place, anumber in enumerate(self.others)}
+
+    def __call__(self, anumber):
+        if not anumber:
+            return -1
+        if anumber[0] == 'A' and \
+                SignInService.ANUMBER_PATTERN.fullmatch(anumber):
+            return int(anumber[1:])
+        place = self._places.get(anumber)
+        if place is None:
+            place = self._places[anumber] = len(self.others)
+            self.others.append(anumber)
+        return -2 - place
+
+
+def _seconds(when):
+    # Returns a time as whole seconds since 1970.
+    if when is None:
+        return MISSING_TIME
+    return (when - EPOCH) // SECOND
+
+
+class CodedHistory:
+    """CodedHistory holds the sign-in history as arrays of codes.
+
+    A sign-in takes 20 bytes: the digits of the A-number as an int32 (or,
+    for the few A-numbers not written as "A" and 8 digits, their place in
+    `other_anumbers`), the
+    codes of the class rank, major, course prefix and course name as int16s,
+    and the sign-in and sign-out times as datetime64[s]. Ten years of
+    sign-ins at a few hundred a day fit in well under 100 MB.
+
+    Attributes
+    ------------
+    table : CodeTable
+        The code table the codes were taken from.
+    version : int
+        The catalog version of the table when the history was coded. The
+        history can be decoded with that version or any later one.
+    anumbers : numpy.ndarray of int32
+        The 8 digits of the A-number of each sign-in, -1 if it had none, or
+        -2 minus its place in `other_anumbers` if it was not "A" followed by
+        8 digits.
+    other_anumbers : list of str
+        The A-numbers not written as "A" followed by 8 digits (for example,
+        with a lower-case "a" or a mistyped digit), which the login system
+        still accepts.
+    columns : dict of numpy.ndarray of int16
+        The codes of each field in `FIELDS`, by field.
+    signed_in : numpy.ndarray of datetime64[s]
+        The sign-in time of each sign-in (NaT if it is missing).
+    signed_out : numpy.ndarray of datetime64[s]
+        The sign-out time of each sign-in (NaT if it has none).
+
+    """
+
+    def __init__(self, table, version, anumbers, columns, signed_in,
+                 signed_out, other_anumbers=()):
+        self.table = table
+        self.version = version
+        self.anumbers = anumbers
+        self.other_anumbers = list(other_anumbers)
+        self.columns = columns
+        self.signed_in = signed_in
+        self.signed_out = signed_out
+
+    def __len__(self):
+        return len(self.anumbers)
+
+    @property
+    def nbytes(self):
+        """The number of bytes held by the arrays."""
+        return (self.anumbers.nbytes + self.signed_in.nbytes
+                + self.signed_out.nbytes
+                + sum(codes.nbytes for codes in self.columns.values()))
+
+    @classmethod
+    def from_rows(cls, rows, table):
+        """Codes an iterable of sign-in records.
+
+        The records are read one at a time and only their codes are kept, so
+        the strings of the records never all need to be in memory at once.
+
+        Parameters
+        ------------
+        rows : iterable of SignInRecord
+            The sign-ins. Blank rows are skipped.
+        table : CodeTable
+            The code table. Values not yet in it are given codes, and the
+            table is saved afterwards.
+
+        """
+        anumbers = array.array('i')
+        coder = _AnumberCoder()
+        columns = [array.array('h') for _ in FIELDS]
+        signed_in = array.array('q')
+        signed_out = array.array('q')
+        encoders = [(column.append, table._codes[field], field)
+                    for column, field in zip(columns, FIELDS)]
+        for row in rows:
+            if row[0] is None:
+                continue
+            anumbers.append(coder(row[0]))
+            for (append, codes, field), value in zip(encoders, row[1:5]):
+                code = codes.get(value)
+                append(code if code is not None
+                       else table.encode(field, value))
+            signed_in.append(_seconds(row[5]))
+            signed_out.append(_seconds(row[6] if len(row) > 6 else None))
+        table.save()
+        return cls(table, table.version,
+                   np.frombuffer(anumbers, dtype=np.int32).copy(),
+                   {field: np.frombuffer(column, dtype=np.int16).copy()
+                    for field, column in zip(FIELDS, columns)},
+                   np.frombuffer(signed_in, dtype='datetime64[s]').copy(),
+                   np.frombuffer(signed_out, dtype='datetime64[s]').copy(),
+                   coder.others)
+
+    @classmethod
+    def from_storage(cls, storage, table, chunk_rows=65536):
+        """Codes the sign-in history saved in a storage backend.
+
+        The SQLite backend is read a chunk of rows at a time, and each chunk
+        is coded a column at a time. Every other backend is read through its
+        `iter_rows` method.
+
+        Parameters
+        ------------
+        storage : SignInStorage.StorageBackend
+            The storage backend holding the sign-ins.
+        table : CodeTable
+            The code table.
+        chunk_rows : int
+            The most rows read from the database at once.
+
+        """
+        if not isinstance(storage, SignInStorage.SQLiteStorage):
+            return cls.from_rows(storage.iter_rows(), table)
+        cursor = storage.connection.execute(
+            "SELECT %s FROM signins ORDER BY id"
+            % ", ".join(SignInStorage.SQLiteStorage.FIELDS))
+        chunks = []
+        coder = _AnumberCoder()
+        while True:
+            rows = cursor.fetchmany(chunk_rows)
+            if not rows:
+                break
+            frame = pd.DataFrame(rows,
+                                 columns=SignInStorage.SQLiteStorage.FIELDS)
+            chunks.append((
+                frame['anumber'].map(coder).to_numpy(np.int32),
+                {field: table.encode_column(field, frame[field])
+                 for field in FIELDS},
+                _times(frame['signed_in']), _times(frame['signed_out'])))
+        table.save()
+        if not chunks:
+            return cls.from_rows([], table)
+        return cls(table, table.version,
+                   np.concatenate([chunk[0] for chunk in chunks]),
+                   {field: np.concatenate([chunk[1][field]
+                                           for chunk in chunks])
+                    for field in FIELDS},
+                   np.concatenate([chunk[2] for chunk in chunks]),
+                   np.concatenate([chunk[3] for chunk in chunks]),
+                   coder.others)
+
+    def save(self, path):
+        """Saves the history to a compressed NumPy (.npz) file."""
+        np.savez_compressed(path, version=self.version,
+                            anumbers=self.anumbers,
+                            signed_in=self.signed_in,
+                            signed_out=self.signed_out,
+                            other_anumbers=np.array(self.other_anumbers,
+                                                    dtype=str),
+                            **self.columns)
+
+    @classmethod
+    def load(cls, path, table):
+        """Loads a history saved with `save`.
+
+        Parameters
+        ------------
+        path : str
+            The .npz file.
+        table : CodeTable
+            The code table the history was coded with, or a later version of
+            it.
+
+        Raises
+        -------
+        ValueError
+            If the history was coded with a later version of the table.
+
+        """
+        with np.load(path) as data:
+            version = int(data['version'])
+            if version > table.version:
+                raise ValueError("%s was coded with catalog version %d, but "
+                                 "the code table is only at version %d"
+                                 % (path, version, table.version))
+            # Histories saved before `other_anumbers` was kept have none.
+            others = (data['other_anumbers'].tolist()
+                      if 'other_anumbers' in data.files else [])
+            return cls(table, version, data['anumbers'],
+                       {field: data[field] for field in FIELDS},
+                       data['signed_in'], data['signed_out'], others)
+
+    def decode(self, field, current=False):
+        """Returns the values of a field, as an array of str (or None).
+
+        Parameters
+        ------------
+        field : str
+            One of `FIELDS`.
+        current : bool
+            If True, renamed courses are given their newest name.
+
+        """
+        codes = self.columns[field]
+        if current:
+            codes = self.table.current(field)[codes]
+        return self.table.lookup(field)[codes]
+
+    def iter_rows(self):
+        """Yields the sign-ins as SignInRecords."""
+        lookups = [self.table.lookup(field) for field in FIELDS]
+        columns = [lookup[self.columns[field]].tolist()
+                   for lookup, field in zip(lookups, FIELDS)]
+        others = self.other_anumbers
+        anumbers = ['A%08d' % number if number >= 0
+                    else None if number == -1 else others[-2 - number]
+                    for number in self.anumbers.tolist()]
+        times = [[None if np.isnat(when) else when.item()
+                  for when in times]
+                 for times in (self.signed_in, self.signed_out)]
+        for record in zip(anumbers, *columns, *times):
+            yield SignInStorage.SignInRecord(*record)
+
+    def counts(self, current=False):
+        """Counts the visits in the history.
+
+        The visits are counted with `numpy.bincount`, one category at a
+        time, without decoding a single sign-in.
+
+        Parameters
+        ------------
+        current : bool
+            If True, the visits to a renamed course are counted under its
+            newest name.
+
+        Returns
+        -------
+        counts : SignInAnalytics.SignInCounts
+            The visit counts.
+
+        """
+        counts = SignInAnalytics.SignInCounts()
+        counts.total = len(self)
+        attributes = {'class_rank': 'by_rank', 'major': 'by_major',
+                      'course_prefix': 'by_prefix', 'course_name': 'by_course'}
+        for field in FIELDS:
+            codes = self.columns[field]
+            if current:
+                codes = self.table.current(field)[codes]
+            lookup = self.table.lookup(field)
+            counter = getattr(counts, attributes[field])
+            totals = np.bincount(codes, minlength=len(lookup))
+            for code in np.flatnonzero(totals):
+                counter[lookup[code]] += int(totals[code])
+
+        known = ~np.isnat(self.signed_in)
+        seconds = self.signed_in[known].astype(np.int64)
+        hours = np.bincount(seconds // 3600 % 24, minlength=24)
+        # 1 January 1970 was a Thursday (weekday 3).
+        weekdays = np.bincount((seconds // 86400 + 3) % 7, minlength=7)
+        for hour in np.flatnonzero(hours):
+            counts.by_hour[int(hour)] = int(hours[hour])
+        for weekday in np.flatnonzero(weekdays):
+            counts.by_weekday[SignInAnalytics.WEEKDAYS[weekday]] = \
+                int(weekdays[weekday])
+        missing = len(self) - int(known.sum())
+        if missing:
+            counts.by_hour[None] = missing
+            counts.by_weekday[None] = missing
+        return counts
+
+
+def _times(column):
+    # Converts a column of ISO 8601 timestamps (as saved by the SQLite
+    # backend) to datetime64[s], with NaT for missing or unreadable times.
+    return pd.to_datetime(column, format='ISO8601', errors='coerce') \
+        .to_numpy('datetime64[s]')
+
+
+# This section updates the code table or saves the coded history from the
+# command line. See the module notes above for an example.
+if __name__ == '__main__':
+    import argparse
+    import time
+
+    parser = argparse.ArgumentParser(description=("Integer codes for the "
+                                                  "Tutor Center sign-ins."))
+    parser.add_argument('command', choices=['sync', 'save'],
+                        help="update the code table, or save the history")
+    parser.add_argument('--table', default=TABLE_FILE,
+                        help="code table file")
+    parser.add_argument('--catalog', default=CourseInfo.CATALOG_FILE,
+                        help="catalog file")
+    parser.add_argument('--backend', default='workbook',
+                        choices=['workbook', 'journal', 'sqlite'],
+                        help="where the sign-ins are saved")
+    parser.add_argument('--workbook', default='Masterfile.xlsx',
+                        help="spreadsheet holding the sign-ins")
+    parser.add_argument('--journal', default='SignInJournal',
+                        help="folder holding the sign-in journal")
+    parser.add_argument('--database', default='SignIns.db',
+                        help="SQLite database holding the sign-ins")
+    parser.add_argument('--output', default='SignIns.npz',
+                        help="file to save the coded history to")
+    arguments = parser.parse_args()
+
+    codes = CodeTable(arguments.table)
+    if codes.sync(CourseInfo.load_catalog(arguments.catalog)):
+        print("Recorded catalog version %d in %s."
+              % (codes.version, arguments.table))
+    else:
+        print("The code table is up to date (catalog version %d)."
+              % codes.version)
+
+    if arguments.command == 'save':
+        started = time.perf_counter()
+        if arguments.backend == 'workbook':
+            history = CodedHistory.from_rows(
+                SignInAnalytics.workbook_rows(arguments.workbook), codes)
+        else:
+            if arguments.backend == 'sqlite':
+                storage = SignInStorage.SQLiteStorage(arguments.database)
+            else:
+                storage = SignInStorage.JournalStorage(arguments.journal)
+            try:
+                history = CodedHistory.from_storage(storage, codes)
+            finally:
+                storage.close()
+        history.save(arguments.output)
+        print("Saved %d sign-ins (%.1f MB of arrays) to %s in %.2f s."
+              % (len(history), history.nbytes / 1e6, arguments.output,
+                 time.perf_counter() - started))
@@ -0,0 +1,400 @@
+# -*- coding: utf-8 -*-
+"""Columnar (Parquet or Arrow) export of the Tutor Center sign-ins.
+
+This module exports the sign-ins, from the "Main Data" sheet of
+Masterfile.xlsx or from any of the storage backends in SignInStorage.py, to
+Parquet or Arrow files that data analysis tools can scan quickly. The
+sign-ins are read and written a fixed number of rows (a chunk) at a time, so
+the memory used stays the same however many sign-ins there are. The major,
+class rank, course prefix and course name columns are dictionary encoded:
+each different value is stored once, and each sign-in only holds a small
+integer for it.
+
+Each export adds a new file to the export folder holding only the sign-ins
+added since the last export from the same source, so the folder can be read
+as a single dataset (for example with `pyarrow.dataset.dataset(folder)` or
+`pandas.read_parquet(folder)`).
+
+Routine Listings
+-----------------
+SCHEMA          The Arrow schema of the exported sign-ins.
+record_batches  Converts sign-ins to Arrow record batches, a chunk at a time.
+ColumnarExport  Folder of exported files, added to by each export.
+
+Notes
+------
+To export the sign-ins not yet exported, run this script from the command
+line:
+
+    python ColumnarExport.py --backend sqlite --database SignIns.db
+
+Use `--backend workbook` to read Masterfile.xlsx, and `--format arrow` to
+write Arrow IPC files instead of Parquet. Each sign-in is exported as it was
+at the time of the export, so a visit signed out of later keeps an empty
+sign-out time; to export every sign-in again as it is now, use `--full` with
+a new `--output` folder.
+
+"""
+
+import collections
+import datetime
+import itertools
+import json
+import os
+
+import pyarrow as pa
+import pyarrow.ipc
+import pyarrow.parquet as pq
+
+import SignInStorage
+
+# The columns dictionary encoded, with the categories they hold.
+DICTIONARY_FIELDS = ['class_rank', 'major', 'course_prefix', 'course_name']
+
+# The Arrow schema of the exported sign-ins: the fields of a SignInRecord,
+# and the length of each visit in minutes.
+SCHEMA = pa.schema(
+    [('anumber', pa.string())]
+    + [(field, pa.dictionary(pa.int32(), pa.string()))
+       for field in DICTIONARY_FIELDS]
+    + [('signed_in', pa.timestamp('s')), ('signed_out', pa.timestamp('s')),
+       ('minutes', pa.int32())])
+
+
+class _Dictionary:
+    # The values of one dictionary-encoded column, in the order they were
+    # first seen. The dictionary only grows, so every batch written to one
+    # file can share it.
+
+    def __init__(self):
+        self.values = []
+        self.codes = {}
+
+    def encode(self, values):
+        codes = self.codes
+        indices = []
+        for value in values:
+            if value is None:
+                indices.append(None)
+                continue
+            code = codes.get(value)
+            if code is None:
+                code = codes[value] = len(self.values)
+                self.values.append(value)
+            indices.append(code)
+        return pa.DictionaryArray.from_arrays(
+            pa.array(indices, pa.int32()), pa.array(self.values, pa.string()))
+
+
+def record_batches(rows, chunk_rows=65536):
+    """Converts sign-ins to Arrow record batches, a chunk at a time.
+
+    Parameters
+    ------------
+    rows : iterable of SignInRecord
+        The sign-ins. Blank rows are skipped.
+    chunk_rows : int
+        The most sign-ins in each batch.
+
+    Yields
+    -------
+    batch : pyarrow.RecordBatch
+        The next chunk of sign-ins, with the columns of `SCHEMA`.
+
+    """
+    dictionaries = {field: _Dictionary() for field in DICTIONARY_FIELDS}
+    rows = iter(rows)
+    while True:
+        chunk = list(itertools.islice(rows, chunk_rows))
+        if not chunk:
+            return
+        chunk = [row for row in chunk if row[0] is not None]
+        if not chunk:
+            continue
+        columns = list(zip(*[tuple(row[:5]) + (row[5], _row_out(row))
+                             for row in chunk]))
+        minutes = [None if out is None or into is None
+                   else round((out - into).total_seconds() / 60)
+                   for into, out in zip(columns[5], columns[6])]
+        arrays = [pa.array(columns[0], pa.string())]
+        arrays += [dictionaries[field].encode(columns[number])
+                   for number, field in enumerate(DICTIONARY_FIELDS, start=1)]
+        arrays += [pa.array(columns[5], pa.timestamp('s')),
+                   pa.array(columns[6], pa.timestamp('s')),
+                   pa.array(minutes, pa.int32())]
+        yield pa.record_batch(arrays, schema=SCHEMA)
+
+
+def _row_out(row):
+    # Returns the sign-out time of a sign-in, which older records lack.
+    return row[6] if len(row) > 6 else None
+
+
+class ColumnarExport:
+    """ColumnarExport is a folder of exported files, added to by each export.
+
+    The files are named part-00000.parquet, part-00001.parquet and so on
+    (".arrow" for Arrow IPC files). The folder also holds a checkpoint
+    (_export.json) recording, for each source, how many of its sign-ins have
+    been exported and which was the last, so the next export only reads
+    past them. If the last sign-in exported is no longer where it was (for
+    example, because the Masterfile's past semesters were archived), the
+    sign-ins after it are found by their time instead: the checkpoint also
+    records the latest sign-in time exported and the A-numbers of every
+    sign-in exported at that time, so sign-ins made at the same second are
+    neither exported twice nor missed.
+
+    Attributes
+    ------------
+    directory : str
+        The folder holding the exported files.
+    format : str
+        "parquet" or "arrow".
+    chunk_rows : int
+        The most sign-ins read and written at once.
+
+    """
+
+    EXTENSIONS = {'parquet': '.parquet', 'arrow': '.arrow'}
+
+    def __init__(self, directory='SignInExport', format='parquet',
+                 chunk_rows=65536):
+        if format not in self.EXTENSIONS:
+            raise ValueError("Unknown export format: %r" % format)
+        self.directory = directory
+        self.format = format
+        self.chunk_rows = chunk_rows
+        os.makedirs(directory, exist_ok=True)
+        try:
+            with open(self._checkpoint_path(), encoding='utf-8') as file:
+                self._checkpoint = json.load(file)
+        except (OSError, ValueError):
+            self._checkpoint = {'parts': 0, 'sources': {}}
+
+    def _checkpoint_path(self):
+        # Names starting with "_" are skipped by tools reading the folder as
+        # a dataset.
+        return os.path.join(self.directory, '_export.json')
+
+    def _save_checkpoint(self):
+        path = self._checkpoint_path()
+        with open(path + '.tmp', 'w', encoding='utf-8') as file:
+            json.dump(self._checkpoint, file, indent=1)
+        os.replace(path + '.tmp', path)
+
+    def files(self):
+        """Returns the paths of the exported files, oldest first."""
+        return sorted(os.path.join(self.directory, name)
+                      for name in os.listdir(self.directory)
+                      if name.startswith('part-'))
+
+    def export(self, source, key, full=False):
+        """Exports the sign-ins of a source not yet exported to a new file.
+
+        Parameters
+        ------------
+        source : callable
+            Returns an iterable of every sign-in of the source, oldest first,
+            each time it is called (for example, the `iter_rows` method of a
+            storage backend). It is called a second time only if the source
+            changed since the last export.
+        key : str
+            Names the source in the checkpoint.
+        full : bool
+            If True, every sign-in is exported, as if none had been before.
+
+        Returns
+        -------
+        exported : int
+            The number of sign-ins exported.
+
+        """
+        done = {} if full else self._checkpoint['sources'].get(key, {})
+        counted = []
+        progress = _Progress(done)
+        rows = progress.follow(self._new_rows(source, done, counted))
+
+        number = self._checkpoint['parts']
+        name = 'part-%05d%s' % (number, self.EXTENSIONS[self.format])
+        path = os.path.join(self.directory, name)
+        temporary = os.path.join(self.directory, '_' + name)
+        exported = 0
+        writer = None
+        try:
+            for batch in record_batches(rows, self.chunk_rows):
+                if writer is None:
+                    writer = self._open(temporary)
+                writer.write_batch(batch)
+                exported += batch.num_rows
+            if writer is not None:
+                writer.close()
+                os.replace(temporary, path)
+        except BaseException:
+            # A file that could not be finished is not left in the folder.
+            if writer is not None:
+                try:
+                    writer.close()
+                except Exception:
+                    pass
+            if os.path.exists(temporary):
+                os.remove(temporary)
+            raise
+        if writer is not None:
+            self._checkpoint['parts'] = number + 1
+
+        # `counted` holds the number of the source's rows read, including the
+        # ones skipped; the checkpoint is only saved once the file is.
+        entry = progress.entry()
+        entry['rows'] = counted[0] if counted else done.get('rows', 0)
+        self._checkpoint['sources'][key] = entry
+        self._save_checkpoint()
+        return exported
+
+    def _open(self, path):
+        # Opens a writer for one new exported file.
+        if self.format == 'parquet':
+            return pq.ParquetWriter(path, SCHEMA, compression='zstd')
+        options = pa.ipc.IpcWriteOptions(emit_dictionary_deltas=True)
+        return pa.ipc.new_file(path, SCHEMA, options=options)
+
+    def _new_rows(self, source, done, counted):
+        # Yields the rows of the source after the last one exported, and
+        # puts the number of rows the source had in `counted` at the end.
+        skip = done.get('rows', 0)
+        last = done.get('last')
+        total = 0
+        rows = iter(source())
+        previous = None
+        for previous in itertools.islice(rows, skip):
+            total += 1
+        if last is None or (total == skip and previous is not None
+                            and _key(previous) == tuple(last)):
+            for row in rows:
+                total += 1
+                yield row
+            counted.append(total)
+            return
+
+        # The source changed since the last export, so the rows after the
+        # last one exported are found by their time. The rows at the latest
+        # time exported are only skipped as many times as they were exported
+        # (checkpoints saved before the A-numbers were recorded only hold the
+        # last sign-in).
+        last_time, at_time = _latest(done)
+        total = 0
+        for row in source():
+            total += 1
+            signed_in = row[5]
+            if last_time is not None and (signed_in is None
+                                          or signed_in < last_time):
+                continue
+            if signed_in == last_time and at_time[row[0]] > 0:
+                at_time[row[0]] -= 1
+                continue
+            yield row
+        counted.append(total)
+
+
+class _Progress:
+    # Follows the sign-ins exported, for the checkpoint: the last one, the
+    # latest sign-in time, and the A-numbers of the sign-ins at that time.
+
+    def __init__(self, done):
+        self.last = done.get('last')
+        self.time, self.at_time = _latest(done)
+
+    def follow(self, rows):
+        # Yields the rows, noting each one that will be exported.
+        for row in rows:
+            if row[0] is not None:
+                self.last = list(_key(row))
+                signed_in = row[5]
+                if signed_in is None:
+                    pass
+                elif self.time is None or signed_in > self.time:
+                    self.time = signed_in
+                    self.at_time = collections.Counter([row[0]])
+                elif signed_in == self.time:
+                    self.at_time[row[0]] += 1
+            yield row
+
+    def entry(self):
+        # Returns the checkpoint entry of the source, without its row count.
+        return {'last': self.last,
+                'time': None if self.time is None else self.time.isoformat(),
+                'at_time': sorted(self.at_time.elements())}
+
+
+def _latest(done):
+    # Returns the latest sign-in time exported, and a Counter of the
+    # A-numbers of the sign-ins exported at that time.
+    if 'time' in done:
+        time = done['time']
+        return (None if time is None
+                else datetime.datetime.fromisoformat(time),
+                collections.Counter(done.get('at_time', [])))
+    last = done.get('last')
+    if last is None or last[1] is None:
+        return None, collections.Counter()
+    return (datetime.datetime.fromisoformat(last[1]),
+            collections.Counter([last[0]]))
+
+
+def _key(row):
+    # Returns what identifies a sign-in in the checkpoint.
+    if row[5] is None:
+        return (row[0], None)
+    return (row[0], row[5].isoformat())
+
+
+# This section runs the export from the command line. See the module notes
+# above for an example.
+if __name__ == '__main__':
+    import argparse
+
+    import SignInAnalytics
+
+    parser = argparse.ArgumentParser(description=("Columnar export of the "
+                                                  "Tutor Center sign-ins."))
+    parser.add_argument('--backend', default='workbook',
+                        choices=['workbook', 'journal', 'sqlite'],
+                        help="where the sign-ins are saved")
+    parser.add_argument('--workbook', default='Masterfile.xlsx',
+                        help="spreadsheet holding the sign-ins")
+    parser.add_argument('--journal', default='SignInJournal',
+                        help="folder holding the sign-in journal")
+    parser.add_argument('--database', default='SignIns.db',
+                        help="SQLite database holding the sign-ins")
+    parser.add_argument('--output', default='SignInExport',
+                        help="folder to export the sign-ins to")
+    parser.add_argument('--format', default='parquet',
+                        choices=['parquet', 'arrow'],
+                        help="file format to export to")
+    parser.add_argument('--chunk-rows', type=int, default=65536,
+                        help="sign-ins read and written at once")
+    parser.add_argument('--full', action='store_true',
+                        help="export every sign-in, not only the new ones")
+    arguments = parser.parse_args()
+
+    exporter = ColumnarExport(arguments.output, arguments.format,
+                              arguments.chunk_rows)
+    storage = None
+    if arguments.backend == 'workbook':
+        key = 'workbook:%s' % os.path.abspath(arguments.workbook)
+
+        def source():
+            return SignInAnalytics.workbook_rows(arguments.workbook)
+    else:
+        if arguments.backend == 'sqlite':
+            storage = SignInStorage.SQLiteStorage(arguments.database)
+            key = 'sqlite:%s' % os.path.abspath(arguments.database)
+        else:
+            storage = SignInStorage.JournalStorage(arguments.journal)
+            key = 'journal:%s' % os.path.abspath(arguments.journal)
+        source = storage.iter_rows
+    try:
+        count = exporter.export(source, key, arguments.full)
+    finally:
+        if storage is not None:
+            storage.close()
+    print("Exported %d sign-ins to %s." % (count, arguments.output))
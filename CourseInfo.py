@@ -3,23 +3,298 @@
 
 This file contains the information accessible to the Tutor Center login system
 (TCLogin.py), including major, class rank, course prefix, and course name
-lists. This class is considered a living document, and should be updated as
-needed to meet the needs of the Tutor Center.
+lists. The information itself is kept in the catalog file CourseCatalog.json,
+which is considered a living document, and should be updated as needed to meet
+the needs of the Tutor Center.
+
+Routine Listings
+-----------------
+CatalogError    Raised when the catalog file contains a mistake.
+CourseCatalog   Class indexing the courses by prefix and course number.
+load_catalog    Reads, checks and caches the catalog file.
+CourseInfo      Class housing the options shown in the login system menus.
 
 Notes
 ------
-If you wish to add to any list, add the new value to the corresponding
-location (i.e. `majoroptions`, `rankoptions`, etc.), making sure that the entry
-is in double quotes and seperated from the other options by a comma and a
-newline. Also make sure that you enter your new item between the [ ].
-Some sections have additional steps that must be followed when adding a new
-value. These sections are the `prefixoptions` attribute and the
-`populate_names` method. See the in-line comments preceding those sections for
-more information.
+If you wish to add to any list, add the new value to the corresponding list
+("majors", "ranks", or the list under the course prefix in "courses") in
+CourseCatalog.json, making sure that the entry is in double quotes and
+seperated from the other options by a comma and a newline. Also make sure that
+you enter your new item between the [ ]. Each course must be written as
+"PREFIX NNNN: Course Name". To add a new course prefix, add a new
+"PREFIX": [...] entry to "courses"; the prefix menu and course name menu pick
+it up automatically.
+
+The catalog may also be given as a TOML file with the same layout, or as a CSV
+file with a "category" column ("major", "rank" or "course") and a "value"
+column, which makes it easy to load a course list exported by the registrar.
+
+The catalog file is checked for mistakes (duplicate entries and courses not in
+the "PREFIX NNNN: Course Name" form) every time it changes, and a
+CatalogError describing every mistake is raised if any are found. The checked
+catalog is saved to CourseCatalog.cache so that it does not need to be read
+again until the catalog file changes.
+
+After changing the catalog, run `python CategoryCodes.py sync` to give the new
+values their integer codes (see CategoryCodes.py). Rename a course by changing
+its name but keeping its course number, so that its earlier sign-ins are
+linked to the new name.
 
 CoE => College of Engineering
 """
 
+import csv
+import hashlib
+import json
+import os
+import pickle
+import re
+
+
+# The catalog file, and the cache of the checked catalog, kept in the same
+# directory as this script.
+CATALOG_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                            'CourseCatalog.json')
+CACHE_FILE = os.path.splitext(CATALOG_FILE)[0] + '.cache'
+
+# The format of the cache file. Raise it whenever what is cached changes, so
+# older caches are read again rather than unpickled into the wrong shape.
+CACHE_VERSION = 1
+
+# The form every course must be written in, e.g. "MAE 2300: Thermodynamics 1".
+# The course name may not contain another "PREFIX NNNN:", which catches two
+# courses run together by a missing comma.
+COURSE_PATTERN = re.compile(r'([A-Z]{2,5}) (\d{4}): '
+                            r'(?:(?![A-Z]{2,5} \d{4}:)\S)'
+                            r'(?:(?![A-Z]{2,5} \d{4}:).)*')
+
+
+class CatalogError(ValueError):
+    """CatalogError is raised when the catalog file contains a mistake.
+
+    Attributes
+    ------------
+    problems : list of str
+        A description of each mistake found in the catalog file.
+
+    """
+
+    def __init__(self, path, problems):
+        self.problems = problems
+        super().__init__("%s has %d problem(s):\n    %s"
+                         % (path, len(problems), "\n    ".join(problems)))
+
+
+class CourseCatalog:
+    """CourseCatalog indexes the courses offered by the Tutor Center.
+
+    The catalog is built once from a dictionary of courses listed under their
+    course prefix. Building it sorts the courses under each prefix and creates
+    two indexes: one from each course prefix to its sorted courses, and a
+    reverse index from each course number (e.g. "MAE 2300") to the course
+    names with that number. Looking up the courses for a prefix, or a course
+    from its number, therefore takes the same time no matter how many courses
+    are in the catalog.
+
+    Attributes
+    ------------
+    majors : list of str
+        All of the majors, in the order they are listed in the catalog file.
+    ranks : list of str
+        All of the class ranks, in the order they are listed in the catalog
+        file.
+    prefixes : list of str
+        All of the course prefixes in the catalog, in alphabetical order.
+
+    See Also
+    -----------
+    load_catalog : Reads the catalog from the catalog file.
+
+    """
+
+    def __init__(self, courses, majors=(), ranks=()):
+        self.majors = list(majors)
+        self.ranks = list(ranks)
+        self._by_prefix = {}
+        self._by_number = {}
+        for prefix, names in courses.items():
+            self._by_prefix[prefix] = sorted(names)  # Sorts by course number.
+            for name in self._by_prefix[prefix]:
+                number = name.split(":")[0].strip()
+                self._by_number.setdefault(number, []).append(name)
+        self.prefixes = sorted(self._by_prefix)
+
+    def __contains__(self, prefix):
+        return prefix in self._by_prefix
+
+    def __len__(self):
+        return sum(len(names) for names in self._by_prefix.values())
+
+    def courses(self, prefix):
+        """Returns the sorted list of courses under a course prefix.
+
+        Parameters
+        ------------
+        prefix : str
+            The course prefix, e.g. "MAE".
+
+        Returns
+        -------
+        course_names : list of str
+            The courses under `prefix`, sorted by course number.
+
+        Raises
+        -------
+        KeyError
+            If `prefix` is not in the catalog.
+
+        """
+        try:
+            return self._by_prefix[prefix]
+        except KeyError:
+            raise KeyError("%r is not a course prefix in the catalog"
+                           % prefix) from None
+
+    def find(self, number):
+        """Returns the courses with a course number, e.g. "MAE 2300".
+
+        Parameters
+        ------------
+        number : str
+            The course prefix and number, separated by a space.
+
+        Returns
+        -------
+        course_names : list of str
+            The courses with that number (usually only one). Empty if no course
+            has that number.
+
+        """
+        return self._by_number.get(number, [])
+
+
+def _read_catalog(path):
+    # Reads the majors, ranks and courses from a JSON, TOML or CSV catalog
+    # file, without checking them.
+    extension = os.path.splitext(path)[1].lower()
+    if extension == '.csv':
+        data = {'majors': [], 'ranks': [], 'courses': {}}
+        with open(path, newline='', encoding='utf-8') as file:
+            for row in csv.DictReader(file):
+                category = row['category'].strip().lower()
+                value = row['value'].strip()
+                if category == 'major':
+                    data['majors'].append(value)
+                elif category == 'rank':
+                    data['ranks'].append(value)
+                else:
+                    prefix = value.split(' ')[0]
+                    data['courses'].setdefault(prefix, []).append(value)
+        return data
+    with open(path, 'rb') as file:
+        if extension == '.toml':
+            import tomllib
+            return tomllib.load(file)
+        return json.load(file)
+
+
+def _check_catalog(path, data):
+    # Returns a list describing every mistake in the catalog read from `path`.
+    problems = []
+    for key in ('majors', 'ranks'):
+        seen = set()
+        for value in data.get(key, []):
+            if value in seen:
+                problems.append("%s: %r is listed twice" % (key, value))
+            seen.add(value)
+    for prefix, names in data.get('courses', {}).items():
+        seen = set()
+        for name in names:
+            match = COURSE_PATTERN.fullmatch(name)
+            if match is None:
+                problems.append("%s: %r is not in the form "
+                                "\"PREFIX NNNN: Course Name\""
+                                % (prefix, name))
+            elif match.group(1) != prefix:
+                problems.append("%s: %r is listed under the wrong prefix"
+                                % (prefix, name))
+            if name in seen:
+                problems.append("%s: %r is listed twice" % (prefix, name))
+            seen.add(name)
+    if not data.get('courses'):
+        problems.append("no courses are listed")
+    return problems
+
+
+def load_catalog(path=CATALOG_FILE, cache=CACHE_FILE):
+    """Reads, checks and caches the catalog file.
+
+    The checked catalog is saved to `cache` along with the modification time
+    and SHA-256 hash of the catalog file. The next time the catalog is loaded,
+    the cache is used as long as the catalog file has the same modification
+    time, or (if it was only touched) the same contents, so the catalog file
+    is only read and checked again after it has changed. A cache written by
+    a different `CACHE_VERSION` or an older copy of this module (whose
+    CourseCatalog may no longer match the one pickled) is not used.
+
+    Parameters
+    ------------
+    path : str
+        Path to the catalog file (.json, .toml or .csv).
+    cache : str or None
+        Path to the cache file. If None, no cache is used.
+
+    Returns
+    -------
+    catalog : CourseCatalog
+        The checked catalog.
+
+    Raises
+    -------
+    CatalogError
+        If the catalog file contains a mistake.
+
+    """
+    mtime = os.stat(path).st_mtime_ns
+    version = [CACHE_VERSION, os.stat(__file__).st_mtime_ns]
+    cached = None
+    if cache is not None and os.path.exists(cache):
+        try:
+            with open(cache, 'rb') as file:
+                cached = pickle.load(file)
+        except Exception:
+            cached = None
+    if not isinstance(cached, dict) or cached.get('version') != version:
+        cached = None
+    if cached is not None and cached['path'] == os.path.abspath(path):
+        if cached['mtime'] == mtime:
+            return cached['catalog']
+
+    with open(path, 'rb') as file:
+        digest = hashlib.sha256(file.read()).hexdigest()
+    if cached is not None and cached['digest'] == digest:
+        catalog = cached['catalog']
+    else:
+        data = _read_catalog(path)
+        problems = _check_catalog(path, data)
+        if problems:
+            raise CatalogError(path, problems)
+        catalog = CourseCatalog(data['courses'], data.get('majors', []),
+                                data.get('ranks', []))
+
+    # Saves the cache. A kiosk that cannot write to the folder still works;
+    # it just reads the catalog file each time it starts.
+    if cache is not None:
+        try:
+            with open(cache + '.tmp', 'wb') as file:
+                pickle.dump({'version': version,
+                             'path': os.path.abspath(path), 'mtime': mtime,
+                             'digest': digest, 'catalog': catalog}, file)
+            os.replace(cache + '.tmp', cache)
+        except OSError:
+            pass
+    return catalog
+
 
 class CourseInfo:
     """CourseInfo contains information used by the Tutor Center login system.
@@ -35,6 +310,8 @@ class CourseInfo:
         Contains all of the possible choices of major in the CoE.
     rankoptions : list of str
         Contains all of the possible choices of class rank.
+    catalog : CourseCatalog
+        Index of all of the courses in the catalog file.
     prefixoptions : list of str
         Contains all of the possible choices for course prefix.
     ENGRoptions : list of str
@@ -69,10 +346,15 @@ class CourseInfo:
     See Also
     -----------
     TCLogin.py
-    numpy.sort : Sorts a list alphanumerically.
+    CourseCatalog.json : The catalog file.
+    load_catalog : Reads, checks and caches the catalog file.
 
     Notes
     -------
+    The `majoroptions`, `rankoptions`, `prefixoptions` and per-prefix
+    "options" lists (e.g. `MAEoptions`) are views of `catalog` kept so that
+    older scripts using them keep working.
+
     Note that all of the options presented here are directly from the 2018-2019
     course list for each of the majors in the CoE.
 
@@ -83,269 +365,26 @@ class CourseInfo:
 
     """
 
-    # This is a list of available majors.
-    majoroptions = [
-                    "BIEN",
-                    "CIEN",
-                    "CMPE",
-                    "COSC",
-                    "ELEN",
-                    "ENVE",
-                    "GENG",
-                    "MEEN/AERO",
-                    "OTHER"
-                    ]
-
-    # This is a list of the class ranks.
-    rankoptions = [
-                   "Freshman",
-                   "Sophmore",
-                   "Junior",
-                   "Senior",
-                   "Graduate Student"
-                   ]
-
-    # This is a list of course prefixes.
-    # ADDING A NEW ITEM:
-    # -------------------
-    # When adding a new item to this list, you need to add another `else`
-    # statement to the `populate_names` method. See that section for
-    # further instructions.
-    prefixoptions = [
-                     "BENG",
-                     "BIOL",
-                     "CEE",
-                     "CHEM",
-                     "CS",
-                     "ECE",
-                     "ENGR",
-                     "GEOL",
-                     "MAE",
-                     "MATH",
-                     "MGT",
-                     "PHYS",
-                     "PSC",
-                     "STAT"
-                     ]
-
-    # This contains all of the BENG-prefixed courses.
-    BENGoptions = [
-        "BENG 1000: Intro to Undergraduate Research",
-        "BENG 1880: Quantitative Biological Systems",
-        "BENG 2300: Properties of Biomaterials",
-        "BENG 2400: Thermodynamics",
-        "BENG 3200: Intro to Unit Operations",
-        "BENG 3500: Fluid Mechanics",
-        "BENG 3870: Biol. Engr. Design 1",
-        "BENG 3000: Instrumentation for Biol. Sys.",
-        "BENG 3670: Transport Phenomena",
-        "BENG 4880: Biol. Engr. Design 2",
-        "BENG 4890: Biol. Engr. Design 3",
-        "BENG 4250: Cooperative Practice"
-    ]
-    BENGoptions = sorted(BENGoptions)  # Sorts by course number.
-
-    # This contains all of the BIOL-prefixed courses.
-    BIOLoptions = [
-        "BIOL 1610: Biology 1",
-        "BIOL 3300: General Microbiology",
-        "BIOL 3060: Principles of Genetics",
-        "BIOL 1620: Biology 2",
-        "BIOL 2320: Human Anatomy",
-        "BIOL 2420: Human Physiology",
-        "BIOL 3060: Principles of Genetics"
-        "BIOL 3100: Bioethics"
-    ]
-    BIOLoptions = sorted(BIOLoptions)  # Sorts by course number.
-
-    # This contains all of the CEE-prefixed courses.
-    CEEoptions = [
-        "CEE 1880: CEE Orientation",
-        "CEE 2240: Engineering Surveying",
-        "CEE 3160: Civil Engineering Materials",
-        "CEE 3500: Fluid Mechanics",
-        "CEE 3610: Environmental Management",
-        "CEE 4200: Engineering Economics",
-        "CEE 3020: Structural Analysis"
-        "CEE 3510: Engineering Hydraulics",
-        "CEE 3880: Civil and Env. Engr. Design 1",
-        "CEE 4870: Civil and Env. Engr. Design 2",
-        "CEE 4880: Civil and Env. Engr. Design 3",
-        "CEE 3020: Structural Analysis",
-        "CEE 5060: Mechanics of Composite Materials 1",
-        "CEE 2620: Microbiology",
-        "CEE 3780: Hazardous Waste Management",
-        "CEE 3420: Engineering Hydrology",
-        "CEE 3640: Drinking Water Engineering",
-        "CEE 3650: Wastewater Engineering",
-        "CEE 3670: Transport Phenomena in Bio-Environmental Systems"
-    ]
-    CEEoptions = sorted(CEEoptions)  # Sorts by course number.
-
-    # This contains all of the CHEM-prefixed courses.
-    CHEMoptions = [
-                   "CHEM 1210: Principles of Chemistry 1",
-                   "CHEM 2300: Organic Chemistry 1",
-                   "CHEM 3700: Introductory Biochemistry",
-                   "CHEM 1220: Principles of Chemistry 2",
-                   "CHEM 2320: Organic Chemistry 2",
-                   "CHEM 3070: Physical Chemistry",
-                   "CHEM 3650: Environmental Chemistry"
-                   ]
-    CHEMoptions = sorted(CHEMoptions)  # Sorts by course number.
-
-    # This contains all of the CS-prefixed courses.
-    CSoptions = [
-        "CS 1400: Computer Science 1",
-        "CS 1410: Computer Science 2",
-        "CS 2420: Computer Science 3",
-        "CS 3100: Operating Systems",
-        "CS 1440: Methods in Comp. Sci.",
-        "CS 2420: Algorithms & Data Structures",
-        "CS 2410: Intro to Event Prog. & GUIs",
-        "CS 2610: Developing Web App",
-        "CS 2810: Comp. Sys. Organization",
-        "CS 3450: Intro to Software Engineering",
-        "CS 4700: Programming Languages"
-    ]
-    CSoptions = sorted(CSoptions)  # Sorts by course number.
-
-    # This contains all of the ECE-prefixed courses.
-    ECEoptions = [
-        "ECE 2700: Digital Circuits",
-        "ECE 2250: Electrical Circuits 1",
-        "ECE 2290: Electrical Circuits 2",
-        "ECE 3620: Continuous Time Systems",
-        "ECE 3710: Microcontrollers",
-        "ECE 3410: Microelectronics 1"
-        "ECE 3810: Engineering Professionalism",
-        "ECE 4820: Computer Engr. Design 1",
-        "ECE 4830: Engineering Comm. 1",
-        "ECE 4840: Computer Engr. Design 2",
-        "ECE 4700: Engineering Comm. 2",
-        "ECE 3620: Continuous-Time Sys. & Sig.",
-        "ECE 3640: Discrete-Time Sys. & Sig.",
-        "ECE 3870: Electromagnetics 1"
-    ]
-    ECEoptions = sorted(ECEoptions)  # Sorts by course number.
-
-    # This contains all of the ENGR-prefixed courses.
-    ENGRoptions = [
-                   "ENGR 2010: Statics",
-                   "ENGR 2210: Fundamental Electronics",
-                   "ENGR 2030: Dynamics",
-                   "ENGR 2140: Mechanics of Materials",
-                   "ENGR 2270: Computer Engr. Drafting",
-                   "ENGR 2450: Numerical Methods",
-                   "ENGR 3080: Technical Communication"
-                   ]
-    ENGRoptions = sorted(ENGRoptions)  # Sorts by course number.
-
-    # This contains all of the GEOL-prefixed courses.
-    GEOLoptions = [
-        "GEOL 1110: Physical Geology"
-    ]
-    GEOLoptions = sorted(GEOLoptions)  # Sorts by course number.
-
-    # This contains all of the MAE-prefixed courses.
-    MAEoptions = [
-                  "MAE 1010: Intro to Mechanical Engineering",
-                  "MAE 1200: Engineering Graphics",
-                  "MAE 2160: Material Science",
-                  "MAE 2300: Thermodynamics 1",
-                  "MAE 3210: Numerical Methods",
-                  "MAE 3340: Instrumentation and Measurements",
-                  "MAE 3600: Engr. Professionalism and Ethics",
-                  "MAE 3040: Mechanics of Solids",
-                  "MAE 3320: Advanced Dynamics",
-                  "MAE 5300: Vibrations",
-                  "MAE 3440: Heat Transfer",
-                  "MAE 4300: Machine Design",
-                  "MAE 3420: Fluid Dynamics",
-                  "MAE 4400: Fluids/Thermal Lab",
-                  "MAE 4800: Capstone Design 1",
-                  "MAE 4810: Capstone Design 2",
-                  "MAE 5020: Finite Element Methods 1",
-                  "MAE 5040: Experimental Solid Mechanics",
-                  "MAE 5060: Mechanics of Composite Materials 1",
-                  "MAE 5310: Dynamics Systems and Controls",
-                  "MAE 5320: Mechatronics",
-                  "MAE 5350: Kinematics",
-                  "MAE 5410: Design and Optimization of Thermal Systems",
-                  "MAE 5420: Compressible Fluid Flow",
-                  "MAE 5440: Computational Fluid Dynamics",
-                  "MAE 5450: Renewable Energy",
-                  "MAE 5500: Aerodynamics",
-                  "MAE 5510: Dynamics of Atmospheric Flight",
-                  "MAE 5530: Space System Design",
-                  "MAE 5540: Propulsion Systems",
-                  "MAE 5560: Dynamics of Space Flight",
-                  "MAE 5580: Aircraft Design",
-                  "MAE 5670: Fracture Mechanics"
-                  ]
-    MAEoptions = sorted(MAEoptions)  # Sorts by course number.
-
-    # This contains all of the MATH-prefixed courses.
-    MATHoptions = [
-                   "MATH 1050: College Algebra",
-                   "MATH 1060: Trigonometry",
-                   "MATH 1210: Calculus 1",
-                   "MATH 1220: Calculus 2",
-                   "MATH 2210: Multivariable Calculus",
-                   "MATH 2250: Linear Algebra and Differential Equations",
-                   "MATH 3310: Discrete Mathematics",
-                   "MATH 2270: Linear Algebra",
-                   "MATH 2280: Differential Equations"
-                   ]
-    MATHoptions = sorted(MATHoptions)  # Sorts by course number.
-
-    # This contains all of the MGT-prefixed courses.
-    MGToptions = [
-        "MGT 3110: Managing Organizations"
-    ]
-    MGToptions = sorted(MGToptions)  # Sorts by course number.
-
-    # This contains all of the PHYS-prefixed courses.
-    PHYSoptions = [
-        "PHYS 2210: Physics 1",
-        "PHYS 2220: Physics 2",
-        "PHYS 2710: Introductory Modern Physics"
-    ]
-    PHYSoptions = sorted(PHYSoptions)  # Sorts by course number.
-
-    # This contains all of the PSC-prefixed courses.
-    PSCoptions = [
-        "PSC 3000: Fundamentals of Soil Science"
-    ]
-    PSCoptions = sorted(PSCoptions)  # Sorts by course number.
-
-    # This contains all of the STAT-prefixed courses.
-    STAToptions = [
-        "STAT 3000: Statistics for Scientists",
-        "STAT 5200: Design of Experiments"
-    ]
-    STAToptions = sorted(STAToptions)  # Sorts by course number.
-
-    # This populates the prefix menu based on the prefix selection.
-    #
-    # ADDING A NEW ITEM:
-    # -------------------
-    # Copy the following two lines into the list, above the "else" line:
-    # (delete the # in the new lines after copying)
-    #   elif prefix_selection == "NewPrefixHere":
-    #       prefix = CourseInfo.PREoptions
-    # Change the "NewPrefixHere" and "PREoptions" to match the new prefix that
-    # you added above and below.
+    # The catalog is loaded once, when this module is first imported. See the
+    # module notes above for how to change the catalog file.
+    catalog = load_catalog()
+
+    # These are the lists of available majors, class ranks and course
+    # prefixes.
+    majoroptions = catalog.majors
+    rankoptions = catalog.ranks
+    prefixoptions = catalog.prefixes
+
     @staticmethod
     def populate_names(prefix_selection):
         """Changes the list of options in `name_menu` based on user input.
 
-        The selected prefix is retrieved from `prefixvar` and a new set of
-        course names is populated and replaces the values in `name_menu`.
+        The selected prefix is retrieved from `prefixvar` and the course names
+        under that prefix are looked up in `catalog`.
 
         Parameters
         ------------
-        prefix_selection : tkinter.StringVar
+        prefix_selection : str
             The prefix selected by the student in the login system.
 
         Returns
@@ -354,45 +393,19 @@ class CourseInfo:
             Contains a list of all of the names corresponding to the selected
             prefix.
 
+        Raises
+        -------
+        KeyError
+            If `prefix_selection` is not one of the `prefixoptions`.
+
         """
-        if prefix_selection == "BENG":
-            course_names = CourseInfo.BENGoptions
-        elif prefix_selection == "BIOL":
-            course_names = CourseInfo.BIOLoptions
-        elif prefix_selection == "CEE":
-            course_names = CourseInfo.CEEoptions
-        elif prefix_selection == "CHEM":
-            course_names = CourseInfo.CHEMoptions
-        elif prefix_selection == "CS":
-            course_names = CourseInfo.CSoptions
-        elif prefix_selection == "ECE":
-            course_names = CourseInfo.ECEoptions
-        elif prefix_selection == "ENGR":
-            course_names = CourseInfo.ENGRoptions
-        elif prefix_selection == "GEOL":
-            course_names = CourseInfo.GEOLoptions
-        elif prefix_selection == "MAE":
-            course_names = CourseInfo.MAEoptions
-        elif prefix_selection == "MATH":
-            course_names = CourseInfo.MATHoptions
-        elif prefix_selection == "MGT":
-            course_names = CourseInfo.MGToptions
-        elif prefix_selection == "PHYS":
-            course_names = CourseInfo.PHYSoptions
-        elif prefix_selection == "PSC":
-            course_names = CourseInfo.PSCoptions
-        elif prefix_selection == "STAT":
-            course_names = CourseInfo.STAToptions
-        # Additional entries should look like so...
-    #   elif prefix_selection == "NewPrefixHere":
-    #       prefix = CourseInfo.PREoptions
-        # This `else` statement should only be reachable if the course prefixes
-        # are updated without making the necessary additions to this method.
-        else:
-            # Sets the list of course names to those corresponding to the ENGR
-            # prefix and prints an error statement reminding the user to
-            # update the proper functions in CourseInfo.py.
-            course_names = CourseInfo.ENGRoptions
-            print("You need to update the populate_names function in "
-                  "CourseInfo.py.")
-        return course_names
+        return CourseInfo.catalog.courses(prefix_selection)
+
+
+# These lists contain the courses under each prefix (e.g.
+# `CourseInfo.MAEoptions`), sorted by course number. They are kept so that
+# older scripts that use them keep working; new code should use
+# `CourseInfo.catalog.courses(prefix)` instead.
+for _prefix in CourseInfo.catalog.prefixes:
+    setattr(CourseInfo, _prefix + 'options',
+            CourseInfo.catalog.courses(_prefix))
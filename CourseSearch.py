@@ -0,0 +1,213 @@
+# -*- coding: utf-8 -*-
+"""Type-ahead course search for the Tutor Center login system.
+
+This module contains the search box students use to pick their course in the
+Tutor Center login system (TCLogin.py). Instead of choosing a course prefix and
+then scrolling through every course under it, the student types part of the
+course number or name (e.g. "2300", "mae 23" or "thermo") and picks their
+course from the matches, which are updated on every keystroke.
+
+Routine Listings
+-----------------
+CourseIndex      Trigram index over every course in the course catalog.
+CourseSearchBox  Searchable combobox widget backed by a CourseIndex.
+
+Notes
+------
+The search box writes the prefix and name of the chosen course to the same
+`prefixvar` and `namevar` variables used by the course prefix and course name
+menus, so the recorded data is exactly the same as before.
+
+"""
+
+import tkinter as tk
+import tkinter.ttk as ttk
+
+
+class CourseIndex:
+    """CourseIndex finds the courses matching what a student has typed.
+
+    Every course in the catalog is broken into its trigrams (each run of three
+    characters, ignoring case), and the index keeps the list of courses
+    containing each trigram. A search only has to look at the courses that
+    contain every trigram of the query, rather than at every course in the
+    catalog. Queries shorter than three characters are answered from a
+    similar index of the first one or two characters of each word.
+
+    Attributes
+    ------------
+    courses : list of str
+        Every course in the catalog, sorted by prefix and course number.
+
+    See Also
+    -----------
+    CourseInfo.CourseCatalog : The catalog the index is built from.
+
+    """
+
+    def __init__(self, catalog):
+        self.courses = [name for prefix in catalog.prefixes
+                        for name in catalog.courses(prefix)]
+        self._keys = [name.lower() for name in self.courses]
+        self._trigrams = {}
+        self._starts = {}
+        for number, key in enumerate(self._keys):
+            for trigram in {key[i:i + 3] for i in range(len(key) - 2)}:
+                self._trigrams.setdefault(trigram, []).append(number)
+            words = key.replace(':', ' ').split()
+            starts = {word[:1] for word in words}
+            starts.update(word[:2] for word in words)
+            for start in starts:
+                self._starts.setdefault(start, []).append(number)
+
+    def search(self, query, limit=50):
+        """Returns the courses containing `query`, ignoring case.
+
+        Courses whose number starts with the query (e.g. "MAE 23" or "2300")
+        are listed first, followed by the other matches. Within each group the
+        courses are listed in catalog order.
+
+        Parameters
+        ------------
+        query : str
+            The text typed by the student.
+        limit : int
+            The most matches to return.
+
+        Returns
+        -------
+        matches : list of str
+            The matching courses.
+
+        """
+        query = ' '.join(query.lower().split())
+        if not query:
+            return self.courses[:limit]
+        if len(query) < 3:
+            candidates = self._starts.get(query, [])
+        else:
+            # Every match must contain every trigram of the query, so only
+            # the courses in the shortest list of courses need to be checked.
+            candidates = None
+            for i in range(len(query) - 2):
+                found = self._trigrams.get(query[i:i + 3])
+                if found is None:
+                    return []
+                if candidates is None or len(found) < len(candidates):
+                    candidates = found
+
+        first = []
+        rest = []
+        for number in candidates:
+            key = self._keys[number]
+            position = key.find(query)
+            if position < 0:
+                continue
+            # A match at the start of the course, or at the start of the
+            # course number, is listed first.
+            if position == 0 or (key[position - 1] == ' '
+                                 and position < key.find(':')):
+                first.append(number)
+            else:
+                rest.append(number)
+            if len(first) >= limit:
+                break
+        return [self.courses[n] for n in (first + rest)[:limit]]
+
+
+class CourseSearchBox(ttk.Combobox):
+    """CourseSearchBox is a combobox that searches the catalog as you type.
+
+    The list of courses in the drop-down is replaced with the courses matching
+    the typed text on every keystroke. Pressing the Down key (or the arrow
+    button) shows the matches, and pressing Return chooses the first match.
+    Choosing a course writes its course prefix to `prefixvar` and the course
+    itself to `namevar`; while no course is chosen, both are empty.
+
+    Attributes
+    ------------
+    index : CourseIndex
+        The index used to find the matching courses.
+    prefixvar : tkinter.StringVar
+        Set to the course prefix of the chosen course.
+    namevar : tkinter.StringVar
+        Set to the name of the chosen course.
+
+    See Also
+    -----------
+    tkinter.ttk.Combobox : Creates an entry with a drop-down list.
+
+    """
+
+    def __init__(self, master, catalog, prefixvar, namevar, limit=50,
+                 **options):
+        self.index = CourseIndex(catalog)
+        self.prefixvar = prefixvar
+        self.namevar = namevar
+        self.limit = limit
+        self._courses = set(self.index.courses)
+        self._text = tk.StringVar(master)
+        super().__init__(master, textvariable=self._text,
+                         values=self.index.search('', limit), **options)
+        self.bind('<KeyRelease>', self._update)
+        self.bind('<Return>', self._choose_first)
+        self.bind('<<ComboboxSelected>>', self._choose)
+
+    def _update(self, event):
+        # Arrow keys move through the list rather than change the search.
+        if event.keysym in ('Up', 'Down', 'Return', 'Escape', 'Tab'):
+            return
+        self['values'] = self.index.search(self._text.get(), self.limit)
+        self._choose()
+
+    def _choose(self, event=None):
+        # Writes the course to `prefixvar` and `namevar` if the text in the
+        # box is a course in the catalog, and empties them if it is not.
+        course = self.chosen()
+        if course is None:
+            self.prefixvar.set('')
+            self.namevar.set('')
+        else:
+            self.prefixvar.set(course.split(' ')[0])
+            self.namevar.set(course)
+
+    def _choose_first(self, event=None):
+        matches = self['values']
+        if matches and self.chosen() is None:
+            self._text.set(matches[0])
+            self.icursor('end')
+        self._choose()
+
+    def choose(self, course):
+        """Chooses a course, as if the student had typed it.
+
+        Parameters
+        ------------
+        course : str
+            The course to choose. Courses not in the catalog are ignored.
+
+        Returns
+        -------
+        chosen : bool
+            True if the course was chosen.
+
+        """
+        if course not in self._courses:
+            return False
+        self._text.set(course)
+        self.icursor('end')
+        self._choose()
+        return True
+
+    def chosen(self):
+        """Returns the chosen course, or None if no course has been chosen."""
+        course = self._text.get()
+        if course in self._courses:
+            return course
+        return None
+
+    def clear(self):
+        """Empties the search box, ready for the next student."""
+        self._text.set('')
+        self['values'] = self.index.search('', self.limit)
+        self._choose()
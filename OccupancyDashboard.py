@@ -0,0 +1,219 @@
+# -*- coding: utf-8 -*-
+"""Live occupancy dashboard for the Tutor Center Supervisor.
+
+This module contains a read-only window showing how busy the Tutor Center is
+right now: how many students are signed in, how many arrived this hour and in
+the last 15 minutes, and which courses they came for today. The numbers are
+kept in counters that are updated as each student signs in or out, from the
+events published by the sign-in service (see `SignInService.subscribe`), so
+the dashboard never reads Masterfile.xlsx and never keeps it from being
+saved.
+
+Routine Listings
+-----------------
+Occupancy           The numbers shown on the dashboard at one time.
+OccupancyCounters   Counters updated from each sign-in and sign-out.
+OccupancyDashboard  Window showing the counters, refreshed every few seconds.
+
+Notes
+------
+The dashboard is opened from the login system (TCLogin.py) with the key
+named by `DASHBOARD_KEY` (Ctrl+Shift+D by default). Closing the dashboard
+does not close the login system.
+
+The counters start from the visits still open and, if the rollups are turned
+on (see `ROLLUPS` in TCLogin.py), from the sign-ins already counted today.
+Otherwise they start at zero when the login system starts. The arrivals in
+the last 15 minutes are only counted from when the login system started.
+
+"""
+
+import collections
+import datetime
+
+# The numbers shown on the dashboard at one time.
+Occupancy = collections.namedtuple(
+    'Occupancy', ['here', 'today', 'hour_arrivals', 'recent_arrivals',
+                  'hourly_rate', 'top_courses'])
+
+
+class OccupancyCounters:
+    """OccupancyCounters keeps the dashboard numbers up to date.
+
+    Each update only adds to (or takes from) a few counters, so it takes the
+    same time however many students have signed in. The counters are reset
+    when the first sign-in of a new day arrives.
+
+    Attributes
+    ------------
+    window : datetime.timedelta
+        How far back the recent arrivals are counted.
+    top : int
+        How many courses are listed in `Occupancy.top_courses`.
+
+    """
+
+    def __init__(self, window_minutes=15, top=5):
+        self.window = datetime.timedelta(minutes=window_minutes)
+        self.top = top
+        self._here = set()
+        self._recent = collections.deque()
+        self._day = None
+        self._hourly = [0] * 24
+        self._courses = collections.Counter()
+
+    def seed(self, visits=(), rollups=None, today=None):
+        """Starts the counters from the visits open and the day so far.
+
+        Parameters
+        ------------
+        visits : iterable of SignInRecord
+            The visits still open (for example, the values of
+            `SignInService.open_visits()`).
+        rollups : SignInAnalytics.SignInRollups, optional
+            If given, the arrivals in each hour and the visits to each course
+            so far today are read from it.
+        today : datetime.date, optional
+            The current day. Defaults to today.
+
+        """
+        for visit in visits:
+            self._here.add(visit.anumber.upper())
+        if rollups is not None:
+            if today is None:
+                today = datetime.date.today()
+            self._day = today
+            self._hourly = rollups.hourly(today)
+            self._courses = rollups.courses(today)
+
+    def __call__(self, kind, record):
+        # Used as a listener of SignInService.subscribe.
+        if kind == 'sign_in':
+            self.sign_in(record)
+        elif kind == 'sign_out':
+            self.sign_out(record)
+
+    def sign_in(self, record):
+        """Counts a student arriving."""
+        when = record.signed_in
+        if when.date() != self._day:
+            self._day = when.date()
+            self._hourly = [0] * 24
+            self._courses = collections.Counter()
+        self._hourly[when.hour] += 1
+        self._courses[record.course_name] += 1
+        self._recent.append(when)
+        self._here.add(record.anumber.upper())
+
+    def sign_out(self, record):
+        """Counts a student leaving."""
+        self._here.discard(record.anumber.upper())
+
+    def snapshot(self, now=None):
+        """Returns the numbers to show on the dashboard.
+
+        Parameters
+        ------------
+        now : datetime.datetime, optional
+            The current time. Defaults to the current time.
+
+        Returns
+        -------
+        occupancy : Occupancy
+            The number of students signed in, the arrivals today, this hour
+            and within `window`, the arrivals per hour at the rate of the
+            last `window`, and the `top` courses of the day with their visits.
+
+        """
+        if now is None:
+            now = datetime.datetime.now()
+        # Arrivals that have left the window are dropped for good, so the
+        # deque only ever holds the last few minutes of arrivals.
+        recent = self._recent
+        while recent and recent[0] <= now - self.window:
+            recent.popleft()
+        if now.date() == self._day:
+            today = sum(self._hourly)
+            hour_arrivals = self._hourly[now.hour]
+            top_courses = self._courses.most_common(self.top)
+        else:
+            today = hour_arrivals = 0
+            top_courses = []
+        rate = len(recent) * datetime.timedelta(hours=1) / self.window
+        return Occupancy(len(self._here), today, hour_arrivals, len(recent),
+                         rate, top_courses)
+
+
+class OccupancyDashboard:
+    """OccupancyDashboard is a window showing the live occupancy.
+
+    The window only shows the numbers held by its counters, so opening it
+    does not slow down the login system.
+
+    Attributes
+    ------------
+    counters : OccupancyCounters
+        The counters shown.
+    window : tkinter.Toplevel
+        The dashboard window.
+    refresh_ms : int
+        How often, in milliseconds, the numbers are shown again.
+
+    """
+
+    def __init__(self, master, counters, refresh_ms=5000):
+        import tkinter as tk
+        import tkinter.ttk as ttk
+
+        self.counters = counters
+        self.refresh_ms = refresh_ms
+        self.window = tk.Toplevel(master)
+        self.window.title("Tutor Center Occupancy")
+        self.window.configure(background="silver")
+        self.window.protocol("WM_DELETE_WINDOW", self.close)
+
+        # One label for each number, and one for the list of courses. The
+        # foreground color is USU blue in hexidecimal.
+        style = {'background': 'silver', 'foreground': '#0F2439'}
+        self._labels = {}
+        for row, (name, text) in enumerate([
+                ('here', "Signed in now"), ('today', "Arrivals today"),
+                ('hour_arrivals', "Arrivals this hour"),
+                ('recent_arrivals', "Arrivals in the last %d minutes"
+                 % (counters.window.total_seconds() // 60)),
+                ('hourly_rate', "Arrivals per hour (recent rate)")]):
+            ttk.Label(self.window, text=text, font='Helvetica 16 bold',
+                      **style).grid(row=row, column=0, sticky='w',
+                                    padx=10, pady=4)
+            self._labels[name] = ttk.Label(self.window, text="",
+                                           font='Helvetica 20 bold', **style)
+            self._labels[name].grid(row=row, column=1, sticky='e', padx=10)
+        ttk.Label(self.window, text="Top courses today",
+                  font='Helvetica 16 bold', **style).grid(
+                      row=5, column=0, columnspan=2, sticky='w', padx=10,
+                      pady=(12, 4))
+        self._courses = ttk.Label(self.window, text="", justify=tk.LEFT,
+                                  font='Helvetica 12', **style)
+        self._courses.grid(row=6, column=0, columnspan=2, sticky='w',
+                           padx=10, pady=(0, 10))
+        self._job = None
+        self.refresh()
+
+    def refresh(self):
+        """Shows the current numbers, and again every `refresh_ms`."""
+        occupancy = self.counters.snapshot()
+        for name, label in self._labels.items():
+            value = getattr(occupancy, name)
+            label.config(text="%.0f" % value if isinstance(value, float)
+                         else "%d" % value)
+        self._courses.config(text="\n".join(
+            "%d  %s" % (visits, course or "(no course)")
+            for course, visits in occupancy.top_courses) or "None yet")
+        self._job = self.window.after(self.refresh_ms, self.refresh)
+
+    def close(self):
+        """Closes the dashboard window."""
+        if self._job is not None:
+            self.window.after_cancel(self._job)
+            self._job = None
+        self.window.destroy()
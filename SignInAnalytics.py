@@ -0,0 +1,605 @@
+# -*- coding: utf-8 -*-
+"""Visit counts over the sign-in history of the Tutor Center.
+
+This module contains the tools used to summarise the sign-ins saved by the
+Tutor Center login system (TCLogin.py), without loading the whole Masterfile
+into Excel. The sign-ins are read one at a time, from the "Main Data" sheet of
+Masterfile.xlsx or from any of the storage backends in SignInStorage.py, and
+only the running counts are kept in memory, so years of history can be
+summarised in a few seconds.
+
+Routine Listings
+-----------------
+SignInCounts    Visit counts by hour, weekday, course, major and class rank.
+SignInRollups   Visit counts per day, hour and course, kept up to date as each
+                student signs in.
+workbook_rows   Yields the sign-ins in the "Main Data" sheet of a workbook.
+count_rows      Counts the visits in any iterable of sign-in records.
+count_storage   Counts the visits saved in a storage backend.
+
+Notes
+------
+To print the visit counts, run this script from the command line:
+
+    python SignInAnalytics.py --backend sqlite --database SignIns.db
+
+Use `--backend workbook` to read Masterfile.xlsx instead, and `--output` to
+also save the counts as a JSON file. Add `--archive SignInArchive` to include
+the past semesters moved to the archive (see SignInArchive.py), and `--start`
+and `--end` to only count the visits between two dates.
+
+The login system also keeps the rollups in SignInRollups.db up to date as
+each student signs in (see `ROLLUPS` in TCLogin.py). If the rollups are ever
+out of date (for example, after sign-ins were imported), recompute them from
+the saved sign-ins with:
+
+    python SignInAnalytics.py --backend sqlite --rebuild
+
+"""
+
+import collections
+import datetime
+import itertools
+import json
+
+import SignInArchive
+import SignInStorage
+
+# The names of the days of the week, starting on Monday (as numbered by
+# datetime.date.weekday).
+WEEKDAYS = ['Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday',
+            'Saturday', 'Sunday']
+
+
+class SignInCounts:
+    """SignInCounts holds the number of visits in each category.
+
+    Attributes
+    ------------
+    total : int
+        The number of visits counted.
+    by_hour : collections.Counter
+        Visits by the hour of the day they started in (0-23).
+    by_weekday : collections.Counter
+        Visits by the day of the week (Monday-Sunday).
+    by_prefix : collections.Counter
+        Visits by course prefix.
+    by_course : collections.Counter
+        Visits by course name.
+    by_major : collections.Counter
+        Visits by the major of the student.
+    by_rank : collections.Counter
+        Visits by the class rank of the student.
+
+    """
+
+    # The categories counted, with the attribute each one is kept in.
+    CATEGORIES = [('hour', 'by_hour'), ('weekday', 'by_weekday'),
+                  ('prefix', 'by_prefix'), ('course', 'by_course'),
+                  ('major', 'by_major'), ('rank', 'by_rank')]
+
+    def __init__(self):
+        self.total = 0
+        for category, attribute in self.CATEGORIES:
+            setattr(self, attribute, collections.Counter())
+
+    def update(self, rows):
+        """Counts the visits in an iterable of sign-in records.
+
+        Parameters
+        ------------
+        rows : iterable of SignInRecord
+            The sign-ins to count. Blank rows are skipped.
+
+        """
+        # The records are counted into local counters first, which is much
+        # faster than looking up the attributes for every record.
+        hours = collections.Counter()
+        weekdays = collections.Counter()
+        prefixes = collections.Counter()
+        courses = collections.Counter()
+        majors = collections.Counter()
+        ranks = collections.Counter()
+        total = 0
+        for row in rows:
+            if row[0] is None:
+                continue
+            total += 1
+            ranks[row[1]] += 1
+            majors[row[2]] += 1
+            prefixes[row[3]] += 1
+            courses[row[4]] += 1
+            signed_in = row[5]
+            if signed_in is None:
+                hours[None] += 1
+                weekdays[None] += 1
+            else:
+                hours[signed_in.hour] += 1
+                weekdays[signed_in.weekday()] += 1
+
+        self.by_hour.update(hours)
+        for weekday, count in weekdays.items():
+            self.by_weekday[WEEKDAYS[weekday] if weekday is not None
+                            else None] += count
+        self.by_prefix.update(prefixes)
+        self.by_course.update(courses)
+        self.by_major.update(majors)
+        self.by_rank.update(ranks)
+        self.total += total
+
+    def as_dict(self):
+        """Returns the counts as a dictionary that can be saved as JSON.
+
+        Each category is listed from the most visits to the fewest, except
+        for the hours, which are listed in order through the day.
+
+        """
+        counts = {'total': self.total}
+        for category, attribute in self.CATEGORIES:
+            counter = getattr(self, attribute)
+            if category == 'hour':
+                items = sorted(counter.items(),
+                               key=lambda item: (item[0] is None, item[0]))
+            else:
+                items = counter.most_common()
+            counts[category] = [[str(key) if key is not None else None,
+                                 count] for key, count in items]
+        return counts
+
+    def report(self):
+        """Returns the counts as text, one table per category."""
+        lines = ["Total visits: %d" % self.total]
+        for category, items in self.as_dict().items():
+            if category == 'total':
+                continue
+            lines.append('')
+            lines.append("Visits by %s" % category)
+            lines.append('-' * (len(category) + 10))
+            for key, count in items:
+                lines.append("%-60s %9d" % (key, count))
+        return '\n'.join(lines)
+
+
+class SignInRollups:
+    """SignInRollups keeps visit counts that are updated on every sign-in.
+
+    The counts are kept in their own small SQLite database, in four tables:
+
+    * `daily` has the visits and the number of different students (distinct
+      A-numbers) on each day,
+    * `hourly` has the visits starting in each hour of each day,
+    * `course_daily` has the visits for each course on each day, and
+    * `daily_students` has the A-numbers seen on each day, which is how the
+      number of different students is kept up to date.
+
+    Each sign-in adds to the counts in a single transaction, so questions like
+    "how busy was MAE 2300 this week" are answered from a handful of rows
+    rather than by reading the whole sign-in history.
+
+    Attributes
+    ------------
+    database : str
+        Path to the SQLite database file holding the rollups.
+    connection : sqlite3.Connection
+        The open connection to the database.
+
+    See Also
+    -----------
+    SignInStorage.SQLiteStorage : Saves the sign-ins themselves to SQLite.
+
+    """
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS daily (
+            date TEXT PRIMARY KEY,
+            visits INTEGER NOT NULL,
+            students INTEGER NOT NULL
+        );
+        CREATE TABLE IF NOT EXISTS hourly (
+            date TEXT NOT NULL,
+            hour INTEGER,
+            visits INTEGER NOT NULL,
+            PRIMARY KEY (date, hour)
+        );
+        CREATE TABLE IF NOT EXISTS course_daily (
+            date TEXT NOT NULL,
+            course_name TEXT,
+            course_prefix TEXT,
+            visits INTEGER NOT NULL,
+            PRIMARY KEY (date, course_name)
+        );
+        CREATE INDEX IF NOT EXISTS course_daily_course
+            ON course_daily (course_name, date);
+        CREATE TABLE IF NOT EXISTS daily_students (
+            date TEXT NOT NULL,
+            anumber TEXT NOT NULL,
+            PRIMARY KEY (date, anumber)
+        ) WITHOUT ROWID;
+    """
+
+    # The number of records added in each transaction by `rebuild`.
+    CHUNK_ROWS = 100000
+
+    def __init__(self, database='SignInRollups.db'):
+        import sqlite3
+
+        self.database = database
+        self.connection = sqlite3.connect(database, check_same_thread=False)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute("PRAGMA synchronous=NORMAL")
+        self.connection.executescript(self.SCHEMA)
+
+    def add(self, row):
+        """Adds a single sign-in record to the counts.
+
+        If the counts cannot be updated, the problem is printed rather than
+        raised, so a student can still sign in; running `rebuild` puts the
+        counts right again.
+
+        Parameters
+        ------------
+        row : SignInRecord
+            The sign-in to add.
+
+        """
+        import sqlite3
+
+        try:
+            self.extend([row])
+        except sqlite3.Error as error:
+            print("Could not update the rollups in %s: %s"
+                  % (self.database, error))
+
+    def extend(self, rows):
+        """Adds many sign-in records to the counts in one transaction.
+
+        Parameters
+        ------------
+        rows : iterable of SignInRecord
+            The sign-ins to add. Blank rows, and rows whose time cannot be
+            read, are skipped.
+
+        """
+        # The records are added up in memory first, so that each row of each
+        # table is only written once.
+        hourly = collections.Counter()
+        courses = collections.Counter()
+        visits = collections.Counter()
+        students = set()
+        for row in rows:
+            signed_in = row[5]
+            if row[0] is None or signed_in is None:
+                continue
+            date = signed_in.date()
+            visits[date] += 1
+            hourly[date, signed_in.hour] += 1
+            courses[date, row[4], row[3]] += 1
+            students.add((date, row[0]))
+
+        with self.connection:
+            self.connection.executemany(
+                "INSERT OR IGNORE INTO daily_students VALUES (?, ?)",
+                [(_iso(date), anumber) for date, anumber in students])
+            self.connection.executemany(
+                "INSERT INTO daily VALUES (?, ?, 0) ON CONFLICT (date) DO "
+                "UPDATE SET visits = visits + excluded.visits",
+                [(_iso(date), count) for date, count in visits.items()])
+            # The different students are recounted only for the days that
+            # were just added to.
+            self.connection.executemany(
+                "UPDATE daily SET students = (SELECT COUNT(*) FROM "
+                "daily_students WHERE daily_students.date = daily.date) "
+                "WHERE date = ?", [(_iso(date),) for date in visits])
+            self.connection.executemany(
+                "INSERT INTO hourly VALUES (?, ?, ?) ON CONFLICT (date, hour) "
+                "DO UPDATE SET visits = visits + excluded.visits",
+                [(_iso(date), hour, count)
+                 for (date, hour), count in hourly.items()])
+            self.connection.executemany(
+                "INSERT INTO course_daily VALUES (?, ?, ?, ?) ON CONFLICT "
+                "(date, course_name) DO UPDATE SET "
+                "visits = visits + excluded.visits",
+                [(_iso(date), name, prefix, count)
+                 for (date, name, prefix), count in courses.items()])
+
+    def rebuild(self, rows):
+        """Recomputes every count from the raw sign-in history.
+
+        Parameters
+        ------------
+        rows : iterable of SignInRecord
+            Every saved sign-in, for example from the `iter_rows`
+            method of a storage backend or from `workbook_rows`.
+
+        Returns
+        -------
+        added : int
+            The number of records counted.
+
+        """
+        with self.connection:
+            for table in ('daily', 'hourly', 'course_daily',
+                          'daily_students'):
+                self.connection.execute("DELETE FROM %s" % table)
+
+        # The history is added a chunk at a time, so that it never has to be
+        # held in memory all at once.
+        added = 0
+        rows = iter(rows)
+        while True:
+            chunk = list(itertools.islice(rows, self.CHUNK_ROWS))
+            if not chunk:
+                break
+            self.extend(chunk)
+            added += len(chunk)
+        return added
+
+    def daily(self, date):
+        """Returns the visits and different students on one day.
+
+        Parameters
+        ------------
+        date : str or datetime.date
+            The day, as "YYYY-MM-DD" or as a date.
+
+        Returns
+        -------
+        visits : int
+            The number of sign-ins on that day.
+        students : int
+            The number of different A-numbers that signed in on that day.
+
+        """
+        row = self.connection.execute(
+            "SELECT visits, students FROM daily WHERE date = ?",
+            (_iso(date),)).fetchone()
+        return tuple(row) if row else (0, 0)
+
+    def hourly(self, date):
+        """Returns the visits starting in each hour of one day.
+
+        Returns
+        -------
+        visits : list of int
+            24 counts, one for each hour of the day starting at midnight.
+
+        """
+        visits = [0] * 24
+        for hour, count in self.connection.execute(
+                "SELECT hour, visits FROM hourly WHERE date = ?",
+                (_iso(date),)):
+            if hour is not None:
+                visits[hour] = count
+        return visits
+
+    def course_visits(self, course, start, end=None):
+        """Returns the visits for one course between two days.
+
+        Parameters
+        ------------
+        course : str
+            The course name (e.g. "MAE 2300: Thermodynamics I"), or a course
+            prefix (e.g. "MAE") to count every course under it.
+        start : str or datetime.date
+            The first day to count.
+        end : str or datetime.date, optional
+            The last day to count. Defaults to `start`.
+
+        Returns
+        -------
+        visits : int
+            The number of sign-ins for that course in those days.
+
+        """
+        field = 'course_name' if ' ' in course else 'course_prefix'
+        end = start if end is None else end
+        return self.connection.execute(
+            "SELECT COALESCE(SUM(visits), 0) FROM course_daily "
+            "WHERE %s = ? AND date BETWEEN ? AND ?" % field,
+            (course, _iso(start), _iso(end))).fetchone()[0]
+
+    def courses(self, date):
+        """Returns the visits for each course on one day.
+
+        Parameters
+        ------------
+        date : str or datetime.date
+            The day, as "YYYY-MM-DD" or as a date.
+
+        Returns
+        -------
+        visits : collections.Counter
+            The number of sign-ins on that day, by course name.
+
+        """
+        return collections.Counter(dict(self.connection.execute(
+            "SELECT course_name, visits FROM course_daily WHERE date = ?",
+            (_iso(date),))))
+
+    def close(self):
+        """Closes the connection to the database."""
+        self.connection.close()
+
+
+def _iso(date):
+    # Returns a date given as a string or as a date in "YYYY-MM-DD" form.
+    if isinstance(date, str):
+        return date
+    return '%04d-%02d-%02d' % (date.year, date.month, date.day)
+
+
+def workbook_rows(workbook='Masterfile.xlsx'):
+    """Yields the sign-ins in the "Main Data" sheet of a workbook.
+
+    The workbook is opened in read-only mode, so its rows are read from the
+    file as they are needed rather than all loaded at once. Each row is
+    returned as a SignInRecord, with its time read from the "Date" and "Time
+    In" columns.
+
+    Parameters
+    ------------
+    workbook : str
+        Path to the Masterfile spreadsheet.
+
+    """
+    from openpyxl import load_workbook
+
+    wb = load_workbook(workbook, read_only=True)
+    try:
+        for row in wb["Main Data"].iter_rows(min_row=2, values_only=True):
+            if row and row[0] is not None:
+                yield SignInStorage.to_record(row)
+    finally:
+        wb.close()
+
+
+def count_rows(rows):
+    """Counts the visits in an iterable of sign-in records.
+
+    Parameters
+    ------------
+    rows : iterable of SignInRecord
+        The sign-ins to count.
+
+    Returns
+    -------
+    counts : SignInCounts
+        The visit counts.
+
+    """
+    counts = SignInCounts()
+    counts.update(rows)
+    return counts
+
+
+def count_storage(storage, start=None, end=None):
+    """Counts the visits saved in a storage backend.
+
+    The SQLite backend is counted by the database itself, one query per
+    category, which is much faster than reading every record. Every other
+    backend is counted by reading its records one at a time.
+
+    Parameters
+    ------------
+    storage : SignInStorage.StorageBackend
+        The storage backend holding the sign-ins.
+    start : datetime.date or datetime.datetime, optional
+        The earliest sign-in to count.
+    end : datetime.date or datetime.datetime, optional
+        The sign-ins at or after this time are not counted.
+
+    Returns
+    -------
+    counts : SignInCounts
+        The visit counts.
+
+    """
+    if not isinstance(storage, SignInStorage.SQLiteStorage):
+        return count_rows(SignInArchive.iter_history(storage.iter_rows(),
+                                                     start=start, end=end))
+
+    counts = SignInCounts()
+    connection = storage.connection
+    # The range of times is compared as text, which sorts the same way. A
+    # date on its own stands for midnight at the start of that day.
+    bounds = []
+    for when, default in ((start, ''), (end, '~')):
+        if when is None:
+            bounds.append(default)
+        elif isinstance(when, datetime.datetime):
+            bounds.append(when.isoformat(sep=' '))
+        else:
+            bounds.append(when.isoformat() + ' 00:00:00')
+    where = "WHERE signed_in >= ? AND signed_in < ?"
+    # The timestamps are saved as "YYYY-MM-DD HH:MM:SS", so the hour and the
+    # date of each sign-in are simply parts of the text. The day of the week
+    # is only worked out once for each date.
+    fields = [('by_prefix', 'course_prefix'), ('by_course', 'course_name'),
+              ('by_major', 'major'), ('by_rank', 'class_rank'),
+              ('by_hour', "CAST(substr(signed_in, 12, 2) AS INTEGER)"),
+              ('by_weekday', "substr(signed_in, 1, 10)")]
+    for attribute, field in fields:
+        counter = getattr(counts, attribute)
+        for value, count in connection.execute(
+                "SELECT %s, COUNT(*) FROM signins %s GROUP BY 1"
+                % (field, where), bounds):
+            if attribute == 'by_weekday' and value is not None:
+                value = WEEKDAYS[datetime.date.fromisoformat(value).weekday()]
+            counter[value] += count
+    counts.total = connection.execute(
+        "SELECT COUNT(*) FROM signins %s" % where, bounds).fetchone()[0]
+    return counts
+
+
+# This section prints the visit counts from the command line. See the module
+# notes above for an example.
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser(description=("Visit counts over the "
+                                                  "Tutor Center sign-ins."))
+    parser.add_argument('--backend', default='workbook',
+                        choices=['workbook', 'journal', 'sqlite'],
+                        help="where the sign-ins are saved")
+    parser.add_argument('--workbook', default='Masterfile.xlsx',
+                        help="spreadsheet holding the sign-ins")
+    parser.add_argument('--journal', default='SignInJournal',
+                        help="folder holding the sign-in journal")
+    parser.add_argument('--database', default='SignIns.db',
+                        help="SQLite database holding the sign-ins")
+    parser.add_argument('--output', help="file to save the counts to as JSON")
+    parser.add_argument('--rollups', default='SignInRollups.db',
+                        help="SQLite database holding the rollups")
+    parser.add_argument('--rebuild', action='store_true',
+                        help="recompute the rollups from the saved sign-ins")
+    parser.add_argument('--archive',
+                        help="folder holding the archived past semesters")
+    parser.add_argument('--start', type=datetime.date.fromisoformat,
+                        help="first day to count (YYYY-MM-DD)")
+    parser.add_argument('--end', type=datetime.date.fromisoformat,
+                        help="day after the last day to count (YYYY-MM-DD)")
+    arguments = parser.parse_args()
+
+    if arguments.archive:
+        archive = SignInArchive.SignInArchive(arguments.archive)
+    else:
+        archive = None
+
+    if arguments.backend == 'workbook':
+        storage = None
+    elif arguments.backend == 'sqlite':
+        storage = SignInStorage.SQLiteStorage(arguments.database)
+    else:
+        storage = SignInStorage.JournalStorage(arguments.journal)
+    try:
+        if arguments.rebuild:
+            if storage is None:
+                rows = workbook_rows(arguments.workbook)
+            else:
+                rows = storage.iter_rows()
+            rows = SignInArchive.iter_history(rows, archive)
+            rollups = SignInRollups(arguments.rollups)
+            count = rollups.rebuild(rows)
+            rollups.close()
+            counts = None
+            print("Rebuilt the rollups in %s from %d sign-ins."
+                  % (arguments.rollups, count))
+        elif storage is None:
+            counts = count_rows(SignInArchive.iter_history(
+                workbook_rows(arguments.workbook), archive, arguments.start,
+                arguments.end))
+        else:
+            counts = count_storage(storage, arguments.start, arguments.end)
+            if archive is not None:
+                counts.update(archive.iter_rows(arguments.start,
+                                                arguments.end))
+    finally:
+        if storage is not None:
+            storage.close()
+
+    if counts is not None:
+        print(counts.report())
+        if arguments.output:
+            with open(arguments.output, 'w') as file:
+                json.dump(counts.as_dict(), file, indent=2)
+            print("Saved the counts to %s." % arguments.output)
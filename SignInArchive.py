@@ -0,0 +1,432 @@
+# -*- coding: utf-8 -*-
+"""Semester (or monthly) archive of past Tutor Center sign-ins.
+
+This module keeps the "Main Data" sheet of Masterfile.xlsx down to the
+current semester. The sign-ins of each semester that has ended (the closed
+partitions) are moved out of the workbook into a compressed file of their own
+in the archive folder, so opening, saving and analysing the Masterfile only
+pays for the current semester (the live partition). The archive can be split
+by month instead of by semester.
+
+Each closed partition is saved as a Parquet file, with the course and student
+columns dictionary encoded, if pyarrow is installed, and as a gzip-compressed
+CSV file otherwise. A manifest (manifest.json) lists the partitions with the
+dates they cover, so reading the sign-ins between two dates only opens the
+partitions that overlap those dates.
+
+Routine Listings
+-----------------
+SEMESTERS       The month each semester starts in.
+partition_of    Returns the partition a sign-in time belongs to.
+SignInArchive   Folder of closed partitions, one compressed file each.
+iter_history    Yields the sign-ins between two dates, archived or live.
+
+Notes
+------
+The workbook storage backend archives the closed semesters each time the
+login system starts, if it is given an archive folder (see `ARCHIVE` in
+TCLogin.py). Any Masterfile can also be archived from the command line, while
+the login system is closed:
+
+    python SignInArchive.py archive --workbook Masterfile.xlsx
+
+The archived sign-ins are included by SignInAnalytics.py and
+StaffingForecast.py when they are given `--archive SignInArchive`, and
+`--start` and `--end` limit the counts to a range of dates.
+
+"""
+
+import csv
+import datetime
+import gzip
+import itertools
+import json
+import os
+
+import SignInStorage
+
+# The month each semester starts in, in order through the year. A semester
+# ends when the next one starts.
+SEMESTERS = [(1, 'Spring'), (6, 'Summer'), (8, 'Fall')]
+
+# The names of the columns of a partition file, one for each field of a
+# SignInRecord.
+FIELDS = list(SignInStorage.SignInRecord._fields)
+
+
+def partition_of(when, period='semester'):
+    """Returns the partition a sign-in time belongs to.
+
+    Parameters
+    ------------
+    when : datetime.datetime or datetime.date
+        The time of the sign-in.
+    period : str
+        "semester" or "month".
+
+    Returns
+    -------
+    key : str
+        The name of the partition, such as "2018-08-Fall" or "2018-10",
+        which sorts in time order.
+    start : datetime.datetime
+        The start of the partition.
+    end : datetime.datetime
+        The start of the next partition.
+
+    """
+    if period == 'month':
+        start = datetime.datetime(when.year, when.month, 1)
+        if when.month == 12:
+            end = datetime.datetime(when.year + 1, 1, 1)
+        else:
+            end = datetime.datetime(when.year, when.month + 1, 1)
+        return '%04d-%02d' % (when.year, when.month), start, end
+    if period != 'semester':
+        raise ValueError("Unknown archive period: %r" % period)
+    for number, (month, name) in reversed(list(enumerate(SEMESTERS))):
+        if when.month >= month:
+            break
+    start = datetime.datetime(when.year, month, 1)
+    if number + 1 < len(SEMESTERS):
+        end = datetime.datetime(when.year, SEMESTERS[number + 1][0], 1)
+    else:
+        end = datetime.datetime(when.year + 1, SEMESTERS[0][0], 1)
+    return '%04d-%02d-%s' % (when.year, month, name), start, end
+
+
+class SignInArchive:
+    """SignInArchive keeps each closed partition in a compressed file.
+
+    Attributes
+    ------------
+    directory : str
+        The folder holding the partition files and the manifest.
+    period : str
+        "semester" or "month"; how the sign-ins are split.
+    partitions : dict
+        The manifest: for each partition name, the `file` it is saved in,
+        the `start` and `end` of the dates it covers (ISO 8601), and the
+        number of `rows` in it.
+
+    """
+
+    # The most sign-ins held in memory at once while reading a Parquet file.
+    BATCH_ROWS = 65536
+
+    # The columns dictionary encoded in the Parquet files.
+    DICTIONARY_FIELDS = ['class_rank', 'major', 'course_prefix',
+                         'course_name']
+
+    def __init__(self, directory='SignInArchive', period='semester'):
+        self.directory = directory
+        self.period = period
+        os.makedirs(directory, exist_ok=True)
+        try:
+            with open(self._manifest_path(), encoding='utf-8') as file:
+                self.partitions = json.load(file)['partitions']
+        except (OSError, ValueError, KeyError):
+            self.partitions = {}
+
+    def _manifest_path(self):
+        return os.path.join(self.directory, 'manifest.json')
+
+    def _save_manifest(self):
+        path = self._manifest_path()
+        with open(path + '.tmp', 'w', encoding='utf-8') as file:
+            json.dump({'partitions': self.partitions}, file, indent=1,
+                      sort_keys=True)
+        os.replace(path + '.tmp', path)
+
+    def is_closed(self, when, now=None):
+        """Returns True if a sign-in time is in a partition that has ended."""
+        if now is None:
+            now = datetime.datetime.now()
+        return partition_of(when, self.period)[2] <= now
+
+    def add(self, rows):
+        """Adds sign-ins to the partitions they belong to.
+
+        Each partition added to is saved again in full, along with the
+        sign-ins it already held, so the same sign-in is never archived
+        twice: a sign-in with the same A-number and time as one already in
+        the partition replaces it (each one already there is only matched
+        once, as a student can sign in twice in the same minute). Sign-ins
+        whose time cannot be read are skipped.
+
+        Parameters
+        ------------
+        rows : iterable of SignInRecord
+            The sign-ins to archive, normally from partitions that have ended.
+
+        Returns
+        -------
+        added : int
+            The number of sign-ins archived that were not already in the
+            archive.
+
+        """
+        groups = {}
+        for row in rows:
+            if row[5] is None:
+                continue
+            key = partition_of(row[5], self.period)[0]
+            groups.setdefault(key, []).append(row)
+
+        added = 0
+        for key, group in sorted(groups.items()):
+            records = []
+            places = {}
+            if key in self.partitions:
+                for record in self._read(self.partitions[key]['file']):
+                    places.setdefault((record[0], record[5]), []).append(
+                        len(records))
+                    records.append(record)
+            for row in group:
+                record = SignInStorage.SignInRecord(*row)
+                archived = places.get((row[0], row[5]))
+                if archived:
+                    records[archived.pop(0)] = record
+                else:
+                    records.append(record)
+                    added += 1
+            records.sort(key=lambda record: record[5])
+            self._write(key, records)
+        self._save_manifest()
+        return added
+
+    def _write(self, key, records):
+        # Saves a partition to a new file, which then replaces the old file in
+        # one step, and records it in the manifest (which is saved by the
+        # caller).
+        try:
+            import pyarrow
+        except ImportError:
+            pyarrow = None
+        if pyarrow is None:
+            name = key + '.csv.gz'
+            path = os.path.join(self.directory, name)
+            with gzip.open(path + '.tmp', 'wt', encoding='utf-8',
+                           newline='') as file:
+                writer = csv.writer(file)
+                writer.writerow(FIELDS)
+                for record in records:
+                    writer.writerow([value.isoformat(sep=' ')
+                                     if isinstance(value, datetime.datetime)
+                                     else value for value in record])
+        else:
+            import pyarrow.parquet as pq
+
+            name = key + '.parquet'
+            path = os.path.join(self.directory, name)
+            columns = list(zip(*records))
+            arrays = []
+            for field, values in zip(FIELDS, columns):
+                if field in ('signed_in', 'signed_out'):
+                    arrays.append(pyarrow.array(values,
+                                                pyarrow.timestamp('s')))
+                else:
+                    arrays.append(pyarrow.array(values, pyarrow.string()))
+            table = pyarrow.Table.from_arrays(arrays, names=FIELDS)
+            pq.write_table(table, path + '.tmp', compression='zstd',
+                           use_dictionary=self.DICTIONARY_FIELDS,
+                           row_group_size=self.BATCH_ROWS)
+        os.replace(path + '.tmp', path)
+
+        _, start, end = partition_of(records[0][5], self.period)
+        old = self.partitions.get(key, {}).get('file')
+        self.partitions[key] = {'file': name,
+                                'start': start.isoformat(),
+                                'end': end.isoformat(),
+                                'rows': len(records)}
+        if old is not None and old != name:
+            os.remove(os.path.join(self.directory, old))
+
+    def _read(self, name):
+        # Yields the sign-ins in one partition file, oldest first.
+        path = os.path.join(self.directory, name)
+        if name.endswith('.csv.gz'):
+            with gzip.open(path, 'rt', encoding='utf-8', newline='') as file:
+                reader = csv.reader(file)
+                next(reader, None)
+                for row in reader:
+                    yield SignInStorage.to_record(
+                        [value if value != '' else None for value in row])
+            return
+
+        import pyarrow.parquet as pq
+
+        parquet = pq.ParquetFile(path)
+        for batch in parquet.iter_batches(batch_size=self.BATCH_ROWS,
+                                          columns=FIELDS):
+            columns = [batch.column(field).to_pylist() for field in FIELDS]
+            for values in zip(*columns):
+                yield SignInStorage.SignInRecord(*values)
+
+    def iter_rows(self, start=None, end=None):
+        """Yields the archived sign-ins between two times, oldest first.
+
+        Only the partitions that overlap the times are read.
+
+        Parameters
+        ------------
+        start : datetime.datetime or datetime.date, optional
+            The earliest sign-in to include.
+        end : datetime.datetime or datetime.date, optional
+            The sign-ins at or after this time are left out.
+
+        """
+        start, end = _bounds(start, end)
+        for key in sorted(self.partitions):
+            partition = self.partitions[key]
+            if start is not None and partition['end'] <= start.isoformat():
+                continue
+            if end is not None and partition['start'] >= end.isoformat():
+                continue
+            rows = self._read(partition['file'])
+            yield from _between(rows, start, end)
+
+    def archive_sheet(self, ws, now=None):
+        """Moves the sign-ins of closed partitions out of a worksheet.
+
+        The partitions are written before the rows are deleted, so if the
+        workbook is not saved afterwards, archiving it again does no harm.
+
+        Parameters
+        ------------
+        ws : openpyxl.worksheet.worksheet.Worksheet
+            The "Main Data" sheet of a Masterfile, loaded for editing.
+        now : datetime.datetime, optional
+            The current time. Defaults to `datetime.datetime.now()`.
+
+        Returns
+        -------
+        moved : int
+            The number of sign-ins moved out of the sheet.
+
+        """
+        # The sign-ins are in time order, so the closed partitions are the
+        # rows before the first sign-in of a partition still open. Rows whose
+        # time cannot be read are kept in the sheet.
+        closed = []
+        keep = []
+        for number, row in enumerate(ws.iter_rows(min_row=2,
+                                                  values_only=True), start=2):
+            if not row or row[0] is None:
+                continue
+            record = SignInStorage.to_record(row)
+            if record.signed_in is None:
+                keep.append(row)
+            elif self.is_closed(record.signed_in, now):
+                closed.append(record)
+            else:
+                last = number
+                break
+        else:
+            last = ws.max_row + 1
+        if not closed:
+            return 0
+
+        self.add(closed)
+        # The kept rows are written over the top of the rows archived (each
+        # is written no lower than it was read from), and the rest of the
+        # archived rows are deleted at once, so the rows below are only
+        # moved up a single time.
+        for number, row in enumerate(keep, start=2):
+            for column, value in enumerate(row, start=1):
+                ws.cell(row=number, column=column).value = value
+        ws.delete_rows(2 + len(keep), last - 2 - len(keep))
+        return len(closed)
+
+    def archive_workbook(self, workbook='Masterfile.xlsx', now=None):
+        """Moves the sign-ins of closed partitions out of a Masterfile.
+
+        The login system must not have the workbook open.
+
+        Returns
+        -------
+        moved : int
+            The number of sign-ins moved out of the workbook.
+
+        """
+        from openpyxl import load_workbook
+
+        wb = load_workbook(workbook)
+        moved = self.archive_sheet(wb["Main Data"], now)
+        if moved:
+            wb.save(workbook + '.saving')
+            os.replace(workbook + '.saving', workbook)
+        return moved
+
+
+def _bounds(start, end):
+    # Returns the start and end of a range of times as datetimes, so that a
+    # date can be given for either.
+    if start is not None and not isinstance(start, datetime.datetime):
+        start = datetime.datetime.combine(start, datetime.time())
+    if end is not None and not isinstance(end, datetime.datetime):
+        end = datetime.datetime.combine(end, datetime.time())
+    return start, end
+
+
+def _between(rows, start, end):
+    # Yields the sign-ins between two times (either may be None).
+    for row in rows:
+        signed_in = row[5]
+        if signed_in is None:
+            continue
+        if start is not None and signed_in < start:
+            continue
+        if end is not None and signed_in >= end:
+            continue
+        yield row
+
+
+def iter_history(rows, archive=None, start=None, end=None):
+    """Yields the sign-ins between two times, archived or live.
+
+    Parameters
+    ------------
+    rows : iterable of SignInRecord
+        The live sign-ins, for example from the `iter_rows` method of a
+        storage backend.
+    archive : SignInArchive, optional
+        The archive of closed partitions.
+    start : datetime.datetime or datetime.date, optional
+        The earliest sign-in to include.
+    end : datetime.datetime or datetime.date, optional
+        The sign-ins at or after this time are left out.
+
+    """
+    start, end = _bounds(start, end)
+    archived = archive.iter_rows(start, end) if archive is not None else []
+    if start is None and end is None:
+        return itertools.chain(archived, rows)
+    return itertools.chain(archived, _between(rows, start, end))
+
+
+# This section archives a Masterfile from the command line. See the module
+# notes above for an example.
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser(description=("Semester archive of the "
+                                                  "Tutor Center sign-ins."))
+    parser.add_argument('command', choices=['archive', 'list'])
+    parser.add_argument('--workbook', default='Masterfile.xlsx',
+                        help="spreadsheet to archive the closed semesters of")
+    parser.add_argument('--archive', default='SignInArchive',
+                        help="folder holding the archive")
+    parser.add_argument('--period', default='semester',
+                        choices=['semester', 'month'],
+                        help="how the sign-ins are split")
+    arguments = parser.parse_args()
+
+    archive = SignInArchive(arguments.archive, arguments.period)
+    if arguments.command == 'archive':
+        moved = archive.archive_workbook(arguments.workbook)
+        print("Archived %d sign-ins from %s." % (moved, arguments.workbook))
+    for key in sorted(archive.partitions):
+        partition = archive.partitions[key]
+        print("%-16s %9d sign-ins  %s" % (key, partition['rows'],
+                                          partition['file']))
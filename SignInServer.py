@@ -0,0 +1,250 @@
+# -*- coding: utf-8 -*-
+"""Sign-in aggregation server for Tutor Centers with several login stations.
+
+This module contains an optional server that collects the sign-ins from every
+login station (kiosk) into a single indexed SQLite database, so that the
+stations no longer each keep their own copy of Masterfile.xlsx. Each station
+uses the "remote" storage backend (`SignInStorage.RemoteStorage`), which keeps
+one connection open to the server and sends its sign-ins in batches. If the
+server is down, the station keeps its sign-ins in a local buffer and sends
+them once the server is back.
+
+Routine Listings
+-----------------
+SignInServer    Asynchronous server storing batches of sign-ins.
+serve_in_thread Runs a SignInServer in a background thread.
+
+Notes
+------
+To run the server, run this script from the command line on the computer that
+should hold the database:
+
+    python SignInServer.py --database SignIns.db --port 8765
+
+then set `STORAGE_BACKEND = "remote"` in TCLogin.py on each login station and
+set the server's address in `STORAGE_OPTIONS`. The combined sign-ins can be
+exported to Masterfile.xlsx from the server with:
+
+    python SignInStorage.py export --backend sqlite --database SignIns.db
+
+The protocol is one JSON object per line. A station sends
+{"records": [[...], ...], "sign_outs": [[...], ...]}, where each record has
+the values of the fields of a `SignInStorage.SignInRecord` in order (with the
+times of the sign-in and sign-out as ISO 8601 timestamps), and the server
+answers {"stored": n} once the sign-ins and sign-outs are saved, or
+{"error": "..."} if they could not be saved.
+
+"""
+
+import asyncio
+import json
+import sqlite3
+import threading
+
+import SignInAnalytics
+import SignInStorage
+
+
+class SignInServer:
+    """SignInServer receives batches of sign-ins and stores them.
+
+    The server uses asyncio, so a single thread can keep a connection open to
+    every login station at once. Each batch of sign-ins and sign-outs is
+    saved to `storage` with `save_batch` (in a single transaction, for the
+    SQLite backend) before the station is told it was stored.
+
+    Attributes
+    ------------
+    storage : SignInStorage.StorageBackend
+        The storage backend every sign-in is saved to.
+    rollups : SignInAnalytics.SignInRollups or None
+        If given, the visit counts updated after each batch is saved.
+    received : int
+        The number of sign-ins stored since the server started.
+
+    See Also
+    -----------
+    SignInStorage.RemoteStorage : The storage backend used by each station.
+
+    """
+
+    def __init__(self, storage, rollups=None):
+        self.storage = storage
+        self.rollups = rollups
+        self.received = 0
+        self._server = None
+        self._writers = set()
+
+    async def _handle(self, reader, writer):
+        # Answers every batch sent over one station's connection, until the
+        # station closes the connection.
+        self._writers.add(writer)
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                try:
+                    request = json.loads(line)
+                    rows = [SignInStorage.to_record(record)
+                            for record in request['records']]
+                    sign_outs = [SignInStorage.to_record(record)
+                                 for record in request.get('sign_outs', [])]
+                except (ValueError, KeyError, TypeError, IndexError) as error:
+                    answer = {'error': 'bad request: %s' % error}
+                else:
+                    answer = self._store(rows, sign_outs)
+                writer.write((json.dumps(answer) + '\n').encode('utf-8'))
+                await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            self._writers.discard(writer)
+            writer.close()
+
+    def _store(self, rows, sign_outs):
+        # Saves one batch and returns the answer to send to the station. If
+        # the batch could not be saved the station is told so, and keeps it
+        # to send again.
+        try:
+            self.storage.save_batch(rows, sign_outs)
+        except (sqlite3.Error, OSError) as error:
+            print("Could not store a batch of %d sign-ins: %s"
+                  % (len(rows) + len(sign_outs), error))
+            return {'error': 'not stored: %s' % error}
+        self.received += len(rows)
+        # The batch is stored, so a failure to count it must not make the
+        # station send it again.
+        if self.rollups is not None and rows:
+            try:
+                self.rollups.extend(rows)
+            except sqlite3.Error as error:
+                print("Could not count a batch of sign-ins: %s" % error)
+        return {'stored': len(rows) + len(sign_outs)}
+
+    async def start(self, host='0.0.0.0', port=8765):
+        """Starts listening for stations.
+
+        Parameters
+        ------------
+        host : str
+            The address to listen on.
+        port : int
+            The port to listen on. If 0, a free port is chosen.
+
+        Returns
+        -------
+        port : int
+            The port the server is listening on.
+
+        """
+        self._server = await asyncio.start_server(self._handle, host, port)
+        return self._server.sockets[0].getsockname()[1]
+
+    async def serve_forever(self, host='0.0.0.0', port=8765):
+        """Starts the server and serves stations until it is cancelled."""
+        await self.start(host, port)
+        async with self._server:
+            await self._server.serve_forever()
+
+    async def stop(self):
+        """Stops listening and closes the connections to the stations."""
+        self._server.close()
+        for writer in list(self._writers):
+            writer.close()
+        await self._server.wait_closed()
+
+
+class _ServerThread:
+    # A SignInServer running in its own thread and event loop.
+
+    def __init__(self, server, host, port):
+        self.server = server
+        self._loop = asyncio.new_event_loop()
+        self._error = None
+        started = threading.Event()
+
+        def run():
+            asyncio.set_event_loop(self._loop)
+            try:
+                self.port = self._loop.run_until_complete(
+                    server.start(host, port))
+            except OSError as error:
+                self._error = error
+                return
+            finally:
+                started.set()
+            self._loop.run_forever()
+
+        self._thread = threading.Thread(target=run, name='SignInServer',
+                                        daemon=True)
+        self._thread.start()
+        started.wait()
+        if self._error is not None:
+            self._loop.close()
+            raise self._error
+
+    def stop(self):
+        asyncio.run_coroutine_threadsafe(self.server.stop(),
+                                         self._loop).result()
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join()
+        self._loop.close()
+
+
+def serve_in_thread(storage, host='127.0.0.1', port=0, rollups=None):
+    """Runs a SignInServer in a background thread.
+
+    This is meant for tests and benchmarks, which need a real server on the
+    loopback address without running a separate program.
+
+    Parameters
+    ------------
+    storage : SignInStorage.StorageBackend
+        The storage backend every sign-in is saved to.
+    host : str
+        The address to listen on.
+    port : int
+        The port to listen on. If 0 (the default), a free port is chosen.
+    rollups : SignInAnalytics.SignInRollups, optional
+        If given, the visit counts updated after each batch is saved.
+
+    Returns
+    -------
+    running : object
+        Has the `server` (SignInServer), the `port` it is listening on, and a
+        `stop()` method that shuts the server down.
+
+    """
+    return _ServerThread(SignInServer(storage, rollups), host, port)
+
+
+# This section runs the server from the command line. See the module notes
+# above for an example.
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser(description=("Sign-in aggregation server"
+                                                  " for the Tutor Center."))
+    parser.add_argument('--database', default='SignIns.db',
+                        help="SQLite database to store the sign-ins in")
+    parser.add_argument('--rollups', default='SignInRollups.db',
+                        help="SQLite database to keep the visit counts in")
+    parser.add_argument('--host', default='0.0.0.0',
+                        help="address to listen on")
+    parser.add_argument('--port', type=int, default=8765,
+                        help="port to listen on")
+    arguments = parser.parse_args()
+
+    storage = SignInStorage.SQLiteStorage(arguments.database)
+    rollups = SignInAnalytics.SignInRollups(arguments.rollups)
+    print("Storing sign-ins in %s; listening on %s:%d."
+          % (arguments.database, arguments.host, arguments.port))
+    try:
+        asyncio.run(SignInServer(storage, rollups).serve_forever(
+            arguments.host, arguments.port))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        storage.close()
+        rollups.close()
@@ -0,0 +1,470 @@
+# -*- coding: utf-8 -*-
+"""The sign-in logic of the Tutor Center login system, without the GUI.
+
+This module contains everything that happens when a student signs in to the
+Tutor Center, apart from reading the entries on the screen: checking the
+entries, adding the date and time, and saving the sign-in to a storage
+backend. It also matches each sign-out to the student's open visit, so that
+the length of every visit is saved. The login system GUI (TCLogin.py) passes
+the student's entries to a `SignInService`, and scripts (such as the
+benchmarks in the benchmarks folder) can do the same without needing a
+display.
+
+Routine Listings
+-----------------
+ANUMBER_PATTERN Matches an A-number as printed on a student card.
+OPENING_HOURS   The hours the Tutor Center is open on each day of the week.
+SignInError     Raised when a student's entries cannot be signed in.
+SignInService   Class that checks, timestamps and saves each sign-in.
+
+"""
+
+import datetime
+import re
+import threading
+
+import SignInStorage
+import SignInTimings
+
+# An A-number as printed on a student card: "A" or "a" followed by 8 digits.
+# Typed A-numbers are only held to the looser rule of `_check_anumber`;
+# scanned cards are read with the same form (see BadgeScanner.py).
+ANUMBER_PATTERN = re.compile(r'[Aa][0-9]{8}')
+
+# The opening and closing hours of the Tutor Center on each day of the week
+# (Monday is 0), as shown on the login screen. Days that are not listed are
+# closed. Visits still open at closing time are signed out at closing time.
+OPENING_HOURS = {0: (8, 19), 1: (8, 19), 2: (8, 19), 3: (8, 19), 4: (8, 16)}
+
+
+class SignInError(ValueError):
+    """SignInError is raised when a student's entries cannot be signed in.
+
+    Attributes
+    ------------
+    title : str
+        A short title for the problem, shown as the title of the message box.
+    message : str
+        A description of the problem, written for the student.
+
+    """
+
+    def __init__(self, title, message):
+        self.title = title
+        self.message = message
+        super().__init__("%s: %s" % (title, message))
+
+
+class SignInService:
+    """SignInService checks, timestamps and saves each sign-in.
+
+    The service keeps an index of the open visits (the sign-ins not yet
+    signed out of), keyed by A-number, so a sign-out is matched to its visit
+    without searching the storage backend. The index is read from the
+    storage backend once, from the sign-ins of the last `COLD_START_DAYS`
+    days: the first time it is needed, or on a background thread started by
+    `load_in_background`. Students can sign in while it is read in the
+    background; their sign-ins are added to the index once it has been read.
+
+    Attributes
+    ------------
+    storage : SignInStorage.StorageBackend
+        The storage backend each sign-in is saved to.
+    catalog : CourseInfo.CourseCatalog or None
+        If given, the course of each sign-in must be in this catalog.
+    clock : callable
+        Returns the current date and time. Defaults to
+        `datetime.datetime.now`; benchmarks may replace it to simulate
+        sign-ins at other times.
+    rollups : SignInAnalytics.SignInRollups or None
+        If given, the visit counts updated after each sign-in is saved.
+    profiles : StudentProfiles.StudentProfiles or None
+        If given, the student profiles updated after each sign-in is saved.
+    timings : SignInTimings.SpanRecorder
+        Times each stage of every sign-in and sign-out. Defaults to
+        `SignInTimings.TIMINGS`.
+    listeners : list of callable
+        Called with ("sign_in", record) after each sign-in is saved, and with
+        ("sign_out", record) after each sign-out is saved (see `subscribe`).
+    load_error : Exception or None
+        The error that stopped the index of open visits being read in the
+        background, if it was (see `load_in_background`).
+    COLD_START_DAYS : int
+        How many days back the storage backend is searched for open visits.
+
+    See Also
+    -----------
+    SignInStorage.py : Module containing the classes for saving sign-ins.
+
+    """
+
+    COLD_START_DAYS = 7
+
+    def __init__(self, storage, catalog=None, clock=datetime.datetime.now,
+                 rollups=None, profiles=None, timings=None):
+        self.storage = storage
+        self.catalog = catalog
+        self.clock = clock
+        self.rollups = rollups
+        self.profiles = profiles
+        if timings is None:
+            timings = SignInTimings.TIMINGS
+        self.timings = timings
+        self.listeners = []
+        self._open = None
+        # While the index is read in the background, the visits started
+        # since are kept in `_pending`, and the first sign-in of each student
+        # in `_arrived`.
+        self._loader = None
+        self._loaded = None
+        self.load_error = None
+        self._pending = {}
+        self._arrived = {}
+
+    def subscribe(self, listener):
+        """Adds a listener to the sign-ins and sign-outs as they are saved.
+
+        This is the event stream the live occupancy dashboard is fed from
+        (see OccupancyDashboard.py), so it never has to read the saved
+        sign-ins.
+
+        Parameters
+        ------------
+        listener : callable
+            Called as `listener(kind, record)`, where `kind` is "sign_in" or
+            "sign_out" and `record` is the SignInStorage.SignInRecord saved.
+            It is called straight after the record is saved, so it should
+            return quickly.
+
+        """
+        self.listeners.append(listener)
+
+    def _publish(self, kind, record):
+        # Passes a saved record to every listener. A listener that fails is
+        # printed rather than raised, so a student can still sign in.
+        for listener in self.listeners:
+            try:
+                listener(kind, record)
+            except Exception as error:
+                print("Could not pass the %s to %r: %s"
+                      % (kind.replace('_', '-'), listener, error))
+
+    def _check_anumber(self, anumber):
+        # Raises SignInError unless the A-number is 9 characters long and
+        # starts with "A" or "a".
+        if len(anumber) != 9 or not (anumber.startswith('A')
+                                     or anumber.startswith('a')):
+            raise SignInError("A-Number Error",
+                              "Please check your A-Number and try again.")
+
+    def validate(self, anumber, course_prefix, course_name):
+        """Checks the A-number and course entered by a student.
+
+        The A-number must be 9 characters long and start with "A" or "a", and
+        a course under the chosen course prefix must have been chosen (and be
+        in `catalog`, if one was given). Scanned cards are held to the
+        stricter `ANUMBER_PATTERN` when they are read (see
+        BadgeScanner.parse_payload), so this only matters for typed entries.
+
+        Parameters
+        ------------
+        anumber : str
+            The A-number entered by the student.
+        course_prefix : str
+            The course prefix chosen by the student.
+        course_name : str
+            The course name chosen by the student.
+
+        Raises
+        -------
+        SignInError
+            If the A-number or course is not valid.
+
+        """
+        self._check_anumber(anumber)
+        if not course_name or not course_name.startswith(course_prefix + ' '):
+            known = False
+        elif self.catalog is not None:
+            number = course_name.split(':')[0]
+            known = course_name in self.catalog.find(number)
+        else:
+            known = True
+        if not known:
+            raise SignInError("Course Error",
+                              "Please choose your course from the list and "
+                              "try again.")
+
+    def sign_in(self, anumber, major, class_rank, course_prefix, course_name,
+                when=None):
+        """Checks, timestamps and saves a single sign-in.
+
+        Parameters
+        ------------
+        anumber : str
+            The A-number entered by the student.
+        major : str
+            The major chosen by the student.
+        class_rank : str
+            The class rank chosen by the student.
+        course_prefix : str
+            The course prefix chosen by the student.
+        course_name : str
+            The course name chosen by the student.
+        when : datetime.datetime, optional
+            The time of the sign-in. Defaults to the current time from `clock`.
+
+        Returns
+        -------
+        record : SignInStorage.SignInRecord
+            The sign-in that was saved.
+
+        Raises
+        -------
+        SignInError
+            If the A-number or course is not valid. Nothing is saved.
+
+        Notes
+        ------
+        If the student never signed out of their last visit, that visit is
+        signed out of at the time of this sign-in (or at the closing time of
+        the day it started, if that is earlier; see `close_stale`).
+
+        """
+        span = self.timings.span
+        with span('sign_in.validate'):
+            self.validate(anumber, course_prefix, course_name)
+        if when is None:
+            when = self.clock()
+        # The time is saved to the second; the date, day and time shown in
+        # the Masterfile are written from it when it is exported.
+        when = when.replace(microsecond=0)
+        visits = self._visits()
+        record = SignInStorage.SignInRecord(anumber, class_rank, major,
+                                            course_prefix, course_name, when)
+        # The sign-in is saved before the last visit is signed out of, so a
+        # sign-in that cannot be saved leaves the last visit open.
+        with span('sign_in.storage'):
+            self.storage.append(record)
+        with span('sign_in.close_previous'):
+            if self._open is None:
+                self._arrived.setdefault(anumber.upper(), when)
+            previous = visits.get(anumber.upper())
+            if previous is not None:
+                self._close(previous, max(min(when, _closing_time(previous)),
+                                          previous.signed_in))
+        visits[anumber.upper()] = record
+        if self.rollups is not None:
+            with span('sign_in.rollups'):
+                self.rollups.add(record)
+        if self.profiles is not None:
+            with span('sign_in.profiles'):
+                self.profiles.add(record)
+        with span('sign_in.listeners'):
+            self._publish('sign_in', record)
+        return record
+
+    def sign_out(self, anumber, when=None):
+        """Signs a student out of their open visit.
+
+        Parameters
+        ------------
+        anumber : str
+            The A-number entered by the student.
+        when : datetime.datetime, optional
+            The time of the sign-out. Defaults to the current time from
+            `clock`.
+
+        Returns
+        -------
+        record : SignInStorage.SignInRecord
+            The visit that was signed out of, with its `signed_out` time set.
+
+        Raises
+        -------
+        SignInError
+            If the A-number is not valid, or the student has no open visit.
+            While the index of open visits is still being read in the
+            background, only the visits started since can be signed out of;
+            any other student is asked to try again.
+
+        """
+        self._check_anumber(anumber)
+        visit = self._visits().get(anumber.upper())
+        if visit is None and self._waiting():
+            # The visit may have started before the login system did, and
+            # the index is not read yet. Waiting for it here would freeze
+            # the login window.
+            raise SignInError("Sign-Out Error",
+                              "The sign-ins are still being read. Please try "
+                              "again in a moment.")
+        if visit is None:
+            raise SignInError("Sign-Out Error",
+                              "You are not signed in. Please sign in first.")
+        if when is None:
+            when = self.clock()
+        when = max(when.replace(microsecond=0), visit.signed_in)
+        return self._close(visit, when)
+
+    def _close(self, visit, when):
+        # Saves the sign-out of an open visit and removes it from the index.
+        record = visit._replace(signed_out=when)
+        with self.timings.span('sign_out.storage'):
+            self.storage.sign_out(record)
+        index = self._open if self._open is not None else self._pending
+        del index[visit.anumber.upper()]
+        self._publish('sign_out', record)
+        return record
+
+    def open_visits(self):
+        """Returns the index of open visits, reading it first if needed.
+
+        If the index is being read in the background, this waits until it
+        has been read. If reading it in the background failed, it is read
+        again here.
+
+        Returns
+        -------
+        visits : dict
+            The open visits (SignInStorage.SignInRecord), keyed by A-number in
+            upper case. The dictionary is kept up to date by the service, and
+            should not be changed.
+
+        """
+        if self._open is not None:
+            return self._open
+        if self._loader is not None:
+            self._loader.join()
+        if self._loader is not None and self.load_error is None:
+            visits = self._loaded
+        else:
+            since = self.clock() - datetime.timedelta(
+                days=self.COLD_START_DAYS)
+            with self.timings.span('open_visits.load'):
+                visits = self.storage.open_visits(since)
+        # A visit read that started after a student's first sign-in while
+        # the index was read was saved since, and is left to the pending
+        # index (it may have been signed out of since). A student who signed
+        # in while the index was read is signed out of the visit they left
+        # open before, as `sign_in` would have done.
+        pending, self._pending = self._pending, {}
+        arrived, self._arrived = self._arrived, {}
+        self._open = {}
+        for visit in visits:
+            key = visit.anumber.upper()
+            if key not in arrived or visit.signed_in < arrived[key]:
+                self._open[key] = visit
+        for key, when in arrived.items():
+            previous = self._open.get(key)
+            if previous is not None:
+                self._close(previous, max(min(when, _closing_time(previous)),
+                                          previous.signed_in))
+        self._open.update(pending)
+        return self._open
+
+    def load_in_background(self):
+        """Starts reading the index of open visits on a background thread.
+
+        Reading the index can take a while (the "workbook" backend first has
+        to load the whole Masterfile), so a GUI can call this when it starts
+        and keep responding meanwhile. Students can sign in while the index
+        is read; `open_visits` adds their sign-ins to it once it has been
+        read. Does nothing if the index has already been read, or is being
+        read.
+
+        If the index cannot be read, the error is kept in `load_error` and
+        the index stays unread (sign-ins are still saved, and kept as
+        pending); calling this again tries again.
+
+        Returns
+        -------
+        thread : threading.Thread or None
+            The thread reading the index, or None if it was already read.
+
+        """
+        if self._open is not None or self.loading:
+            return self._loader
+        since = self.clock() - datetime.timedelta(days=self.COLD_START_DAYS)
+        loaded = []
+
+        def load():
+            try:
+                with self.timings.span('open_visits.load'):
+                    loaded.extend(self.storage.open_visits(since))
+            except Exception as error:
+                print("Could not read the open visits: %s" % error)
+                self.load_error = error
+
+        self.load_error = None
+        self._loaded = loaded
+        self._loader = threading.Thread(target=load, name='OpenVisitLoader',
+                                        daemon=True)
+        self._loader.start()
+        return self._loader
+
+    @property
+    def loading(self):
+        """True while the index of open visits is read in the background."""
+        return (self._open is None and self._loader is not None
+                and self._loader.is_alive())
+
+    def _waiting(self):
+        # True while the index is being read in the background, or reading
+        # it there failed and has not been tried again.
+        return self._open is None and self._loader is not None and (
+            self.loading or self.load_error is not None)
+
+    def _visits(self):
+        # Returns the index of open visits or, while it is still waiting to
+        # be read in the background, the visits started since.
+        if self._waiting():
+            return self._pending
+        return self.open_visits()
+
+    def close_stale(self, now=None):
+        """Signs out of the visits left open past closing time.
+
+        A visit still open after the Tutor Center closed (see
+        `OPENING_HOURS`) on the day it started is signed out of at closing
+        time, or at midnight if it started on a closed day or after closing.
+
+        Parameters
+        ------------
+        now : datetime.datetime, optional
+            The current time. Defaults to the current time from `clock`.
+
+        Returns
+        -------
+        closed : list of SignInStorage.SignInRecord
+            The visits that were signed out of. Nothing is signed out of
+            while the index is still waiting to be read in the background.
+
+        """
+        if self._waiting():
+            return []
+        if now is None:
+            now = self.clock()
+        closed = []
+        for visit in list(self.open_visits().values()):
+            closing = _closing_time(visit)
+            if now >= closing:
+                closed.append(self._close(visit, closing))
+        return closed
+
+    def close(self):
+        """Closes the storage backend, saving any unsaved sign-ins."""
+        self.storage.close()
+        if self.rollups is not None:
+            self.rollups.close()
+        if self.profiles is not None:
+            self.profiles.close()
+
+
+def _closing_time(visit):
+    # Returns the time the Tutor Center closed on the day a visit started, or
+    # midnight if it started on a closed day or after closing.
+    start = visit.signed_in
+    day = datetime.datetime.combine(start.date(), datetime.time())
+    hours = OPENING_HOURS.get(start.weekday())
+    if hours is not None and start.hour < hours[1]:
+        return day + datetime.timedelta(hours=hours[1])
+    return day + datetime.timedelta(days=1)
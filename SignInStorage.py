@@ -0,0 +1,1771 @@
+# -*- coding: utf-8 -*-
+"""Storage backends for the Tutor Center login system.
+
+This module contains the classes used by the Tutor Center login system
+(TCLogin.py) to save the sign-in records of each student. Rather than opening,
+appending to, and re-saving the entire Masterfile.xlsx spreadsheet every time a
+student signs in, a sign-in is written to a storage backend that only has to
+write that one record. The records can then be exported to the "Main Data"
+sheet of Masterfile.xlsx whenever the Tutor Center Supervisor needs them.
+
+Routine Listings
+-----------------
+COLUMNS         The column layout of the "Main Data" sheet in Masterfile.xlsx.
+SignInRecord    The values of a single sign-in, with its time as a datetime.
+display_row     Returns a sign-in as a row of the "Main Data" sheet.
+to_record       Returns a sign-in record from its saved values.
+StorageBackend  Base class describing what every storage backend must do.
+JournalStorage  Append-only sign-in journal saved as JSON-lines segment files.
+WorkbookStorage Masterfile.xlsx kept in memory and saved in batches by a
+                background writer thread, behind a write-ahead log.
+SQLiteStorage   Indexed SQLite database of sign-ins.
+RemoteStorage   Sends sign-ins to a SignInServer, buffering them locally.
+open_storage    Creates a storage backend from its name.
+
+Notes
+------
+To export the sign-in journal to Masterfile.xlsx, run this script from the
+command line:
+
+    python SignInStorage.py export
+
+Only the sign-ins that have not been exported before are added to the
+spreadsheet, so this can be run as often as needed. Visits signed out of
+after they were exported have their "Time Out" and "Minutes" filled in by
+the next export. To use the SQLite
+database instead, first copy the sign-ins already in Masterfile.xlsx into the
+database (this only needs to be done once):
+
+    python SignInStorage.py import --backend sqlite
+
+"""
+
+import collections
+import datetime
+import functools
+import json
+import os
+import queue
+import socket
+import threading
+import time
+
+import SignInTimings
+
+
+# The order of the columns in the "Main Data" sheet of Masterfile.xlsx. The
+# "Date", "Day", "Time In", "Time Out" and "Minutes" columns are only written
+# when a sign-in is exported to the Masterfile (see `display_row`); the
+# storage backends save the times a student signed in and out as timestamps
+# instead.
+COLUMNS = ['Anumber', 'Class Rank', 'Major', 'Course Prefix', 'Course Name',
+           'Date', 'Day', 'Time In', 'Time Out', 'Minutes']
+
+# How the date, day and time of a sign-in are written in the "Main Data" sheet.
+DATE_FORMAT = "%A,%B %d,%Y"
+DAY_FORMAT = "%A"
+TIME_FORMAT = "%I:%M %p"
+
+# A single sign-in. This is a tuple with a fixed set of named fields, so it is
+# cheap to build and can be passed straight to any storage backend. The
+# `signed_in` field is the date and time of the sign-in, as a
+# datetime.datetime to the second, and `signed_out` is the time the student
+# signed out, or None while the visit is still open.
+SignInRecord = collections.namedtuple('SignInRecord', [
+    'anumber', 'class_rank', 'major', 'course_prefix', 'course_name',
+    'signed_in', 'signed_out'], defaults=[None])
+
+# The key each field of a SignInRecord is saved under in the journal.
+RECORD_KEYS = COLUMNS[:5] + ['Signed In', 'Signed Out']
+
+
+def display_row(record):
+    """Returns a sign-in as a row of the "Main Data" sheet.
+
+    Parameters
+    ------------
+    record : SignInRecord
+        The sign-in.
+
+    Returns
+    -------
+    row : list
+        The values of the sign-in, in the order given by `COLUMNS`, with the
+        date, day and times written the way the Masterfile has always shown
+        them, and the length of the visit in whole minutes.
+
+    """
+    signed_in = record[5]
+    if signed_in is None:
+        return list(record[:5]) + [None] * 5
+    row = list(record[:5]) + [signed_in.strftime(DATE_FORMAT),
+                              signed_in.strftime(DAY_FORMAT),
+                              signed_in.strftime(TIME_FORMAT)]
+    return row + _display_sign_out(record)
+
+
+def _display_sign_out(record):
+    # Returns the "Time Out" and "Minutes" columns of a sign-in.
+    signed_out = record[6] if len(record) > 6 else None
+    if signed_out is None or record[5] is None:
+        return [None, None]
+    minutes = round((signed_out - record[5]).total_seconds() / 60)
+    return [signed_out.strftime(TIME_FORMAT), minutes]
+
+
+def to_record(row):
+    """Returns a sign-in record from its saved values.
+
+    Parameters
+    ------------
+    row : sequence
+        Either the values of a `SignInRecord` (the times may be datetimes or
+        ISO 8601 strings), or a row of the "Main Data" sheet in `COLUMNS`
+        order. Rows written by earlier versions of the login system, without
+        the "Time Out" and "Minutes" columns, are read too.
+
+    Returns
+    -------
+    record : SignInRecord
+        The sign-in. Its `signed_in` field is None if the time of the sign-in
+        could not be read.
+
+    """
+    if len(row) >= 8:
+        signed_in = _display_time(row[5], row[7])
+        signed_out = None
+        if len(row) > 8 and row[8] is not None and signed_in is not None:
+            signed_out = _display_time(signed_in, row[8])
+    else:
+        signed_in = _timestamp(row[5])
+        signed_out = _timestamp(row[6]) if len(row) > 6 else None
+    return SignInRecord(row[0], row[1], row[2], row[3], row[4], signed_in,
+                        signed_out)
+
+
+def _timestamp(value):
+    # Returns a time saved as a datetime or an ISO 8601 string as a datetime.
+    if isinstance(value, str):
+        try:
+            return datetime.datetime.fromisoformat(value)
+        except ValueError:
+            return None
+    return value
+
+
+def _display_time(date, time_in):
+    # Returns the time of a sign-in from the "Date" and "Time In" columns of
+    # the "Main Data" sheet (which Excel may have turned into a date and a
+    # time), or None if they cannot be read.
+    if hasattr(date, 'year'):
+        day = datetime.date(date.year, date.month, date.day)
+    else:
+        day = _parse_display(date, DATE_FORMAT)
+    if hasattr(time_in, 'hour'):
+        clock = datetime.time(time_in.hour, time_in.minute)
+    else:
+        clock = _parse_display(time_in, TIME_FORMAT)
+    if day is None or clock is None:
+        return None
+    return datetime.datetime.combine(day, clock)
+
+
+@functools.lru_cache(maxsize=4096)
+def _parse_display(text, display_format):
+    # Reads a date or a time written in the Masterfile. Each distinct value is
+    # only read once, as the same dates and times appear many times.
+    try:
+        parsed = datetime.datetime.strptime(text.strip(), display_format)
+    except (AttributeError, ValueError):
+        return None
+    if display_format == TIME_FORMAT:
+        return parsed.time()
+    return parsed.date()
+
+
+class StorageBackend:
+    """StorageBackend describes how the login system saves its records.
+
+    Each storage backend saves the records passed to `append` and, when asked,
+    exports them to the "Main Data" sheet of the Masterfile. New backends
+    should inherit from this class and replace each of its methods.
+
+    See Also
+    -----------
+    JournalStorage : Saves the records to an append-only journal.
+    WorkbookStorage : Saves the records to Masterfile.xlsx in batches.
+    SQLiteStorage : Saves the records to an indexed SQLite database.
+    RemoteStorage : Sends the records to a sign-in aggregation server.
+
+    """
+
+    def append(self, row):
+        """Saves a single sign-in record.
+
+        Parameters
+        ------------
+        row : SignInRecord
+            The sign-in to save.
+
+        """
+        raise NotImplementedError
+
+    def extend(self, rows):
+        """Saves many sign-in records at once.
+
+        Backends that can save a batch of records faster than one at a time
+        replace this method.
+
+        Parameters
+        ------------
+        rows : iterable of SignInRecord
+            The sign-ins to save.
+
+        """
+        for row in rows:
+            self.append(row)
+
+    def sign_out(self, record):
+        """Saves the time a student signed out of a visit.
+
+        Parameters
+        ------------
+        record : SignInRecord
+            The visit, as saved by `append`, with its `signed_out` time set.
+
+        """
+        raise NotImplementedError
+
+    def save_batch(self, rows, sign_outs):
+        """Saves a batch of sign-ins and sign-outs.
+
+        Backends that can save the whole batch in one transaction, so that
+        either all of it or none of it is saved, replace this method.
+
+        Parameters
+        ------------
+        rows : list of SignInRecord
+            The sign-ins to save.
+        sign_outs : list of SignInRecord
+            The visits signed out of, with their `signed_out` times set.
+
+        """
+        if rows:
+            self.extend(rows)
+        for record in sign_outs:
+            self.sign_out(record)
+
+    def iter_rows(self):
+        """Yields every saved sign-in, oldest first, as a SignInRecord."""
+        raise NotImplementedError
+
+    def open_visits(self, since):
+        """Returns the visits started since a given time that are still open.
+
+        Backends that can find the recent sign-ins without reading every
+        record replace this method.
+
+        Parameters
+        ------------
+        since : datetime.datetime
+            The earliest sign-in time to look at.
+
+        Returns
+        -------
+        visits : list of SignInRecord
+            The sign-ins with no sign-out time, oldest first.
+
+        """
+        return [record for record in self.iter_rows()
+                if record.signed_in is not None and record.signed_in >= since
+                and record.signed_out is None]
+
+    def export(self, workbook='Masterfile.xlsx'):
+        """Adds the records that have not been exported yet to the workbook.
+
+        Parameters
+        ------------
+        workbook : str
+            Path to the Masterfile spreadsheet to add the records to.
+
+        Returns
+        -------
+        exported : int
+            The number of records added to the spreadsheet.
+
+        """
+        raise NotImplementedError
+
+    def close(self):
+        """Releases any files or connections held by the backend."""
+        pass
+
+
+class JournalStorage(StorageBackend):
+    """JournalStorage saves sign-ins to an append-only journal.
+
+    Each sign-in is written as one line of JSON (with its time as an ISO 8601
+    timestamp) at the end of the newest journal segment, and the segment is
+    flushed to disk (fsync) before `append` returns. Writing a record
+    therefore takes the same amount of time no matter how many records have
+    been saved before. Once a segment grows past `segment_bytes` a new
+    segment is started, so no single file grows without bound.
+
+    Sign-outs are written the same way to their own file (signouts.jsonl) in
+    the journal folder, and are matched to their sign-ins by A-number and
+    sign-in time when the journal is read.
+
+    Attributes
+    ------------
+    directory : str
+        The folder holding the journal segments and the export checkpoint.
+    segment_bytes : int
+        The size a segment may reach before a new segment is started.
+
+    See Also
+    -----------
+    openpyxl.load_workbook : Loads Excel workbook for use in saving data.
+
+    """
+
+    def __init__(self, directory='SignInJournal', segment_bytes=1048576):
+        self.directory = directory
+        self.segment_bytes = segment_bytes
+        os.makedirs(directory, exist_ok=True)
+
+        # Re-opens the newest segment (if there is one) so that new records
+        # are added after the ones saved before the last restart. If the last
+        # record was only partly written, it is ended so that the next record
+        # starts on a line of its own.
+        segments = self.segments()
+        if segments:
+            self._segment_number = int(segments[-1][8:13])
+        else:
+            self._segment_number = 1
+        self._file = _open_journal_file(
+            self._segment_path(self._segment_number))
+        self._sign_out_file = None
+
+    def _segment_path(self, number):
+        return os.path.join(self.directory, 'journal-%05d.jsonl' % number)
+
+    def _sign_outs_path(self):
+        return os.path.join(self.directory, 'signouts.jsonl')
+
+    def _checkpoint_path(self):
+        return os.path.join(self.directory, 'exported.json')
+
+    def segments(self):
+        """Returns the file names of the journal segments, oldest first."""
+        return sorted(name for name in os.listdir(self.directory)
+                      if name.startswith('journal-')
+                      and name.endswith('.jsonl'))
+
+    def append(self, row):
+        """Writes a single sign-in record to the end of the journal.
+
+        Parameters
+        ------------
+        row : SignInRecord
+            The sign-in to save.
+
+        """
+        self.extend([row])
+
+    def extend(self, rows):
+        """Writes many sign-in records to the end of the journal at once.
+
+        The records are flushed to disk together, once each segment they are
+        written to is finished.
+
+        Parameters
+        ------------
+        rows : iterable of SignInRecord
+            The sign-ins to save.
+
+        """
+        for row in rows:
+            values = dict(zip(RECORD_KEYS, row[:5]))
+            values['Signed In'] = (row[5].isoformat() if row[5] is not None
+                                   else None)
+            if len(row) > 6 and row[6] is not None:
+                values['Signed Out'] = row[6].isoformat()
+            line = json.dumps(values, ensure_ascii=False)
+            self._file.write((line + '\n').encode('utf-8'))
+
+            # Starts a new segment once the current one is full.
+            if self._file.tell() >= self.segment_bytes:
+                self._sync()
+                self._file.close()
+                self._segment_number += 1
+                self._file = open(self._segment_path(self._segment_number),
+                                  'ab')
+        self._sync()
+
+    def _sync(self):
+        self._file.flush()
+        os.fsync(self._file.fileno())
+
+    def sign_out(self, record):
+        """Writes the time a student signed out to the end of the journal.
+
+        Parameters
+        ------------
+        record : SignInRecord
+            The visit, as saved by `append`, with its `signed_out` time set.
+
+        """
+        if self._sign_out_file is None:
+            self._sign_out_file = _open_journal_file(self._sign_outs_path())
+        line = json.dumps({'Anumber': record[0],
+                           'Signed In': record[5].isoformat(),
+                           'Signed Out': record[6].isoformat()},
+                          ensure_ascii=False)
+        self._sign_out_file.write((line + '\n').encode('utf-8'))
+        self._sign_out_file.flush()
+        os.fsync(self._sign_out_file.fileno())
+
+    def iter_sign_outs(self):
+        """Yields every sign-out written by `sign_out`, oldest first.
+
+        Only the `anumber`, `signed_in` and `signed_out` fields of each
+        yielded SignInRecord are filled in.
+
+        """
+        try:
+            file = open(self._sign_outs_path(), 'rb')
+        except FileNotFoundError:
+            return
+        with file:
+            for line in file:
+                try:
+                    values = json.loads(line)
+                except ValueError:
+                    continue
+                yield SignInRecord(values.get('Anumber'), None, None, None,
+                                   None, _timestamp(values.get('Signed In')),
+                                   _timestamp(values.get('Signed Out')))
+
+    def _sign_out_times(self):
+        # Returns the sign-out time of each visit that has one, keyed by the
+        # A-number and the sign-in time as written in the journal.
+        times = {}
+        try:
+            file = open(self._sign_outs_path(), 'rb')
+        except FileNotFoundError:
+            return times
+        with file:
+            for line in file:
+                try:
+                    values = json.loads(line)
+                except ValueError:
+                    continue
+                times[values.get('Anumber'), values.get('Signed In')] = \
+                    values.get('Signed Out')
+        return times
+
+    def tell(self):
+        """Returns the position just after the last record written.
+
+        Returns
+        -------
+        position : tuple of int
+            The segment number and the byte offset within that segment.
+
+        """
+        return (self._segment_number, self._file.tell())
+
+    def iter_rows(self, start=None, stop=None):
+        """Yields every record in the journal, oldest first.
+
+        A line that was only partly written (for example, if the computer lost
+        power in the middle of a sign-in) is skipped. Journals written by
+        earlier versions of the login system, which saved the date, day and
+        time as text, are read too.
+
+        Parameters
+        ------------
+        start : tuple of int, optional
+            A position returned by `tell`. If given, only the records written
+            after that position are yielded.
+        stop : tuple of int, optional
+            A position returned by `tell`. If given, only the records written
+            before that position are yielded.
+
+        """
+        sign_outs = self._sign_out_times()
+        for name in self.segments():
+            number = int(name[8:13])
+            if start is not None and number < start[0]:
+                continue
+            if stop is not None and number > stop[0]:
+                break
+            with open(os.path.join(self.directory, name), 'rb') as segment:
+                if start is not None and number == start[0]:
+                    segment.seek(start[1])
+                while True:
+                    if (stop is not None and number == stop[0]
+                            and segment.tell() >= stop[1]):
+                        break
+                    line = segment.readline()
+                    if not line:
+                        break
+                    try:
+                        values = json.loads(line)
+                    except ValueError:
+                        continue
+                    if 'Signed In' in values:
+                        keys = RECORD_KEYS
+                        if sign_outs and 'Signed Out' not in values:
+                            values['Signed Out'] = sign_outs.get(
+                                (values.get('Anumber'), values['Signed In']))
+                    else:
+                        keys = COLUMNS
+                    yield to_record([values.get(key) for key in keys])
+
+    def open_visits(self, since):
+        """Returns the visits started since a given time that are still open.
+
+        Only the newest journal segments are read, back to the first one that
+        starts before `since`.
+
+        """
+        visits = []
+        for name in reversed(self.segments()):
+            number = int(name[8:13])
+            records = list(self.iter_rows((number, 0), (number + 1, 0)))
+            visits[:0] = [record for record in records
+                          if record.signed_in is not None
+                          and record.signed_in >= since
+                          and record.signed_out is None]
+            if records and records[0].signed_in is not None and \
+                    records[0].signed_in < since:
+                break
+        return visits
+
+    def discard_before(self, position):
+        """Deletes the segments wholly before a position returned by `tell`.
+
+        The segment being written to is never deleted.
+
+        """
+        for name in self.segments():
+            number = int(name[8:13])
+            if number < position[0] and number < self._segment_number:
+                os.remove(os.path.join(self.directory, name))
+
+    def export(self, workbook='Masterfile.xlsx'):
+        """Adds the journal records not yet exported to the "Main Data" sheet.
+
+        The number of records already exported is kept in a checkpoint file in
+        the journal folder, so running the export again only adds the records
+        saved since the last export.
+
+        Parameters
+        ------------
+        workbook : str
+            Path to the Masterfile spreadsheet to add the records to.
+
+        Returns
+        -------
+        exported : int
+            The number of records added to the spreadsheet.
+
+        """
+        from openpyxl import load_workbook
+
+        checkpoint = self._checkpoint_path()
+        done = 0
+        done_sign_outs = 0
+        if os.path.exists(checkpoint):
+            with open(checkpoint, encoding='utf-8') as file:
+                saved = json.load(file)
+            done = saved['exported']
+            done_sign_outs = saved.get('sign_outs', 0)
+
+        wb = load_workbook(workbook)
+        ws = wb["Main Data"]
+        _label_columns(ws)
+        total = 0
+        added = set()
+        for total, record in enumerate(self.iter_rows(), start=1):
+            if total > done:
+                ws.append(display_row(record))
+                added.add((record[0], record[5]))
+
+        # Sign-outs of visits that were exported before the student signed
+        # out are written into the rows already in the workbook.
+        sign_outs = list(self.iter_sign_outs())
+        late = [record for record in sign_outs[done_sign_outs:]
+                if (record[0], record[5]) not in added]
+        if total <= done and not late:
+            return 0
+        _write_sign_outs(ws, late)
+        wb.save(workbook)
+
+        # The checkpoint is replaced in one step so that an interrupted export
+        # can never leave it half written.
+        with open(checkpoint + '.tmp', 'w', encoding='utf-8') as file:
+            json.dump({'exported': max(total, done),
+                       'sign_outs': len(sign_outs)}, file)
+        os.replace(checkpoint + '.tmp', checkpoint)
+        return max(total - done, 0)
+
+    def close(self):
+        """Closes the current journal segment."""
+        self._file.close()
+        if self._sign_out_file is not None:
+            self._sign_out_file.close()
+
+
+def _open_journal_file(path):
+    # Opens a journal file for appending. If its last line was only partly
+    # written, the line is ended so that the next record starts on a line of
+    # its own.
+    file = open(path, 'ab')
+    if file.tell() > 0:
+        with open(path, 'rb') as last:
+            last.seek(-1, os.SEEK_END)
+            if last.read(1) != b'\n':
+                file.write(b'\n')
+                file.flush()
+                os.fsync(file.fileno())
+    return file
+
+
+def _label_columns(ws):
+    # Labels the columns of the "Main Data" sheet that have no label yet (the
+    # "Time Out" and "Minutes" columns were added after the Masterfile was
+    # first made).
+    for number, column in enumerate(COLUMNS, start=1):
+        if ws.cell(row=1, column=number).value is None:
+            ws.cell(row=1, column=number).value = column
+
+
+def _write_sign_outs(ws, records):
+    # Fills in the "Time Out" and "Minutes" columns of the rows of the "Main
+    # Data" sheet for the given visits. The sheet is searched from the bottom,
+    # as the visits signed out of are almost always among the newest rows.
+    # Returns the row numbers and the values they held before, so the
+    # sign-outs can be taken back out.
+    wanted = {}
+    for record in records:
+        row = display_row(record)
+        wanted[row[0], row[5], row[7]] = row[8:10]
+    written = []
+    for number in range(ws.max_row, 1, -1):
+        if not wanted:
+            break
+        key = (ws.cell(row=number, column=1).value,
+               ws.cell(row=number, column=6).value,
+               ws.cell(row=number, column=8).value)
+        values = wanted.pop(key, None)
+        if values is not None:
+            written.append((number, ws.cell(row=number, column=9).value,
+                            ws.cell(row=number, column=10).value))
+            ws.cell(row=number, column=9).value = values[0]
+            ws.cell(row=number, column=10).value = values[1]
+    return written
+
+
+class WorkbookStorage(StorageBackend):
+    """WorkbookStorage keeps Masterfile.xlsx open and saves it in batches.
+
+    Every record given to `append` is first written to a write-ahead log (a
+    `JournalStorage` in `log_directory`), so it is safe on disk before
+    `append` returns, and is then placed in a queue. A background writer
+    thread loads the workbook once, adds the queued records to the "Main
+    Data" sheet and saves the workbook once `flush_rows` records are waiting
+    or the oldest waiting record is `flush_seconds` old, whichever comes
+    first. `close` saves anything still in the queue.
+
+    The workbook is saved to a temporary file that then replaces
+    Masterfile.xlsx in one step, so a failed save can never leave a truncated
+    workbook. If the save fails (for example, because the Masterfile is open
+    in Excel), the records stay in the queue and the save is tried again
+    after a wait that doubles after each failure, up to `max_backoff`
+    seconds. A workbook that cannot be loaded (because it is locked, is not
+    a valid workbook, or has no "Main Data" sheet) is tried again the same
+    way; meanwhile `flush` returns False at once, and reading the sign-ins
+    raises OSError. The position in the log of the last record in the
+    workbook is saved inside the workbook itself (as the custom document
+    property "SignInLogPosition"), so when the login system starts, any
+    logged records that never made it into the workbook (because of a crash,
+    or because the workbook was locked when the login system was closed) are
+    added again.
+    Log segments wholly before that position are deleted after each save.
+    Sign-outs are logged and queued the same way, and the number of logged
+    sign-outs already in the workbook is saved as "SignInLogSignOuts".
+
+    If an `archive` is given, the sign-ins of the semesters that have ended
+    are moved out of the workbook into the archive when it is first loaded
+    (see SignInArchive.py), so the workbook only holds the current semester.
+
+    Attributes
+    ------------
+    workbook : str
+        Path to the Masterfile spreadsheet.
+    log : JournalStorage
+        The write-ahead log every record is written to first.
+    flush_rows : int
+        Number of waiting records that causes the workbook to be saved.
+    flush_seconds : float
+        Longest time, in seconds, a record waits before being saved.
+    max_backoff : float
+        Longest time, in seconds, to wait before trying a failed save again.
+    archive : SignInArchive.SignInArchive or None
+        The archive the sign-ins of past semesters are moved to.
+    error : Exception or None
+        Why the workbook could not be loaded or last could not be saved, or
+        why the writer thread stopped. None once a load or save succeeds.
+
+    See Also
+    -----------
+    openpyxl.load_workbook : Loads Excel workbook for use in saving data.
+
+    """
+
+    # Placed in the queue to ask the writer thread to stop.
+    _STOP = object()
+
+    # The custom document property holding the position in the write-ahead
+    # log just after the last record added to the workbook, and the one
+    # holding the number of logged sign-outs added to the workbook.
+    _POSITION = 'SignInLogPosition'
+    _SIGN_OUTS = 'SignInLogSignOuts'
+
+    def __init__(self, workbook='Masterfile.xlsx', flush_rows=25,
+                 flush_seconds=30.0, log_directory='MasterfileLog',
+                 max_backoff=60.0, archive=None):
+        if isinstance(archive, str):
+            import SignInArchive
+
+            archive = SignInArchive.SignInArchive(archive)
+        self.archive = archive
+        self.workbook = workbook
+        self.log = JournalStorage(log_directory)
+        self.flush_rows = flush_rows
+        self.flush_seconds = flush_seconds
+        self.max_backoff = max_backoff
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._wb = None
+        self._saved_position = None
+        self._saved_sign_outs = 0
+        self._unsaved = 0
+        self._unsaved_lock = threading.Lock()
+        self.error = None
+        # Records logged before this position (and the sign-outs already in
+        # the log) were logged by an earlier run, and are added to the
+        # workbook from the log rather than the queue.
+        self._replay_stop = self.log.tell()
+        self._replay_sign_outs = list(self.log.iter_sign_outs())
+        self._thread = threading.Thread(target=self._run,
+                                        name='WorkbookWriter', daemon=True)
+        self._thread.start()
+
+    def _load(self):
+        from openpyxl import load_workbook
+
+        with self._lock:
+            if self._wb is None:
+                with SignInTimings.TIMINGS.span('workbook.load'):
+                    wb = load_workbook(self.workbook)
+                # A workbook without the sheet cannot be written to, so it
+                # is treated like one that cannot be opened.
+                wb["Main Data"]
+                props = wb.custom_doc_props
+                if self._POSITION in props.names:
+                    segment, offset = props[self._POSITION].value.split(':')
+                    self._saved_position = (int(segment), int(offset))
+                if self._SIGN_OUTS in props.names:
+                    self._saved_sign_outs = int(props[self._SIGN_OUTS].value)
+                self._wb = wb
+
+    def _archive_closed(self):
+        # Moves the sign-ins of the partitions that have ended to the archive
+        # and saves the smaller workbook. A failure is printed rather than
+        # raised; the sign-ins stay in the workbook until the next start.
+        if self.archive is None:
+            return
+        with self._lock:
+            try:
+                moved = self.archive.archive_sheet(self._wb["Main Data"])
+                if moved:
+                    temporary = self.workbook + '.saving'
+                    self._wb.save(temporary)
+                    os.replace(temporary, self.workbook)
+            except Exception as error:
+                print("Could not archive %s: %s" % (self.workbook, error))
+
+    def _replay(self):
+        # Returns the records logged by earlier runs that are not yet in the
+        # workbook, each with the log position just after it.
+        rows = [display_row(record)
+                for record in self.log.iter_rows(self._saved_position,
+                                                 self._replay_stop)]
+        sign_outs = self._replay_sign_outs[self._saved_sign_outs:]
+        with self._unsaved_lock:
+            self._unsaved += len(rows) + len(sign_outs)
+        return [(row, None) for row in rows[:-1]] + \
+            [(row, self._replay_stop) for row in rows[-1:]] + \
+            [(record, None) for record in sign_outs]
+
+    def _write(self, items):
+        # Adds the rows (and sign-outs) to the resident workbook and saves it,
+        # replacing the Masterfile in one step. If the save fails the rows,
+        # sign-outs and document properties are taken back out, so the
+        # resident workbook is as it was and they can be added again with the
+        # next try. The queued sign-outs are SignInRecords; the queued rows
+        # are lists.
+        from openpyxl.packaging.custom import IntProperty, StringProperty
+
+        position = self._saved_position
+        for row, logged in items:
+            if logged is not None:
+                position = logged
+        rows = [row for row, logged in items if isinstance(row, list)]
+        sign_outs = [row for row, logged in items
+                     if isinstance(row, SignInRecord)]
+        span = SignInTimings.TIMINGS.span
+        with self._lock:
+            ws = self._wb["Main Data"]
+            with span('workbook.append'):
+                for row in rows:
+                    ws.append(row)
+            written = []
+            if sign_outs:
+                with span('workbook.sign_outs'):
+                    _label_columns(ws)
+                    written = _write_sign_outs(ws, sign_outs)
+            props = self._wb.custom_doc_props
+            replaced = []
+            for name in (self._POSITION, self._SIGN_OUTS):
+                if name in props.names:
+                    replaced.append(props[name])
+                    del props[name]
+            if position is not None:
+                props.append(StringProperty(name=self._POSITION,
+                                            value='%d:%d' % position))
+            props.append(IntProperty(
+                name=self._SIGN_OUTS,
+                value=self._saved_sign_outs + len(sign_outs)))
+            temporary = self.workbook + '.saving'
+            try:
+                with span('workbook.save'):
+                    self._wb.save(temporary)
+                    os.replace(temporary, self.workbook)
+            except Exception as error:
+                for number, time_out, minutes in written:
+                    ws.cell(row=number, column=9).value = time_out
+                    ws.cell(row=number, column=10).value = minutes
+                if rows:
+                    ws.delete_rows(ws.max_row - len(rows) + 1, len(rows))
+                for name in (self._POSITION, self._SIGN_OUTS):
+                    if name in props.names:
+                        del props[name]
+                for prop in replaced:
+                    props.append(prop)
+                print("Could not save %s: %s" % (self.workbook, error))
+                return False
+        self._saved_position = position
+        self._saved_sign_outs += len(sign_outs)
+        with self._unsaved_lock:
+            self._unsaved -= len(items)
+
+        # The log segments before the saved position are no longer needed.
+        if position is not None:
+            self.log.discard_before(position)
+        return True
+
+    def _run(self):
+        # Runs the writer thread. Nothing it does should raise, but if
+        # anything does, the error is kept and every flush request waiting
+        # is answered, so no caller is left waiting for a dead thread.
+        try:
+            self._work()
+        except Exception as error:
+            self.error = error
+            print("The writer of %s stopped: %s" % (self.workbook, error))
+        while True:
+            try:
+                item = self._queue.get_nowait()
+            except queue.Empty:
+                return
+            if isinstance(item, threading.Event):
+                item.set()
+
+    def _try_write(self, pending):
+        # Writes the waiting records, keeping any error in `error`.
+        try:
+            saved = self._write(pending)
+        except Exception as error:
+            print("Could not save %s: %s" % (self.workbook, error))
+            self.error = error
+            return False
+        if saved:
+            self.error = None
+        return saved
+
+    def _work(self):
+        # Loads the workbook (trying again with a growing wait if it cannot be
+        # opened or read, and answering flush requests meanwhile) and adds any
+        # logged records it is missing.
+        backoff = 1.0
+        held = []
+        while True:
+            try:
+                self._load()
+                break
+            except Exception as error:
+                self.error = error
+                print("Could not open %s: %s" % (self.workbook, error))
+            deadline = time.monotonic() + backoff
+            while True:
+                try:
+                    item = self._queue.get(
+                        timeout=max(0.0, deadline - time.monotonic()))
+                except queue.Empty:
+                    break
+                # The records stay in the log, and are added the next time
+                # the login system starts.
+                if item is self._STOP:
+                    return
+                if isinstance(item, threading.Event):
+                    item.set()
+                else:
+                    held.append(item)
+            backoff = min(backoff * 2, self.max_backoff)
+        self.error = None
+        self._archive_closed()
+        pending = self._replay() + held
+
+        backoff = 1.0
+        deadline = time.monotonic() if pending else None
+        while True:
+            if deadline is None:
+                timeout = None
+            else:
+                timeout = max(0.0, deadline - time.monotonic())
+            try:
+                item = self._queue.get(timeout=timeout)
+            except queue.Empty:
+                item = None
+
+            # A flush request is an Event that is set once the waiting rows
+            # have been saved (or the save has failed).
+            if item is self._STOP or isinstance(item, threading.Event):
+                if pending and self._try_write(pending):
+                    pending = []
+                    deadline = None
+                if item is self._STOP:
+                    return
+                item.set()
+                continue
+
+            if item is not None:
+                pending.append(item)
+                if deadline is None:
+                    deadline = time.monotonic() + self.flush_seconds
+            if pending and (len(pending) >= self.flush_rows
+                            or time.monotonic() >= deadline):
+                if self._try_write(pending):
+                    pending = []
+                    deadline = None
+                    backoff = 1.0
+                else:
+                    deadline = time.monotonic() + backoff
+                    backoff = min(backoff * 2, self.max_backoff)
+
+    def append(self, row):
+        """Logs a single sign-in record and queues it for the workbook.
+
+        Parameters
+        ------------
+        row : SignInRecord
+            The sign-in to save.
+
+        """
+        self.extend([row])
+
+    def extend(self, rows):
+        """Logs many sign-in records at once and queues them.
+
+        Parameters
+        ------------
+        rows : iterable of SignInRecord
+            The sign-ins to save.
+
+        """
+        records = list(rows)
+        if not records:
+            return
+        self.log.extend(records)
+        position = self.log.tell()
+        rows = [display_row(record) for record in records]
+        with self._unsaved_lock:
+            self._unsaved += len(rows)
+        for row in rows[:-1]:
+            self._queue.put((row, None))
+        self._queue.put((rows[-1], position))
+
+    def flush(self):
+        """Waits until the writer thread has tried to save every record.
+
+        Returns at once (with False) if the workbook cannot be loaded, or the
+        writer thread has stopped; the reason is kept in `error`.
+
+        Returns
+        -------
+        saved : bool
+            True if every record logged so far is in the saved workbook.
+
+        """
+        done = threading.Event()
+        self._queue.put(done)
+        while not done.wait(1.0):
+            if not self._thread.is_alive():
+                return False
+        return self._wb is not None and self.pending() == 0
+
+    def _sheet(self):
+        # Returns the "Main Data" sheet once the waiting records are in it,
+        # or raises OSError if the workbook could not be loaded.
+        self.flush()
+        if self._wb is None:
+            raise OSError("Could not open %s: %s" % (self.workbook,
+                                                     self.error))
+        return self._wb["Main Data"]
+
+    def sign_out(self, record):
+        """Logs the time a student signed out and queues it for the workbook.
+
+        Parameters
+        ------------
+        record : SignInRecord
+            The visit, as saved by `append`, with its `signed_out` time set.
+
+        """
+        self.log.sign_out(record)
+        with self._unsaved_lock:
+            self._unsaved += 1
+        self._queue.put((SignInRecord(*record), None))
+
+    def pending(self):
+        """Returns the number of logged records not yet in the workbook.
+
+        Records logged by an earlier run are only counted once the workbook
+        has been loaded.
+
+        """
+        with self._unsaved_lock:
+            return self._unsaved
+
+    def open_visits(self, since):
+        """Returns the visits started since a given time that are still open.
+
+        The "Main Data" sheet is read from the bottom, back to the first
+        sign-in before `since`.
+
+        """
+        ws = self._sheet()
+        visits = []
+        with self._lock:
+            for number in range(ws.max_row, 1, -1):
+                row = [cell.value for cell in ws[number]]
+                if not row or row[0] is None:
+                    continue
+                record = to_record(row)
+                if record.signed_in is None:
+                    continue
+                if record.signed_in < since:
+                    break
+                if record.signed_out is None:
+                    visits.append(record)
+        visits.reverse()
+        return visits
+
+    def iter_rows(self):
+        """Yields every sign-in in the "Main Data" sheet, oldest first."""
+        ws = self._sheet()
+        with self._lock:
+            rows = list(ws.iter_rows(min_row=2, values_only=True))
+        for row in rows:
+            if row and row[0] is not None:
+                yield to_record(row)
+
+    def export(self, workbook='Masterfile.xlsx'):
+        """Saves the queued records to the workbook.
+
+        The records are already written to the Masterfile, so exporting only
+        has to save the records still waiting in the queue. If `workbook` is a
+        different file, a copy of the Masterfile is also saved there.
+
+        Parameters
+        ------------
+        workbook : str
+            Path to the Masterfile spreadsheet to save.
+
+        Returns
+        -------
+        exported : int
+            The number of records that were waiting to be saved.
+
+        """
+        waiting = self.pending()
+        self._sheet()
+        if os.path.abspath(workbook) != os.path.abspath(self.workbook):
+            with self._lock:
+                self._wb.save(workbook)
+        return waiting
+
+    def close(self):
+        """Saves every queued record and stops the writer thread.
+
+        If the workbook cannot be saved, the records stay in the write-ahead
+        log and are added the next time the login system starts.
+
+        Returns
+        -------
+        saved : bool
+            False if some records could not be saved to the workbook (the
+            reason is kept in `error`).
+
+        """
+        self._queue.put(self._STOP)
+        self._thread.join()
+        self.log.close()
+        return self._wb is not None and self.pending() == 0
+
+
+class SQLiteStorage(StorageBackend):
+    """SQLiteStorage saves sign-ins to an indexed SQLite database.
+
+    The `signins` table has one column for each field of a `SignInRecord`,
+    and is indexed on A-number, time and course prefix so that the sign-in
+    history can be searched without reading every record. The times each
+    student signed in and out are saved in the `signed_in` and `signed_out`
+    columns as ISO 8601 timestamps ("YYYY-MM-DD HH:MM:SS"), which sort in
+    time order and can be used directly by SQLite's date and time functions,
+    so finding the sign-ins in a range of times needs no parsing. The
+    database is kept in write-ahead-log mode, so each insert only appends to
+    the log rather than rewriting the database file.
+
+    Each sign-out also adds a row to the `sign_outs` table, so that an
+    export can find the visits signed out of since the last export. Each
+    Masterfile imported with `import_workbook` is recorded in the `imports`
+    table, so it is never imported twice.
+
+    A database written by an earlier version of the login system, with
+    separate date, day and time columns, is converted when it is opened.
+
+    Attributes
+    ------------
+    database : str
+        Path to the SQLite database file.
+    connection : sqlite3.Connection
+        The open connection to the database.
+
+    See Also
+    -----------
+    sqlite3 : The Python interface to SQLite databases.
+
+    """
+
+    # The database column that holds each field of a `SignInRecord`.
+    FIELDS = ['anumber', 'class_rank', 'major', 'course_prefix', 'course_name',
+              'signed_in', 'signed_out']
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS signins (
+            id INTEGER PRIMARY KEY,
+            anumber TEXT NOT NULL,
+            class_rank TEXT,
+            major TEXT,
+            course_prefix TEXT,
+            course_name TEXT,
+            signed_in TEXT,
+            signed_out TEXT
+        );
+        CREATE INDEX IF NOT EXISTS signins_anumber ON signins (anumber);
+        CREATE INDEX IF NOT EXISTS signins_signed_in ON signins (signed_in);
+        CREATE INDEX IF NOT EXISTS signins_course_prefix
+            ON signins (course_prefix);
+        CREATE TABLE IF NOT EXISTS sign_outs (
+            id INTEGER PRIMARY KEY,
+            signin_id INTEGER NOT NULL
+        );
+        CREATE TABLE IF NOT EXISTS exports (
+            workbook TEXT PRIMARY KEY,
+            last_id INTEGER NOT NULL,
+            last_sign_out INTEGER NOT NULL DEFAULT 0
+        );
+        CREATE TABLE IF NOT EXISTS imports (
+            workbook TEXT PRIMARY KEY,
+            rows INTEGER NOT NULL,
+            imported TEXT NOT NULL
+        );
+    """
+
+    def __init__(self, database='SignIns.db'):
+        import sqlite3
+
+        self.database = database
+        # The connection may be closed from a different thread than the one
+        # that opened it (for example, when the window is closed).
+        self.connection = sqlite3.connect(database, check_same_thread=False)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute("PRAGMA synchronous=NORMAL")
+        self._insert = ("INSERT INTO signins (%s) VALUES (%s)"
+                        % (', '.join(self.FIELDS),
+                           ', '.join('?' * len(self.FIELDS))))
+        columns = [column[1] for column in self.connection.execute(
+            "PRAGMA table_info(signins)")]
+        if 'time_in' in columns:
+            self._upgrade()
+        elif columns and 'signed_out' not in columns:
+            self.connection.execute("ALTER TABLE signins ADD COLUMN "
+                                    "signed_out TEXT")
+        exports = [column[1] for column in self.connection.execute(
+            "PRAGMA table_info(exports)")]
+        if exports and 'last_sign_out' not in exports:
+            self.connection.execute("ALTER TABLE exports ADD COLUMN "
+                                    "last_sign_out INTEGER NOT NULL DEFAULT 0")
+        self.connection.executescript(self.SCHEMA)
+
+    def _upgrade(self):
+        # Converts a database with separate date, day and time columns to a
+        # single timestamp column, keeping the id of every sign-in (so that
+        # the export checkpoints stay correct). The whole change is made in
+        # one transaction, so an interrupted upgrade leaves the old table.
+        with self.connection:
+            self.connection.execute("BEGIN")
+            self.connection.execute("ALTER TABLE signins RENAME TO "
+                                    "signins_text")
+            for index in ('signins_anumber', 'signins_date',
+                          'signins_course_prefix'):
+                self.connection.execute("DROP INDEX IF EXISTS %s" % index)
+            for statement in self.SCHEMA.split(';'):
+                if statement.strip():
+                    self.connection.execute(statement)
+            rows = self.connection.execute(
+                "SELECT id, anumber, class_rank, major, course_prefix, "
+                "course_name, date, day, time_in FROM signins_text")
+            self.connection.executemany(
+                "INSERT INTO signins (id, %s) VALUES (?, %s)"
+                % (', '.join(self.FIELDS), ', '.join('?' * len(self.FIELDS))),
+                ((row[0],) + _sql_values(to_record(row[1:])) for row in rows))
+            self.connection.execute("DROP TABLE signins_text")
+
+    def append(self, row):
+        """Inserts a single sign-in record into the database.
+
+        Parameters
+        ------------
+        row : SignInRecord
+            The sign-in to save.
+
+        """
+        with self.connection:
+            self.connection.execute(self._insert, _sql_values(row))
+
+    def extend(self, rows):
+        """Inserts many sign-in records into the database in one transaction.
+
+        Parameters
+        ------------
+        rows : iterable of SignInRecord
+            The sign-ins to save.
+
+        """
+        with self.connection:
+            self.connection.executemany(self._insert,
+                                        (_sql_values(row) for row in rows))
+
+    def sign_out(self, record):
+        """Saves the time a student signed out of a visit.
+
+        Parameters
+        ------------
+        record : SignInRecord
+            The visit, as saved by `append`, with its `signed_out` time set.
+
+        """
+        with self.connection:
+            self._sign_out(record)
+
+    def _sign_out(self, record):
+        # Saves a sign-out inside the transaction already begun.
+        values = _sql_values(record)
+        # The "+" keeps SQLite on the A-number index, as many students can
+        # sign in at the same second.
+        found = self.connection.execute(
+            "SELECT id FROM signins WHERE anumber = ? AND +signed_in = ? "
+            "ORDER BY id DESC LIMIT 1", (values[0], values[5])).fetchone()
+        if found is None:
+            return
+        self.connection.execute(
+            "UPDATE signins SET signed_out = ? WHERE id = ?",
+            (values[6], found[0]))
+        self.connection.execute(
+            "INSERT INTO sign_outs (signin_id) VALUES (?)", found)
+
+    def save_batch(self, rows, sign_outs):
+        """Saves a batch of sign-ins and sign-outs in one transaction.
+
+        If any of the batch cannot be saved, none of it is, so the batch can
+        be sent again without saving any sign-in twice.
+
+        Parameters
+        ------------
+        rows : list of SignInRecord
+            The sign-ins to save.
+        sign_outs : list of SignInRecord
+            The visits signed out of, with their `signed_out` times set.
+
+        """
+        with self.connection:
+            self.connection.executemany(self._insert,
+                                        (_sql_values(row) for row in rows))
+            for record in sign_outs:
+                self._sign_out(record)
+
+    def iter_rows(self):
+        """Yields every sign-in in the database, oldest first."""
+        cursor = self.connection.execute("SELECT %s FROM signins ORDER BY id"
+                                         % ', '.join(self.FIELDS))
+        for row in cursor:
+            yield to_record(row)
+
+    def open_visits(self, since):
+        """Returns the visits started since a given time that are still open.
+
+        Only the sign-ins since `since` are read, using the index on the
+        sign-in time.
+
+        """
+        cursor = self.connection.execute(
+            "SELECT %s FROM signins WHERE signed_in >= ? AND signed_out IS "
+            "NULL ORDER BY id" % ', '.join(self.FIELDS),
+            (since.isoformat(sep=' '),))
+        return [to_record(row) for row in cursor]
+
+    def import_workbook(self, workbook='Masterfile.xlsx'):
+        """Copies every record in the "Main Data" sheet into the database.
+
+        This is meant to be run once, when the login system first switches to
+        the SQLite backend. The sheet is read row by row, so even a very large
+        Masterfile does not have to be held in memory, and all of the records
+        are inserted in a single transaction. The import is recorded in the
+        `imports` table in the same transaction, and a workbook already
+        imported is not imported again (which would copy every record twice).
+
+        Parameters
+        ------------
+        workbook : str
+            Path to the Masterfile spreadsheet to import.
+
+        Returns
+        -------
+        imported : int
+            The number of records copied into the database.
+
+        Raises
+        -------
+        ValueError
+            If the workbook has already been imported into the database.
+
+        """
+        from openpyxl import load_workbook
+
+        path = os.path.abspath(workbook)
+        found = self.connection.execute(
+            "SELECT rows, imported FROM imports WHERE workbook = ?",
+            (path,)).fetchone()
+        if found is not None:
+            raise ValueError("%s was already imported (%d sign-ins, on %s)"
+                             % (workbook, found[0], found[1]))
+        wb = load_workbook(workbook, read_only=True)
+        ws = wb["Main Data"]
+        before = self.connection.total_changes
+        with self.connection:
+            self.connection.executemany(
+                self._insert,
+                (_sql_values(to_record(row))
+                 for row in ws.iter_rows(min_row=2, values_only=True)
+                 if row and row[0] is not None))
+            # The imported records are already in the workbook, so they are
+            # marked as exported to it.
+            self.connection.execute(
+                "INSERT OR REPLACE INTO exports VALUES "
+                "(?, (SELECT COALESCE(MAX(id), 0) FROM signins), "
+                "(SELECT COALESCE(MAX(id), 0) FROM sign_outs))", (path,))
+            imported = self.connection.total_changes - before - 1
+            self.connection.execute(
+                "INSERT INTO imports VALUES (?, ?, ?)",
+                (path, imported,
+                 datetime.datetime.now().isoformat(sep=' ',
+                                                   timespec='seconds')))
+        wb.close()
+        return imported
+
+    def export(self, workbook='Masterfile.xlsx'):
+        """Adds the records not yet exported to the "Main Data" sheet.
+
+        The id of the last record exported to each workbook is kept in the
+        `exports` table, so running the export again only adds the records
+        saved since the last export.
+
+        Parameters
+        ------------
+        workbook : str
+            Path to the Masterfile spreadsheet to add the records to.
+
+        Returns
+        -------
+        exported : int
+            The number of records added to the spreadsheet.
+
+        """
+        from openpyxl import load_workbook
+
+        key = os.path.abspath(workbook)
+        found = self.connection.execute(
+            "SELECT last_id, last_sign_out FROM exports WHERE workbook = ?",
+            (key,)).fetchone()
+        last_id, last_sign_out = found if found else (0, 0)
+        rows = self.connection.execute(
+            "SELECT id, %s FROM signins WHERE id > ? ORDER BY id"
+            % ', '.join(self.FIELDS), (last_id,)).fetchall()
+        # Visits exported before the student signed out.
+        late = self.connection.execute(
+            "SELECT sign_outs.id, %s FROM sign_outs JOIN signins ON "
+            "signins.id = sign_outs.signin_id WHERE sign_outs.id > ? AND "
+            "signins.id <= ? ORDER BY sign_outs.id"
+            % ', '.join('signins.' + field for field in self.FIELDS),
+            (last_sign_out, last_id)).fetchall()
+        newest_sign_out = self.connection.execute(
+            "SELECT COALESCE(MAX(id), 0) FROM sign_outs").fetchone()[0]
+        if not rows and not late:
+            return 0
+
+        wb = load_workbook(workbook)
+        ws = wb["Main Data"]
+        _label_columns(ws)
+        for row in rows:
+            ws.append(display_row(to_record(row[1:])))
+        _write_sign_outs(ws, [to_record(row[1:]) for row in late])
+        wb.save(workbook)
+        with self.connection:
+            self.connection.execute(
+                "INSERT OR REPLACE INTO exports VALUES (?, ?, ?)",
+                (key, rows[-1][0] if rows else last_id, newest_sign_out))
+        return len(rows)
+
+    def close(self):
+        """Closes the connection to the database."""
+        self.connection.close()
+
+
+def _sql_values(record):
+    # Returns the values of a sign-in as saved in the `signins` table.
+    signed_in = record[5]
+    if signed_in is not None:
+        signed_in = signed_in.isoformat(sep=' ')
+    signed_out = record[6] if len(record) > 6 else None
+    if signed_out is not None:
+        signed_out = signed_out.isoformat(sep=' ')
+    return (record[0], record[1], record[2], record[3], record[4], signed_in,
+            signed_out)
+
+
+class RemoteStorage(StorageBackend):
+    """RemoteStorage sends sign-ins to a sign-in aggregation server.
+
+    Each sign-in is first saved to a local journal (the outbox), so it is
+    safe even if the server cannot be reached. A background sender thread
+    keeps one connection open to the server (SignInServer.py) and sends the
+    sign-ins not yet sent in batches of up to `batch_size`. If the server is
+    down, the sender waits (twice as long after each failure, up to
+    `max_backoff` seconds) and tries again; the sign-ins wait in the outbox
+    until then, including across restarts of the login system. A batch is
+    only marked as sent once the server confirms it was stored, so if the
+    connection drops before the confirmation arrives the batch is sent again
+    (and may, rarely, be stored twice). Sign-outs are saved to the outbox and
+    sent the same way, in the same batches as the sign-ins.
+
+    Attributes
+    ------------
+    host : str
+        The address of the aggregation server.
+    port : int
+        The port of the aggregation server.
+    outbox : JournalStorage
+        The local journal every sign-in is saved to before it is sent.
+    batch_size : int
+        The most sign-ins sent to the server at once.
+    max_backoff : float
+        The longest time, in seconds, to wait before trying to reach the
+        server again.
+
+    See Also
+    -----------
+    SignInServer.py : Module containing the aggregation server.
+
+    """
+
+    # Placed in the queue to ask the sender thread to stop.
+    _STOP = object()
+    # Marks a sign-out in the queue, which otherwise holds sign-ins.
+    _SIGN_OUT = object()
+
+    def __init__(self, host='localhost', port=8765, directory='SignInOutbox',
+                 batch_size=100, timeout=5.0, max_backoff=30.0):
+        self.host = host
+        self.port = port
+        self.outbox = JournalStorage(directory)
+        self.batch_size = batch_size
+        self.timeout = timeout
+        self.max_backoff = max_backoff
+        self._socket = None
+        self._reader = None
+        self._queue = queue.Queue()
+        self._closing = threading.Event()
+
+        # Queues the sign-ins saved to the outbox but never sent (for example,
+        # because the server was down when the login system was last closed).
+        self._sent, self._sent_sign_outs = self._load_sent()
+        self._saved = 0
+        for self._saved, row in enumerate(self.outbox.iter_rows(), start=1):
+            if self._saved > self._sent:
+                self._queue.put(row)
+        self._saved_sign_outs = 0
+        for self._saved_sign_outs, record in enumerate(
+                self.outbox.iter_sign_outs(), start=1):
+            if self._saved_sign_outs > self._sent_sign_outs:
+                self._queue.put((self._SIGN_OUT, record))
+        self._thread = threading.Thread(target=self._run, name='RemoteSender',
+                                        daemon=True)
+        self._thread.start()
+
+    def _sent_path(self):
+        return os.path.join(self.outbox.directory, 'sent.json')
+
+    def _load_sent(self):
+        try:
+            with open(self._sent_path(), encoding='utf-8') as file:
+                sent = json.load(file)
+            return sent['sent'], sent.get('sign_outs', 0)
+        except (OSError, ValueError, KeyError):
+            return 0, 0
+
+    def _save_sent(self):
+        path = self._sent_path()
+        with open(path + '.tmp', 'w', encoding='utf-8') as file:
+            json.dump({'sent': self._sent, 'sign_outs': self._sent_sign_outs},
+                      file)
+        os.replace(path + '.tmp', path)
+
+    def _send(self, rows, sign_outs):
+        # Sends a batch over the open connection (connecting first if needed)
+        # and waits for the server to confirm it was stored.
+        if self._socket is None:
+            self._socket = socket.create_connection((self.host, self.port),
+                                                    self.timeout)
+            self._reader = self._socket.makefile('r', encoding='utf-8')
+        request = json.dumps({'records': [_json_values(row) for row in rows],
+                              'sign_outs': [_json_values(record)
+                                            for record in sign_outs]})
+        self._socket.sendall((request + '\n').encode('utf-8'))
+        answer = self._reader.readline()
+        if not answer:
+            raise ConnectionError("the server closed the connection")
+        answer = json.loads(answer)
+        if answer.get('stored') != len(rows) + len(sign_outs):
+            raise ConnectionError(answer.get('error', 'batch not stored'))
+
+    def _disconnect(self):
+        if self._socket is not None:
+            self._reader.close()
+            self._socket.close()
+        self._socket = None
+        self._reader = None
+
+    def _run(self):
+        backoff = 0.5
+        batch = []
+        stopping = False
+        while True:
+            # Waits for a sign-in, then gathers any others already waiting.
+            if not batch and not stopping:
+                item = self._queue.get()
+                if item is self._STOP:
+                    stopping = True
+                else:
+                    batch.append(item)
+            while len(batch) < self.batch_size:
+                try:
+                    item = self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if item is self._STOP:
+                    stopping = True
+                else:
+                    batch.append(item)
+            if not batch:
+                self._disconnect()
+                return
+
+            rows = [item for item in batch if item[0] is not self._SIGN_OUT]
+            sign_outs = [item[1] for item in batch
+                         if item[0] is self._SIGN_OUT]
+            try:
+                self._send(rows, sign_outs)
+            except (OSError, ValueError) as error:
+                self._disconnect()
+                # When closing, the unsent sign-ins stay in the outbox and
+                # are sent the next time the login system starts.
+                if stopping:
+                    return
+                print("Could not send sign-ins to %s:%d (%s); retrying in "
+                      "%.1f s." % (self.host, self.port, error, backoff))
+                if self._closing.wait(backoff):
+                    self._disconnect()
+                    return
+                backoff = min(backoff * 2, self.max_backoff)
+                continue
+            backoff = 0.5
+            self._sent += len(rows)
+            self._sent_sign_outs += len(sign_outs)
+            self._save_sent()
+            batch = []
+
+    def append(self, row):
+        """Saves a sign-in to the outbox and queues it to be sent.
+
+        Parameters
+        ------------
+        row : SignInRecord
+            The sign-in to save.
+
+        """
+        self.outbox.append(row)
+        self._saved += 1
+        self._queue.put(row)
+
+    def sign_out(self, record):
+        """Saves a sign-out to the outbox and queues it to be sent.
+
+        Parameters
+        ------------
+        record : SignInRecord
+            The visit, as saved by `append`, with its `signed_out` time set.
+
+        """
+        self.outbox.sign_out(record)
+        self._saved_sign_outs += 1
+        self._queue.put((self._SIGN_OUT, record))
+
+    def pending(self):
+        """Returns the number of sign-ins not yet sent to the server."""
+        return self._saved - self._sent
+
+    def iter_rows(self):
+        """Yields every sign-in saved at this station, oldest first."""
+        return self.outbox.iter_rows()
+
+    def open_visits(self, since):
+        """Returns the visits started at this station that are still open."""
+        return self.outbox.open_visits(since)
+
+    def export(self, workbook='Masterfile.xlsx'):
+        """Adds this station's sign-ins not yet exported to the workbook.
+
+        The combined sign-ins of every station should normally be exported
+        from the server instead (see SignInServer.py).
+
+        """
+        return self.outbox.export(workbook)
+
+    def close(self):
+        """Tries once more to send the unsent sign-ins, then disconnects.
+
+        If the server cannot be reached, the unsent sign-ins stay in the
+        outbox and are sent the next time the login system starts.
+
+        """
+        self._closing.set()
+        self._queue.put(self._STOP)
+        self._thread.join()
+        self.outbox.close()
+
+
+def _json_values(record):
+    # Returns the values of a sign-in as sent to the aggregation server, with
+    # its times as ISO 8601 timestamps.
+    return list(record[:5]) + [None if when is None else when.isoformat()
+                               for when in record[5:7]]
+
+
+def open_storage(kind, **options):
+    """Creates the storage backend with the given name.
+
+    Parameters
+    ------------
+    kind : str
+        The name of the backend: "journal", "workbook", "sqlite" or
+        "remote".
+    **options
+        Passed on to the backend when it is created.
+
+    Returns
+    -------
+    storage : StorageBackend
+        The new storage backend.
+
+    """
+    backends = {'journal': JournalStorage,
+                'workbook': WorkbookStorage,
+                'sqlite': SQLiteStorage,
+                'remote': RemoteStorage}
+    if kind not in backends:
+        raise ValueError("Unknown storage backend: %r" % kind)
+    return backends[kind](**options)
+
+
+# This section lets the sign-ins be exported (or imported) from the command
+# line. See the module notes above for examples.
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser(description=("Tools for the Tutor Center"
+                                                  " sign-in storage."))
+    parser.add_argument('command', choices=['export', 'import'])
+    parser.add_argument('--backend', default='journal',
+                        choices=['journal', 'sqlite'],
+                        help="storage backend holding the sign-ins")
+    parser.add_argument('--journal', default='SignInJournal',
+                        help="folder holding the sign-in journal")
+    parser.add_argument('--database', default='SignIns.db',
+                        help="SQLite database holding the sign-ins")
+    parser.add_argument('--workbook', default='Masterfile.xlsx',
+                        help="spreadsheet to export the sign-ins to")
+    arguments = parser.parse_args()
+
+    if arguments.backend == 'sqlite':
+        storage = SQLiteStorage(arguments.database)
+    else:
+        storage = JournalStorage(arguments.journal)
+    if arguments.command == 'import':
+        if arguments.backend != 'sqlite':
+            parser.error("import is only available for the sqlite backend")
+        try:
+            count = storage.import_workbook(arguments.workbook)
+        except ValueError as error:
+            storage.close()
+            parser.exit(1, "Not imported: %s.\n" % error)
+        print("Imported %d sign-ins from %s." % (count, arguments.workbook))
+    else:
+        count = storage.export(arguments.workbook)
+        print("Exported %d sign-ins to %s." % (count, arguments.workbook))
+    storage.close()
@@ -0,0 +1,333 @@
+# -*- coding: utf-8 -*-
+"""Timings of each stage of the Tutor Center login system.
+
+This module contains the tools used to find out where the time goes when the
+login system feels slow. Each stage of signing a student in (checking the
+entries, saving the sign-in, updating the rollups, loading and saving the
+Masterfile, showing the message box, and so on) is timed as a "span", and
+the most recent spans are kept in a fixed-size ring buffer, so timing costs
+a few microseconds per stage and never uses more memory however long the
+login system runs. The timings can be saved as JSON or in the Prometheus text
+format, and a cProfile capture of everything the login system does can be
+turned on and off while it runs.
+
+Routine Listings
+-----------------
+SpanRecorder    Ring buffer of the most recent spans, with their totals.
+TIMINGS         The SpanRecorder used by the login system.
+
+Notes
+------
+The login system (TCLogin.py) saves the timings to the file named by
+`TIMINGS_FILE` every `TIMINGS_MINUTES` minutes and when it closes. A file
+ending in ".prom" is written in the Prometheus text format (for example, for
+the textfile collector of the Prometheus node exporter); any other file is
+written as JSON. To print the timings saved in a JSON file, run this script
+from the command line:
+
+    python SignInTimings.py SignInTimings.json
+
+Pressing the key named by `PROFILE_KEY` in TCLogin.py (Ctrl+Shift+P by
+default) starts a cProfile capture; pressing it again saves the capture to a
+SignInProfile-*.prof file, which can be read with `python -m pstats`. Only
+the code run by the login window itself (not the workbook writer thread) is
+captured.
+
+"""
+
+import array
+import datetime
+import json
+import os
+import threading
+import time
+
+
+class _Span:
+    # Times the code run inside a `with` block, and records it on leaving.
+    __slots__ = ('recorder', 'name', 'start', 'wall')
+
+    def __init__(self, recorder, name):
+        self.recorder = recorder
+        self.name = name
+
+    def __enter__(self):
+        self.wall = time.time()
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.recorder.add(self.name, time.perf_counter() - self.start,
+                          self.wall)
+        return False
+
+
+class _NullSpan:
+    # Stands in for a _Span when the recorder is turned off.
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+
+_NULL_SPAN = _NullSpan()
+
+
+class SpanRecorder:
+    """SpanRecorder keeps the timings of the most recent spans.
+
+    Each span is a stage name and the time it took. The last `capacity`
+    spans are kept in a ring buffer (the oldest span is written over by the
+    newest), from which the percentiles of each stage are worked out; the
+    number of spans and total time of each stage are kept for as long as the
+    recorder runs. Spans may be recorded from any thread.
+
+    Attributes
+    ------------
+    capacity : int
+        The most spans kept.
+    enabled : bool
+        If False, `span` and `add` do nothing.
+
+    """
+
+    # The percentiles of each stage reported by `summary`.
+    QUANTILES = [0.5, 0.9, 0.99]
+
+    def __init__(self, capacity=4096, enabled=True):
+        self.capacity = capacity
+        self.enabled = enabled
+        self._lock = threading.Lock()
+        self._names = [None] * capacity
+        self._seconds = array.array('d', bytes(8 * capacity))
+        self._walls = array.array('d', bytes(8 * capacity))
+        self._next = 0
+        self._totals = {}
+        self._profile = None
+
+    def __len__(self):
+        return min(self._next, self.capacity)
+
+    def span(self, name):
+        """Returns a context manager that times the code inside it.
+
+        For example, `with TIMINGS.span('workbook.save'): wb.save(path)`.
+
+        """
+        if not self.enabled:
+            return _NULL_SPAN
+        return _Span(self, name)
+
+    def add(self, name, seconds, wall=None):
+        """Records a span timed elsewhere.
+
+        Parameters
+        ------------
+        name : str
+            The stage timed.
+        seconds : float
+            The time it took.
+        wall : float, optional
+            The time it started, as returned by `time.time`. Defaults to
+            `seconds` before now.
+
+        """
+        if not self.enabled:
+            return
+        if wall is None:
+            wall = time.time() - seconds
+        with self._lock:
+            slot = self._next % self.capacity
+            self._names[slot] = name
+            self._seconds[slot] = seconds
+            self._walls[slot] = wall
+            self._next += 1
+            totals = self._totals.get(name)
+            if totals is None:
+                self._totals[name] = [1, seconds]
+            else:
+                totals[0] += 1
+                totals[1] += seconds
+
+    def spans(self):
+        """Returns the spans kept, oldest first.
+
+        Returns
+        -------
+        spans : list of tuple
+            Each span as (name, start time from `time.time`, seconds).
+
+        """
+        with self._lock:
+            count = len(self)
+            first = self._next - count
+            slots = [(first + number) % self.capacity
+                     for number in range(count)]
+            return [(self._names[slot], self._walls[slot],
+                     self._seconds[slot]) for slot in slots]
+
+    def summary(self):
+        """Returns the count, total and percentiles of each stage.
+
+        Returns
+        -------
+        stages : dict
+            For each stage, by name: "count" and "total_seconds" since the
+            recorder started, and "recent" (the number of its spans still
+            kept), "max" and the `QUANTILES` (as "p50" and so on), in
+            seconds, over the spans still kept.
+
+        """
+        recent = {}
+        for name, wall, seconds in self.spans():
+            recent.setdefault(name, []).append(seconds)
+        with self._lock:
+            totals = {name: list(value)
+                      for name, value in self._totals.items()}
+        stages = {}
+        for name in sorted(totals):
+            count, total = totals[name]
+            times = sorted(recent.get(name, []))
+            stage = {'count': count, 'total_seconds': total,
+                     'recent': len(times),
+                     'max': times[-1] if times else None}
+            for quantile in self.QUANTILES:
+                stage['p%d' % round(quantile * 100)] = (
+                    times[min(int(len(times) * quantile), len(times) - 1)]
+                    if times else None)
+            stages[name] = stage
+        return stages
+
+    def as_dict(self, slowest=20):
+        """Returns the summary and the slowest recent spans, for JSON.
+
+        Parameters
+        ------------
+        slowest : int
+            How many of the slowest spans still kept are listed, with the
+            time they started, so a slow moment can be found afterwards.
+
+        """
+        spans = sorted(self.spans(), key=lambda span: span[2],
+                       reverse=True)[:slowest]
+        return {'generated': datetime.datetime.now().isoformat(
+                    timespec='seconds'),
+                'capacity': self.capacity,
+                'profiling': self.profiling,
+                'stages': self.summary(),
+                'slowest': [{'stage': name,
+                             'started': datetime.datetime.fromtimestamp(
+                                 wall).isoformat(timespec='milliseconds'),
+                             'seconds': seconds}
+                            for name, wall, seconds in spans]}
+
+    def as_prometheus(self, prefix='tclogin'):
+        """Returns the summary in the Prometheus text format.
+
+        Each stage is a label of a single summary metric,
+        "<prefix>_stage_seconds".
+
+        """
+        metric = '%s_stage_seconds' % prefix
+        lines = ["# HELP %s Time taken by each stage of the login system."
+                 % metric, "# TYPE %s summary" % metric]
+        for name, stage in self.summary().items():
+            label = name.replace('\\', '\\\\').replace('"', '\\"')
+            for quantile in self.QUANTILES:
+                value = stage['p%d' % round(quantile * 100)]
+                if value is not None:
+                    lines.append('%s{stage="%s",quantile="%g"} %.9f'
+                                 % (metric, label, quantile, value))
+            lines.append('%s_sum{stage="%s"} %.9f'
+                         % (metric, label, stage['total_seconds']))
+            lines.append('%s_count{stage="%s"} %d'
+                         % (metric, label, stage['count']))
+        return "\n".join(lines) + "\n"
+
+    def dump(self, path):
+        """Saves the timings to a file, replacing it in one step.
+
+        Parameters
+        ------------
+        path : str
+            The file to save. A file ending in ".prom" is written in the
+            Prometheus text format; any other file is written as JSON.
+
+        """
+        with open(path + '.tmp', 'w', encoding='utf-8') as file:
+            if path.endswith('.prom'):
+                file.write(self.as_prometheus())
+            else:
+                json.dump(self.as_dict(), file, indent=1)
+        os.replace(path + '.tmp', path)
+
+    @property
+    def profiling(self):
+        """True while a cProfile capture is running."""
+        return self._profile is not None
+
+    def start_profile(self):
+        """Starts a cProfile capture of the calling thread."""
+        import cProfile
+
+        if self._profile is None:
+            self._profile = cProfile.Profile()
+            self._profile.enable()
+
+    def stop_profile(self, path):
+        """Stops the cProfile capture and saves it for `pstats`.
+
+        Parameters
+        ------------
+        path : str
+            The file to save the capture to.
+
+        Returns
+        -------
+        saved : bool
+            False if no capture was running.
+
+        """
+        if self._profile is None:
+            return False
+        profile = self._profile
+        self._profile = None
+        profile.disable()
+        profile.dump_stats(path)
+        return True
+
+
+# The SpanRecorder used by the login system, the sign-in service and the
+# storage backends.
+TIMINGS = SpanRecorder()
+
+
+# This section prints timings saved as JSON from the command line. See the
+# module notes above for an example.
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser(description=("Timings of the Tutor "
+                                                  "Center login system."))
+    parser.add_argument('path', help="timings saved as JSON")
+    arguments = parser.parse_args()
+
+    with open(arguments.path, encoding='utf-8') as file:
+        saved = json.load(file)
+    print("Saved %s%s" % (saved['generated'], " (profiling)"
+                          if saved.get('profiling') else ""))
+    print("%-28s %8s %10s %10s %10s %10s"
+          % ('stage', 'count', 'p50 ms', 'p90 ms', 'p99 ms', 'max ms'))
+    for name, stage in saved['stages'].items():
+        print("%-28s %8d %s" % (name, stage['count'], " ".join(
+            "%10s" % ('-' if stage[key] is None else
+                      "%.2f" % (stage[key] * 1000))
+            for key in ('p50', 'p90', 'p99', 'max'))))
+    if saved['slowest']:
+        print("\nSlowest recent spans:")
+        for span in saved['slowest']:
+            print("  %s  %-28s %10.2f ms" % (span['started'], span['stage'],
+                                             span['seconds'] * 1000))
@@ -0,0 +1,418 @@
+# -*- coding: utf-8 -*-
+"""Staffing-demand forecast for the Tutor Center.
+
+This module contains the tools used to forecast how many students will arrive
+at the Tutor Center in each half hour of an upcoming week, for each course
+prefix, from the saved sign-in history. The Tutor Center Supervisor can use
+the forecast to decide how many tutors for each subject to schedule in each
+part of the day.
+
+The sign-in history is loaded once into NumPy arrays (one array for each
+column), and the sign-ins are then counted into a single array of weeks x days
+x half hours x course prefixes. The forecast is computed from that array with
+array operations only, so it can be recomputed with different settings in a
+fraction of a second, even for several years of sign-ins.
+
+Routine Listings
+-----------------
+OPENING_HOURS    The hours the Tutor Center is open on each day of the week.
+SignInHistory    Sign-in history loaded into NumPy arrays.
+StaffingForecast Expected arrivals per half hour and course prefix.
+
+Notes
+------
+To print the forecast for next week, run this script from the command line:
+
+    python StaffingForecast.py --backend sqlite --database SignIns.db
+
+Use `--weeks` to forecast more than one week, `--start` to forecast from a
+different Monday, and `--output` to save the full forecast as a CSV file that
+can be opened in Excel. Use `--history` to read a history saved as codes by
+CategoryCodes.py, which loads years of sign-ins in a fraction of a second.
+
+The expected arrivals in each half hour are a blend of two averages:
+
+* the average over the most recent weeks in which the Tutor Center was open
+  (`recent_weeks`), which follows the current semester, and
+* the average over the same week of the year in earlier years, which follows
+  the rush before midterms and finals.
+
+`seasonal_weight` sets how much of the forecast comes from the second average.
+If there is no earlier year with the same week, the recent average is used on
+its own.
+
+"""
+
+import datetime
+
+import numpy as np
+import pandas as pd
+
+import SignInAnalytics
+import SignInArchive
+import SignInService
+import SignInStorage
+
+# The opening and closing hours of the Tutor Center on each day of the week
+# (Monday is 0). The forecast report only shows the half hours the Tutor
+# Center is open.
+OPENING_HOURS = SignInService.OPENING_HOURS
+
+# The number of half hours in a day.
+SLOTS = 48
+
+
+class SignInHistory:
+    """SignInHistory holds the sign-in history as one array per column.
+
+    Only the columns needed for forecasting are kept. Sign-ins whose time
+    cannot be read are left out.
+
+    Attributes
+    ------------
+    days : numpy.ndarray of datetime64[D]
+        The date of each sign-in.
+    slots : numpy.ndarray of int8
+        The half hour of the day (0-47) each sign-in was in.
+    prefix_codes : numpy.ndarray of int16
+        The course prefix of each sign-in, as an index into `prefixes`.
+    prefixes : list of str
+        Every course prefix in the history.
+
+    """
+
+    def __init__(self, days, slots, prefix_codes, prefixes):
+        self.days = days
+        self.slots = slots
+        self.prefix_codes = prefix_codes
+        self.prefixes = prefixes
+
+    def __len__(self):
+        return len(self.days)
+
+    @classmethod
+    def from_columns(cls, prefixes, times):
+        """Loads the history from the course prefix and time columns.
+
+        Parameters
+        ------------
+        prefixes : sequence of str
+            The course prefix of each sign-in.
+        times : sequence of datetime.datetime or str
+            The time of each sign-in, as a datetime or as an ISO 8601
+            timestamp (as saved by the SQLite backend).
+
+        Returns
+        -------
+        history : SignInHistory
+            The loaded history.
+
+        """
+        prefix_codes, unique_prefixes = pd.factorize(
+            pd.Series(prefixes, dtype=object).fillna(''))
+        times = pd.to_datetime(pd.Series(times, dtype=object),
+                               format='ISO8601', errors='coerce')
+
+        # Sign-ins with a missing or unreadable time are left out.
+        keep = times.notna().to_numpy()
+        times = times[keep]
+        days = times.to_numpy().astype('datetime64[D]')
+        slots = (times.dt.hour * 2 + times.dt.minute // 30).to_numpy(np.int8)
+        return cls(days, slots, prefix_codes[keep].astype(np.int16),
+                   [str(prefix) for prefix in unique_prefixes])
+
+    @classmethod
+    def from_rows(cls, rows):
+        """Loads the history from an iterable of sign-in records.
+
+        Parameters
+        ------------
+        rows : iterable of SignInRecord
+            The sign-ins to load.
+
+        """
+        prefixes = []
+        times = []
+        for row in rows:
+            if row[0] is None:
+                continue
+            prefixes.append(row[3])
+            times.append(row[5])
+        return cls.from_columns(prefixes, times)
+
+    @classmethod
+    def from_coded(cls, history):
+        """Loads the history from a sign-in history held as codes.
+
+        The course prefix codes of the coded history are used as they are,
+        so no course prefix is read as a string.
+
+        Parameters
+        ------------
+        history : CategoryCodes.CodedHistory
+            The coded sign-in history.
+
+        """
+        keep = ~np.isnat(history.signed_in)
+        times = history.signed_in[keep]
+        days = times.astype('datetime64[D]')
+        minutes = (times - days).astype('timedelta64[m]').astype(np.int64)
+        # Only the course prefixes in the history are kept, numbered again
+        # from 0.
+        codes, prefix_codes = np.unique(
+            history.columns['course_prefix'][keep], return_inverse=True)
+        lookup = history.table.lookup('course_prefix')
+        return cls(days, (minutes // 30).astype(np.int8),
+                   prefix_codes.astype(np.int16),
+                   [lookup[code] or '' for code in codes])
+
+    @classmethod
+    def from_storage(cls, storage):
+        """Loads the history saved in a storage backend.
+
+        Only the two needed columns are read from the SQLite backend, and
+        their timestamps are converted all at once. Every other backend is
+        read through its `iter_rows` method.
+
+        Parameters
+        ------------
+        storage : SignInStorage.StorageBackend
+            The storage backend holding the sign-ins.
+
+        """
+        if not isinstance(storage, SignInStorage.SQLiteStorage):
+            return cls.from_rows(storage.iter_rows())
+        columns = pd.DataFrame(storage.connection.execute(
+            "SELECT course_prefix, signed_in FROM signins").fetchall(),
+            columns=['prefix', 'time'])
+        return cls.from_columns(columns['prefix'], columns['time'])
+
+
+class StaffingForecast:
+    """StaffingForecast gives the expected arrivals for upcoming weeks.
+
+    The history is counted once, when the forecast is created, into the
+    `counts` array. Each call to `expected` then only averages slices of that
+    array.
+
+    Attributes
+    ------------
+    prefixes : list of str
+        The course prefixes, in the order of the last axis of the forecast.
+    first_monday : datetime.date
+        The Monday of the first week in the history.
+    counts : numpy.ndarray of int32
+        The sign-ins counted by week, day of the week (Monday is 0), half
+        hour and course prefix.
+    recent_weeks : int
+        The number of recent open weeks averaged.
+    seasonal_weight : float
+        How much of the forecast (0-1) comes from the same week of the year
+        in earlier years.
+
+    See Also
+    -----------
+    SignInHistory : The sign-in history the forecast is computed from.
+
+    """
+
+    def __init__(self, history, recent_weeks=6, seasonal_weight=0.5):
+        self.prefixes = history.prefixes
+        self.recent_weeks = recent_weeks
+        self.seasonal_weight = seasonal_weight
+
+        if len(history):
+            first = history.days.min()
+            last = history.days.max()
+        else:
+            first = last = np.datetime64(datetime.date.today(), 'D')
+        # 1970-01-01 was a Thursday, so day number + 3 is 0 on Mondays.
+        weekday_of_first = (first.astype(np.int64) + 3) % 7
+        first_monday = first - weekday_of_first
+        self.first_monday = first_monday.astype(datetime.date)
+
+        # Every sign-in is counted into one flat array in a single call.
+        offsets = (history.days - first_monday).astype(np.int64)
+        weeks = int((last - first_monday).astype(np.int64)) // 7 + 1
+        shape = (weeks, 7, SLOTS, max(len(self.prefixes), 1))
+        flat = np.ravel_multi_index(
+            (offsets // 7, offsets % 7, history.slots.astype(np.int64),
+             history.prefix_codes.astype(np.int64)), shape)
+        self.counts = np.bincount(flat, minlength=int(np.prod(shape))) \
+            .astype(np.int32).reshape(shape)
+
+        # The weeks in which the Tutor Center was open, and the week of the
+        # year (1-53) of each week in the history.
+        self._open = self.counts.sum(axis=(1, 2, 3)) > 0
+        mondays = pd.DatetimeIndex(first_monday
+                                   + 7 * np.arange(weeks).astype(
+                                       'timedelta64[D]'))
+        self._week_of_year = mondays.isocalendar().week.to_numpy(np.int64)
+
+    def expected(self, start=None, weeks=1):
+        """Returns the expected arrivals for the weeks starting at `start`.
+
+        Parameters
+        ------------
+        start : datetime.date, optional
+            The first day to forecast; it is moved back to its Monday.
+            Defaults to next Monday.
+        weeks : int
+            The number of weeks to forecast.
+
+        Returns
+        -------
+        expected : numpy.ndarray of float
+            The expected arrivals by week, day of the week (Monday is 0),
+            half hour and course prefix.
+
+        """
+        mondays = self._mondays(start, weeks)
+        open_weeks = np.flatnonzero(self._open)
+        shape = self.counts.shape[1:]
+        if len(open_weeks):
+            recent = self.counts[open_weeks[-self.recent_weeks:]].mean(axis=0)
+        else:
+            recent = np.zeros(shape)
+
+        week_numbers = pd.DatetimeIndex(mondays).isocalendar().week \
+            .to_numpy(np.int64)
+        # same[i, j] is True when history week j is an open week with the
+        # same week of the year as forecast week i.
+        same = (self._week_of_year[np.newaxis, :]
+                == week_numbers[:, np.newaxis]) & self._open[np.newaxis, :]
+        totals = same.sum(axis=1)
+        seasonal = np.tensordot(same.astype(np.float64), self.counts,
+                                axes=(1, 0))
+        seasonal /= np.maximum(totals, 1)[:, np.newaxis, np.newaxis,
+                                          np.newaxis]
+        weight = np.where(totals > 0, self.seasonal_weight, 0.0)
+        weight = weight[:, np.newaxis, np.newaxis, np.newaxis]
+        return (1 - weight) * recent[np.newaxis] + weight * seasonal
+
+    def table(self, start=None, weeks=1, open_only=True):
+        """Returns the forecast as a table, one row per day and half hour.
+
+        Parameters
+        ------------
+        start : datetime.date, optional
+            The first day to forecast. Defaults to next Monday.
+        weeks : int
+            The number of weeks to forecast.
+        open_only : bool
+            If True, only the half hours in `OPENING_HOURS` are included.
+
+        Returns
+        -------
+        table : pandas.DataFrame
+            Has a "Date" and a "Time" column, a column of expected arrivals
+            for each course prefix, and a "Total" column.
+
+        """
+        mondays = self._mondays(start, weeks)
+        expected = self.expected(mondays[0], weeks)
+        days = (mondays[:, np.newaxis]
+                + np.arange(7).astype('timedelta64[D]')).ravel()
+        rows = expected.reshape(-1, len(self.prefixes) or 1)
+        table = pd.DataFrame(rows[:, :len(self.prefixes)],
+                             columns=self.prefixes)
+        table.insert(0, 'Date', np.repeat(days, SLOTS).astype(datetime.date))
+        table.insert(1, 'Time', np.tile(
+            ['%02d:%02d' % divmod(slot * 30, 60) for slot in range(SLOTS)],
+            len(days)))
+        table['Total'] = rows.sum(axis=1)
+        if open_only:
+            weekday = np.repeat(np.arange(7), SLOTS)
+            slot = np.tile(np.arange(SLOTS), 7)
+            is_open = np.zeros(7 * SLOTS, dtype=bool)
+            for day, (opens, closes) in OPENING_HOURS.items():
+                is_open |= ((weekday == day) & (slot >= opens * 2)
+                            & (slot < closes * 2))
+            table = table[np.tile(is_open, len(mondays))]
+        return table.reset_index(drop=True)
+
+    def _mondays(self, start, weeks):
+        # Returns the Monday of each forecast week as datetime64[D].
+        if start is None:
+            today = datetime.date.today()
+            start = today + datetime.timedelta(days=7 - today.weekday())
+        start = np.datetime64(start, 'D')
+        monday = start - (start.astype(np.int64) + 3) % 7
+        return monday + 7 * np.arange(weeks).astype('timedelta64[D]')
+
+
+# This section prints the forecast from the command line. See the module notes
+# above for an example.
+if __name__ == '__main__':
+    import argparse
+    import time
+
+    parser = argparse.ArgumentParser(description=("Staffing-demand forecast "
+                                                  "for the Tutor Center."))
+    parser.add_argument('--backend', default='workbook',
+                        choices=['workbook', 'journal', 'sqlite'],
+                        help="where the sign-ins are saved")
+    parser.add_argument('--workbook', default='Masterfile.xlsx',
+                        help="spreadsheet holding the sign-ins")
+    parser.add_argument('--journal', default='SignInJournal',
+                        help="folder holding the sign-in journal")
+    parser.add_argument('--database', default='SignIns.db',
+                        help="SQLite database holding the sign-ins")
+    parser.add_argument('--archive',
+                        help="folder holding the archived past semesters")
+    parser.add_argument('--history',
+                        help=("history saved as codes by CategoryCodes.py, "
+                              "read instead of the backend"))
+    parser.add_argument('--start', type=datetime.date.fromisoformat,
+                        help="first day to forecast (YYYY-MM-DD)")
+    parser.add_argument('--weeks', type=int, default=1,
+                        help="number of weeks to forecast")
+    parser.add_argument('--recent-weeks', type=int, default=6,
+                        help="number of recent open weeks to average")
+    parser.add_argument('--seasonal-weight', type=float, default=0.5,
+                        help="weight of the same week in earlier years (0-1)")
+    parser.add_argument('--output', help="CSV file to save the forecast to")
+    arguments = parser.parse_args()
+
+    started = time.perf_counter()
+    if arguments.archive:
+        archive = SignInArchive.SignInArchive(arguments.archive)
+    else:
+        archive = None
+    if arguments.history:
+        import CategoryCodes
+
+        history = SignInHistory.from_coded(CategoryCodes.CodedHistory.load(
+            arguments.history, CategoryCodes.CodeTable()))
+    elif arguments.backend == 'workbook':
+        history = SignInHistory.from_rows(SignInArchive.iter_history(
+            SignInAnalytics.workbook_rows(arguments.workbook), archive))
+    else:
+        if arguments.backend == 'sqlite':
+            storage = SignInStorage.SQLiteStorage(arguments.database)
+        else:
+            storage = SignInStorage.JournalStorage(arguments.journal)
+        try:
+            if archive is None:
+                history = SignInHistory.from_storage(storage)
+            else:
+                history = SignInHistory.from_rows(SignInArchive.iter_history(
+                    storage.iter_rows(), archive))
+        finally:
+            storage.close()
+    loaded = time.perf_counter()
+
+    forecast = StaffingForecast(history, arguments.recent_weeks,
+                                arguments.seasonal_weight)
+    table = forecast.table(arguments.start, arguments.weeks)
+    finished = time.perf_counter()
+
+    with pd.option_context('display.max_rows', None,
+                           'display.max_columns', None,
+                           'display.width', 200):
+        print(table.round(1).to_string(index=False))
+    print("Loaded %d sign-ins in %.2f s; forecast in %.2f s."
+          % (len(history), loaded - started, finished - loaded))
+    if arguments.output:
+        table.to_csv(arguments.output, index=False)
+        print("Saved the forecast to %s." % arguments.output)
@@ -0,0 +1,236 @@
+# -*- coding: utf-8 -*-
+"""The major, class rank and last course of each returning student.
+
+This module contains the cache the Tutor Center login system (TCLogin.py)
+uses to fill in the major, class rank and course of a student who has signed
+in before, as soon as their A-number is typed, so returning students do not
+have to choose them again on every visit. The student can still change any of
+the filled-in choices before signing in.
+
+The profiles are kept in a small SQLite database (the index on disk), with
+one row per A-number, and the most recently used profiles are also kept in
+memory. A profile is looked up in memory first, and otherwise read by its
+primary key from the database, so each lookup takes a few microseconds even
+with tens of thousands of students.
+
+Routine Listings
+-----------------
+StudentProfile  The major, class rank and last course of a single student.
+StudentProfiles Cache of student profiles, kept up to date on every sign-in.
+
+Notes
+------
+Until the profiles have been read from the saved sign-in history once, the
+login system reads them in a single pass (see `StudentProfiles.warm`) on a
+background thread each time it starts, so the login window can be used
+straight away; from then on, each sign-in updates its student's profile. To
+read the profiles again from the sign-in history, delete StudentProfiles.db.
+
+"""
+
+import collections
+import itertools
+
+# The values filled in for a returning student, from their last sign-in.
+StudentProfile = collections.namedtuple(
+    'StudentProfile', ['major', 'class_rank', 'course_prefix', 'course_name',
+                       'last_seen'])
+
+
+class StudentProfiles:
+    """StudentProfiles looks up returning students by A-number.
+
+    The most recently used `capacity` profiles are kept in memory, in least
+    recently used order; the rest are read from the `profiles` table when
+    they are needed. A-numbers are matched without regard to case.
+
+    Attributes
+    ------------
+    database : str
+        Path to the SQLite database file holding the profiles.
+    connection : sqlite3.Connection
+        The open connection to the database.
+    capacity : int
+        The most profiles kept in memory.
+
+    See Also
+    -----------
+    SignInService.SignInService : Updates the profiles on every sign-in.
+
+    """
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS profiles (
+            anumber TEXT PRIMARY KEY,
+            major TEXT,
+            class_rank TEXT,
+            course_prefix TEXT,
+            course_name TEXT,
+            last_seen TEXT
+        ) WITHOUT ROWID;
+    """
+
+    # The number of records read in each transaction by `warm`.
+    CHUNK_ROWS = 100000
+
+    def __init__(self, database='StudentProfiles.db', capacity=4096):
+        import sqlite3
+
+        self.database = database
+        self.capacity = capacity
+        self.connection = sqlite3.connect(database, check_same_thread=False)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute("PRAGMA synchronous=NORMAL")
+        self.connection.executescript(self.SCHEMA)
+        self._cache = collections.OrderedDict()
+
+    def __len__(self):
+        return self.connection.execute(
+            "SELECT COUNT(*) FROM profiles").fetchone()[0]
+
+    @property
+    def warmed(self):
+        """True once `warm` has read a whole sign-in history."""
+        return self.connection.execute(
+            "PRAGMA user_version").fetchone()[0] > 0
+
+    def _remember(self, key, profile):
+        # Keeps a profile in memory as the most recently used, forgetting the
+        # least recently used profile if there are too many.
+        self._cache[key] = profile
+        self._cache.move_to_end(key)
+        if len(self._cache) > self.capacity:
+            self._cache.popitem(last=False)
+
+    def get(self, anumber):
+        """Returns the profile of a student, or None if they are not known.
+
+        Parameters
+        ------------
+        anumber : str
+            The A-number of the student.
+
+        Returns
+        -------
+        profile : StudentProfile or None
+            The major, class rank and course of the student's last sign-in.
+
+        """
+        key = anumber.upper()
+        profile = self._cache.get(key)
+        if profile is not None:
+            self._cache.move_to_end(key)
+            return profile
+        found = self.connection.execute(
+            "SELECT major, class_rank, course_prefix, course_name, last_seen "
+            "FROM profiles WHERE anumber = ?", (key,)).fetchone()
+        if found is None:
+            return None
+        profile = StudentProfile(*found)
+        self._remember(key, profile)
+        return profile
+
+    def add(self, row):
+        """Updates the profile of the student of a single sign-in.
+
+        If the profile cannot be updated, the problem is printed rather than
+        raised, so a student can still sign in.
+
+        Parameters
+        ------------
+        row : SignInRecord
+            The sign-in to update the profile from.
+
+        """
+        import sqlite3
+
+        try:
+            self.extend([row])
+        except sqlite3.Error as error:
+            print("Could not update the student profiles in %s: %s"
+                  % (self.database, error))
+
+    def extend(self, rows):
+        """Updates the profiles of the students of many sign-ins at once.
+
+        A profile is only replaced by a sign-in at least as recent as the one
+        it was made from.
+
+        Parameters
+        ------------
+        rows : iterable of SignInRecord
+            The sign-ins to update the profiles from. Blank rows, and rows
+            whose time cannot be read, are skipped.
+
+        Returns
+        -------
+        students : int
+            The number of different students in `rows`.
+
+        """
+        # Only the newest sign-in of each student is written.
+        newest = {}
+        for row in rows:
+            if row[0] is None or row[5] is None:
+                continue
+            key = row[0].upper()
+            if key not in newest or row[5] >= newest[key][5]:
+                newest[key] = row
+
+        profiles = {}
+        for key, row in newest.items():
+            profiles[key] = StudentProfile(row[2], row[1], row[3], row[4],
+                                           row[5].isoformat(sep=' '))
+        with self.connection:
+            self.connection.executemany(
+                "INSERT INTO profiles VALUES (?, ?, ?, ?, ?, ?) ON CONFLICT "
+                "(anumber) DO UPDATE SET major = excluded.major, "
+                "class_rank = excluded.class_rank, "
+                "course_prefix = excluded.course_prefix, "
+                "course_name = excluded.course_name, "
+                "last_seen = excluded.last_seen "
+                "WHERE excluded.last_seen >= profiles.last_seen",
+                [(key,) + tuple(profile)
+                 for key, profile in profiles.items()])
+        for key, profile in profiles.items():
+            cached = self._cache.get(key)
+            if cached is not None and cached.last_seen <= profile.last_seen:
+                self._remember(key, profile)
+        return len(profiles)
+
+    def warm(self, rows):
+        """Reads the profiles from the sign-in history, in a single pass.
+
+        Parameters
+        ------------
+        rows : iterable of SignInRecord
+            Every saved sign-in, for example from the `iter_rows` method of a
+            storage backend.
+
+        Returns
+        -------
+        students : int
+            The number of students with a profile afterwards.
+
+        Notes
+        ------
+        A profile is only replaced by a newer sign-in, so the profiles can be
+        read in while students are signing in (for example, with a second
+        StudentProfiles on another thread). Once the whole history has been
+        read, `warmed` is True.
+
+        """
+        # The history is read a chunk at a time, so that it never has to be
+        # held in memory all at once.
+        rows = iter(rows)
+        while True:
+            chunk = list(itertools.islice(rows, self.CHUNK_ROWS))
+            if not chunk:
+                break
+            self.extend(chunk)
+        self.connection.execute("PRAGMA user_version = 1")
+        return len(self)
+
+    def close(self):
+        """Closes the connection to the database."""
+        self.connection.close()
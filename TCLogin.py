@@ -25,14 +25,99 @@ To run the login system, simply run this script!
 
 """
 
+import BadgeScanner  # BadgeScanner.py must also be in the same directory
 import CourseInfo  # CourseInfo.py must be in the same directory as this script
-import datetime
+import CourseSearch  # CourseSearch.py must also be in the same directory
+import OccupancyDashboard  # OccupancyDashboard.py must also be in this folder
+import SignInAnalytics  # SignInAnalytics.py must also be in the same directory
+import SignInService  # SignInService.py must also be in the same directory
+import SignInStorage  # SignInStorage.py must also be in the same directory
+import SignInTimings  # SignInTimings.py must also be in the same directory
+import StudentProfiles  # StudentProfiles.py must also be in the same directory
+import threading
+import time
 import tkinter as tk
 import tkinter.ttk as ttk
 import tkinter.messagebox as messagebox
-from openpyxl.utils.dataframe import dataframe_to_rows
-from openpyxl import load_workbook
-import pandas
+
+
+# The storage backend that sign-ins are saved to. Use "journal" to save each
+# sign-in to the append-only journal (exported to Masterfile.xlsx on request),
+# "workbook" to keep Masterfile.xlsx open and save it in batches, "sqlite" to
+# save each sign-in to an indexed SQLite database, or "remote" to send each
+# sign-in to the sign-in aggregation server shared by every login station (see
+# SignInServer.py). See SignInStorage.py for details.
+STORAGE_BACKEND = "journal"
+
+# Settings passed to the storage backend. For example, to send sign-ins to an
+# aggregation server on the computer named "tutor-center-server":
+#   STORAGE_OPTIONS = {"host": "tutor-center-server", "port": 8765}
+STORAGE_OPTIONS = {}
+
+# Fast-start mode. When True, the storage backend is opened just after the
+# window first appears instead of before it, so the login screen is ready as
+# soon as possible after the kiosk restarts. Heavy libraries (openpyxl) are
+# never loaded at startup; they are only imported when a spreadsheet is first
+# read or written.
+FAST_START = True
+
+# Course search mode. When True, students pick their course by typing part of
+# its number or name into a single search box. When False, they pick a course
+# prefix and then a course name from two drop-down menus. See CourseSearch.py
+# for details.
+COURSE_SEARCH = True
+
+# The folder the sign-ins of past semesters are moved to when the "workbook"
+# backend is used, so Masterfile.xlsx only holds the current semester. Set to
+# None to keep every sign-in in Masterfile.xlsx. See SignInArchive.py for
+# details.
+ARCHIVE = "SignInArchive"
+
+# The SQLite database holding the visit counts (per day, per hour and per
+# course) that are updated as each student signs in, so reports do not have
+# to read the whole sign-in history. Set to None to turn the rollups off. See
+# SignInAnalytics.py for details.
+ROLLUPS = "SignInRollups.db"
+
+# The SQLite database holding the major, class rank and last course of each
+# student who has signed in before, which are filled in as soon as a known
+# A-number is typed. Set to None to turn this off. See StudentProfiles.py for
+# details.
+PROFILES = "StudentProfiles.db"
+
+# Scanner mode. When True, students can sign in by swiping their card (or
+# scanning its barcode) on a USB card reader that types like a keyboard. A
+# scan is told apart from typing by how fast its keys arrive; the A-number is
+# read from the card, the student's last choices are filled in (see
+# `PROFILES`), and the student is signed in without pressing "Sign In".
+# Messages are shown below the buttons rather than in a message box, so the
+# next student can swipe straight away. See BadgeScanner.py for details.
+SCANNER_MODE = False
+
+# The key that opens the live occupancy dashboard, a read-only window for the
+# Tutor Center Supervisor showing how many students are signed in, the
+# arrivals this hour and in the last 15 minutes, and the top courses of the
+# day. It is kept up to date as students sign in and out, without reading
+# Masterfile.xlsx. Set to None to turn the dashboard off. See
+# OccupancyDashboard.py for details.
+DASHBOARD_KEY = "<Control-D>"
+
+# The file the timings of each stage of signing in (saving the sign-in,
+# loading and saving the Masterfile, showing the message box, and so on) are
+# saved to every `TIMINGS_MINUTES` minutes and when the login system closes,
+# to find out where the time goes when the login system feels slow. Use a
+# file ending in ".prom" for the Prometheus text format. Set to None to turn
+# the timings off. See SignInTimings.py for details.
+TIMINGS_FILE = "SignInTimings.json"
+TIMINGS_MINUTES = 1
+
+# The key that starts a cProfile capture of the login system, and saves it to
+# a SignInProfile-*.prof file when pressed again. Set to None to turn this off.
+PROFILE_KEY = "<Control-P>"
+
+# How often, in minutes, the login system signs out of the visits left open
+# past closing time (see `OPENING_HOURS` in SignInService.py).
+STALE_CHECK_MINUTES = 5
 
 
 class LoginSystem:
@@ -60,7 +145,12 @@ class LoginSystem:
         Widget for holding the label for course prefix.
     coursenamelabel : tkinter.ttk.Label
         Widget for holding the label for course name.
+    counters : OccupancyDashboard.OccupancyCounters
+        Counts the students signed in and the arrivals for the dashboard,
+        from each sign-in and sign-out saved by `service`.
     courses
+    dashboard : OccupancyDashboard.OccupancyDashboard or None
+        The live occupancy dashboard, if it is open (see `DASHBOARD_KEY`).
     friday_label : tkinter.ttk.Label
         Widget for holding a label explaining the Friday hours of the Tutor
         Center.
@@ -77,6 +167,9 @@ class LoginSystem:
         `major_menu`.
     name_menu : tkinter.OptionMenu
         An option menu containing all of the course prefixes in `name_options`.
+    name_menus : dict of tkinter.Menu
+        The menu of course names built for each course prefix, keyed by
+        prefix.
     name_options : CourseInfo
         Holds all of the options available to choose course name.
     name_selection : tkinter.StringVar
@@ -112,8 +205,23 @@ class LoginSystem:
         `rank_menu`.
     record_button : tkinter.Button
         Widget that creates a button to record the data input by the student.
+    scanner : BadgeScanner.BurstDetector or None
+        Tells cards swiped in scanner mode (see `SCANNER_MODE`) apart from
+        keys typed by hand.
+    service : SignInService.SignInService
+        Checks, timestamps and saves each sign-in recorded by `record_data`,
+        and each sign-out recorded by `sign_out`.
+    sign_out_button : tkinter.Button
+        Widget that creates a button to sign the student out of their visit.
     side_bar_title : tkinter.ttk.Label
         Widget for holding a label for the Tutor Center hours in the sidebar.
+    status_label : tkinter.ttk.Label
+        Widget for holding the messages shown in scanner mode.
+    storage : SignInStorage.StorageBackend
+        Saves each sign-in recorded by `record_data`.
+    timings : SignInTimings.SpanRecorder
+        Times each stage of `record_data` and `name_change` (see
+        `TIMINGS_FILE`).
     weekday_label : tkinter.ttk.Label
         Widget for holding a label explaining the Monday-Thursday hours of the
         Tutor Center.
@@ -124,6 +232,8 @@ class LoginSystem:
     See Also
     -----------
     CourseInfo.py : Module containing the class for storing course information.
+    SignInService.py : Module containing the sign-in logic.
+    SignInStorage.py : Module containing the classes for saving sign-ins.
 
     tkinter.Entry : Creates a widget for string entry.
     tkinter.Label : Creates a label widget.
@@ -141,12 +251,42 @@ class LoginSystem:
         # CourseInfo class that will be used in the dropdown menus in the GUI.
         self.master = master
         master.title("ENGR Tutor Center Login")
-        master.geometry("%dx%d+0+0" % (root.winfo_screenwidth(),
-                        root.winfo_screenheight()))
+        master.geometry("%dx%d+0+0" % (master.winfo_screenwidth(),
+                        master.winfo_screenheight()))
         master.configure(background="silver")
         master.iconbitmap('Logo.ico')
         self.courses = CourseInfo.CourseInfo()
 
+        # Sets up the timings of each stage of signing in, saved every
+        # `TIMINGS_MINUTES` minutes, and the key that starts and stops a
+        # cProfile capture (see `TIMINGS_FILE` and `PROFILE_KEY` above).
+        self.timings = SignInTimings.TIMINGS
+        self.timings.enabled = TIMINGS_FILE is not None
+        if TIMINGS_FILE is not None:
+            master.after(TIMINGS_MINUTES * 60000, self.dump_timings)
+        if PROFILE_KEY is not None:
+            master.bind_all(PROFILE_KEY, self.toggle_profile, add='+')
+
+        # Sets up the counters shown on the live occupancy dashboard, and the
+        # key that opens it (see `DASHBOARD_KEY` above). The counters are
+        # subscribed to the sign-in service when the storage backend opens,
+        # so they must exist first.
+        self.counters = OccupancyDashboard.OccupancyCounters()
+        self.dashboard = None
+        if DASHBOARD_KEY is not None:
+            master.bind_all(DASHBOARD_KEY, self.open_dashboard, add='+')
+
+        # Sets up the storage backend that every sign-in is saved to (see
+        # `STORAGE_BACKEND` and `FAST_START` above). The backend is closed
+        # when the window is closed, so that no sign-in is left unsaved.
+        self.storage = None
+        self.service = None
+        if FAST_START:
+            master.after_idle(self.open_storage)
+        else:
+            self.open_storage()
+        master.protocol("WM_DELETE_WINDOW", self.close)
+
         # Sets up the welcome banner from an image contained in the folder
         # where the GUI is stored.
         self.welcome_image = tk.PhotoImage(file="Welcome.gif")
@@ -167,6 +307,10 @@ class LoginSystem:
                                       background='silver',
                                       foreground='#0F2439')
         self.anumber_entry = ttk.Entry(master, background="white")
+        # Fills in the major, class rank and course of a returning student
+        # as soon as their A-number has been typed (see `fill_profile`).
+        self._filled = None
+        self.anumber_entry.bind('<KeyRelease>', self.fill_profile)
         self.majorlabel = ttk.Label(master,
                                     text="Major",
                                     font='Helvetica 20 bold',
@@ -205,6 +349,30 @@ class LoginSystem:
                                        foreground="white",
                                        command=self.record_data)
 
+        # Creates a button that will be used by the student to sign out when
+        # they leave, using the A-number in anumber_entry. The `sign_out`
+        # method will be run everytime this button is pressed.
+        self.sign_out_button = tk.Button(master, text="Sign Out",
+                                         font="Helvetica 16 bold",
+                                         background="#0F2439",
+                                         foreground="white",
+                                         command=self.sign_out)
+
+        # Sets up the label for the messages shown in scanner mode, and
+        # starts watching every keystroke for swiped cards (see `scan_key`).
+        self.status_label = ttk.Label(master, text="",
+                                      font='Helvetica 16 bold',
+                                      background='silver',
+                                      foreground='#0F2439')
+        self._status_job = None
+        self._scan_job = None
+        self._scan_widget = None
+        if SCANNER_MODE:
+            self.scanner = BadgeScanner.BurstDetector()
+            master.bind_all('<Key>', self.scan_key, add='+')
+        else:
+            self.scanner = None
+
         # Sets up the labels for the Tutor Center hours that will be shown in
         # the left sidebar with their text, font, background and foreground
         # colors.
@@ -241,7 +409,7 @@ class LoginSystem:
         # Major Selection Menu:
         # The majorvar variable is used for tracking the student's selection
         # of their major based on the major menu.
-        self.majorvar = tk.StringVar(root)
+        self.majorvar = tk.StringVar(master)
         self.majorvar.set(self.major_options[0])  # Sets a default major.
 
         # major_menu is the button that the student will interact with to
@@ -272,48 +440,60 @@ class LoginSystem:
                               highlightthickness=0)
         self.rank_menu["menu"].config(bg="white")
 
-        # Course Prefix Selection Menu:
-        # The prefixvar variable is used for tracking the student's selection
-        # of their course prefix based on the course prefix menu.
+        # Course Prefix and Course Name Selection:
+        # The prefixvar and namevar variables are used for tracking the
+        # student's selection of their course prefix and course name.
         self.prefixvar = tk.StringVar(master)
-        self.prefixvar.set(self.prefix_options[0])  # Sets a default.
-
-        # prefix_menu is the button that the student will interact with to
-        # select their course prefix. prefix_selection stores the value the
-        # student chooses for their course prefix.
-        self.prefix_menu = tk.OptionMenu(master, self.prefixvar,
-                                         *self.prefix_options)
-        self.prefix_selection = self.prefixvar.get()
-        self.prefix_menu.config(bg="white", font='Helvetica 12',
-                                foreground="#0F2439",
-                                highlightthickness=0)
-        self.prefix_menu["menu"].config(bg="white")
-
-        # Used to populate name_menu with the correct options, based on the
-        # course prefix. Links the chosen prefix to the list of possible
-        # courses using that prefix.
-        self.name_options = self.courses.populate_names(self.prefix_selection)
-
-        # Course Name Selection Menu:
-        # The namevar variable is used for tracking the student's selection
-        # of their course name based on the course name menu.
         self.namevar = tk.StringVar(master)
-        self.namevar.set(self.name_options[0])
-
-        # name_menu is the button that the student will interact with to
-        # select their course name. name_selection stores the value the
-        # student chooses for their course name.
-        self.name_menu = tk.OptionMenu(master, self.namevar,
-                                       *self.name_options)
-        self.name_menu.config(bg="white", font='Helvetica 12',
-                              foreground="#0F2439",
-                              highlightthickness=0)
-        self.name_menu["menu"].config(bg="white")
-        # A trace for prefixvar is set up here. This trace employs the method
-        # `name_change` everytime a new value is written (selected by the
-        # student, hence the "w" for write) to prefixvar.
-        self.prefixvar.trace("w", self.name_change)
-        self.name_selection = self.namevar.get()
+        if COURSE_SEARCH:
+            # course_search is the search box that the student will type into
+            # to find and select their course. It sets both prefixvar and
+            # namevar when a course is chosen.
+            self.courselabel.config(text="Course")
+            self.course_search = CourseSearch.CourseSearchBox(
+                master, self.courses.catalog, self.prefixvar, self.namevar,
+                font='Helvetica 12', width=50)
+        else:
+            # Course Prefix Selection Menu:
+            self.prefixvar.set(self.prefix_options[0])  # Sets a default.
+
+            # prefix_menu is the button that the student will interact with
+            # to select their course prefix. prefix_selection stores the value
+            # the student chooses for their course prefix.
+            self.prefix_menu = tk.OptionMenu(master, self.prefixvar,
+                                             *self.prefix_options)
+            self.prefix_selection = self.prefixvar.get()
+            self.prefix_menu.config(bg="white", font='Helvetica 12',
+                                    foreground="#0F2439",
+                                    highlightthickness=0)
+            self.prefix_menu["menu"].config(bg="white")
+
+            # Used to populate name_menu with the correct options, based on
+            # the course prefix. Links the chosen prefix to the list of
+            # possible courses using that prefix.
+            self.name_options = self.courses.populate_names(
+                self.prefix_selection)
+
+            # Course Name Selection Menu:
+            self.namevar.set(self.name_options[0])
+
+            # name_menu is the button that the student will interact with to
+            # select their course name. name_selection stores the value the
+            # student chooses for their course name.
+            self.name_menu = tk.OptionMenu(master, self.namevar,
+                                           *self.name_options)
+            self.name_menu.config(bg="white", font='Helvetica 12',
+                                  foreground="#0F2439",
+                                  highlightthickness=0)
+            self.name_menu["menu"].config(bg="white")
+            # name_menus keeps the menu of course names built for each prefix,
+            # starting with the menu built above for the default prefix.
+            self.name_menus = {self.prefix_selection: self.name_menu["menu"]}
+            # A trace for prefixvar is set up here. This trace employs the
+            # method `name_change` everytime a new value is written (selected
+            # by the student, hence the "w" for write) to prefixvar.
+            self.prefixvar.trace("w", self.name_change)
+            self.name_selection = self.namevar.get()
 
         # Creates an 8x5 grid in which to place each of the labels, buttons,
         # etc.
@@ -336,17 +516,25 @@ class LoginSystem:
         self.rank_menu.grid(row=3, column=2)
         self.weekend_label.grid(row=4, column=0)
         self.courselabel.grid(row=4, column=1)
-        self.prefix_menu.grid(row=4, column=2)
-        self.coursenamelabel.grid(row=5, column=1)
-        self.name_menu.grid(row=5, column=2)
+        if COURSE_SEARCH:
+            self.course_search.grid(row=4, column=2)
+        else:
+            self.prefix_menu.grid(row=4, column=2)
+            self.coursenamelabel.grid(row=5, column=1)
+            self.name_menu.grid(row=5, column=2)
         self.rank_sublabel.grid(row=6, column=1)
         self.record_button.grid(row=6, column=2)
+        self.sign_out_button.grid(row=6, column=3)
+        self.status_label.grid(row=7, column=1, columnspan=3)
 
     def name_change(self, *args):
         """Changes the list of options in `name_menu` based on user input.
 
-        The selected prefix is retrieved from `prefixvar` and a new set of
-        course names is populated and replaces the values in `name_menu`.
+        The selected prefix is retrieved from `prefixvar` and the menu of
+        course names for that prefix replaces the menu shown by `name_menu`.
+        The menu for each prefix is only built the first time that prefix is
+        chosen and is kept in `name_menus`, so switching back to a prefix only
+        swaps the menu rather than rebuilding it one course at a time.
 
         Returns
         -------
@@ -360,107 +548,502 @@ class LoginSystem:
 
         """
 
-        self.prefix_chosen = self.prefixvar.get()
-        self.new_names = self.courses.populate_names(self.prefix_chosen)
-        self.namevar.set(self.new_names[0])
-        # Deletes previous options in name_menu ...
-        self.name_menu['menu'].delete(0, 'end')
-        # ... and replaces them with the options in `new_names`.
-        for names in self.new_names:
-            self.name_menu['menu'].add_command(label=names,
-                                               command=tk._setit(self.namevar,
-                                                                 names))
+        span = self.timings.span
+        with span('name_change'):
+            with span('name_change.populate_names'):
+                self.prefix_chosen = self.prefixvar.get()
+                self.new_names = self.courses.populate_names(
+                    self.prefix_chosen)
+                self.namevar.set(self.new_names[0])
+            # Builds the menu of options in `new_names` the first time this
+            # prefix is chosen ...
+            if self.prefix_chosen not in self.name_menus:
+                with span('name_change.build_menu'):
+                    menu = tk.Menu(self.name_menu, tearoff=0, bg="white")
+                    for names in self.new_names:
+                        menu.add_command(label=names, command=tk._setit(
+                            self.namevar, names))
+                    self.name_menus[self.prefix_chosen] = menu
+            # ... and shows it in place of the previous menu in name_menu.
+            with span('name_change.configure'):
+                self.name_menu.configure(
+                    menu=self.name_menus[self.prefix_chosen])
         return self.name_menu
 
+    def open_storage(self):
+        """Opens the storage backend named by `STORAGE_BACKEND`.
+
+        The "workbook" backend is given the archive named by `ARCHIVE`. Also
+        creates the sign-in service (`service`) that saves sign-ins to the
+        storage backend and updates the rollups named by `ROLLUPS` and the
+        student profiles named by `PROFILES` (reading the profiles from the
+        saved sign-ins in the background the first time, see
+        `warm_profiles`), and starts reading the visits still open on a
+        background thread (see `visits_loaded`). The dashboard `counters`
+        are subscribed to the sign-in service. Does nothing if the storage
+        backend is already open.
+
+        Returns
+        -------
+        storage : SignInStorage.StorageBackend
+            The open storage backend.
+
+        See Also
+        --------
+        SignInStorage.open_storage : Creates a storage backend from its name.
+        SignInService.SignInService : Checks, timestamps and saves sign-ins.
+
+        """
+        if self.storage is None:
+            options = dict(STORAGE_OPTIONS)
+            if STORAGE_BACKEND == "workbook" and ARCHIVE is not None:
+                options.setdefault("archive", ARCHIVE)
+            self.storage = SignInStorage.open_storage(STORAGE_BACKEND,
+                                                       **options)
+            if ROLLUPS is None:
+                rollups = None
+            else:
+                rollups = SignInAnalytics.SignInRollups(ROLLUPS)
+            if PROFILES is None:
+                profiles = None
+            else:
+                profiles = StudentProfiles.StudentProfiles(PROFILES)
+                if not profiles.warmed:
+                    self.warm_profiles()
+            self.service = SignInService.SignInService(self.storage,
+                                                       self.courses.catalog,
+                                                       rollups=rollups,
+                                                       profiles=profiles)
+            self.service.subscribe(self.counters)
+            self.service.load_in_background()
+            self.visits_loaded(rollups)
+        return self.storage
+
+    def visits_loaded(self, rollups=None, retry=False):
+        """Finishes starting up once the open visits have been read.
+
+        The open visits are read on a background thread, so the login window
+        keeps responding while the storage backend loads. This checks every
+        200 ms until they have been read, then starts the dashboard
+        `counters` from them (and from the `rollups`, if given) and starts
+        signing out of the visits left open past closing time every
+        `STALE_CHECK_MINUTES` minutes. If the open visits could not be read,
+        they are read again on a background thread a minute later.
+
+        See Also
+        --------
+        SignInService.SignInService.load_in_background : Reads the visits.
+
+        """
+        if retry:
+            self.service.load_in_background()
+        if self.service.loading:
+            self.master.after(200, self.visits_loaded, rollups)
+            return
+        if self.service.load_error is not None:
+            self.master.after(60000, self.visits_loaded, rollups, True)
+            return
+        self.counters.seed(self.service.open_visits().values(), rollups)
+        self.close_stale()
+
+    def warm_profiles(self):
+        """Reads the student profiles from the saved sign-ins.
+
+        The whole sign-in history is read on a background thread, into a
+        second connection to the profile database named by `PROFILES`, so
+        the login window keeps responding however long the history is.
+        Students who sign in meanwhile still have their profiles saved, and
+        once the history has been read, an A-number already typed whose
+        profile was not found is looked up again.
+
+        Returns
+        -------
+        thread : threading.Thread
+            The thread reading the profiles.
+
+        See Also
+        --------
+        StudentProfiles.StudentProfiles.warm : Reads the profiles.
+
+        """
+        storage = self.storage
+
+        def warm():
+            profiles = StudentProfiles.StudentProfiles(PROFILES)
+            try:
+                profiles.warm(storage.iter_rows())
+            except Exception as error:
+                print("Could not read the student profiles from the "
+                      "saved sign-ins: %s" % error)
+            finally:
+                profiles.close()
+
+        thread = threading.Thread(target=warm, name='ProfileWarmer',
+                                  daemon=True)
+        thread.start()
+
+        # Tkinter may only be used from the main thread, so the window checks
+        # for the end of the thread rather than being told by it.
+        def check():
+            if thread.is_alive():
+                self.master.after(200, check)
+            else:
+                self.fill_profile()
+
+        self.master.after(200, check)
+        return thread
+
+    def fill_profile(self, event=None):
+        """Fills in the choices of a returning student from their A-number.
+
+        Once a 9-character A-number is typed into `anumber_entry`, the major,
+        class rank and course of that student's last sign-in are chosen in
+        the menus (and the course search box). This is only done once for
+        each A-number typed, so the student can still change any of the
+        choices before signing in.
+
+        See Also
+        --------
+        StudentProfiles.StudentProfiles.get : Looks up a student's profile.
+
+        Returns
+        -------
+        profile : StudentProfiles.StudentProfile or None
+            The profile filled in, if one was.
+
+        """
+        anumber = self.anumber_entry.get().strip()
+        if anumber == self._filled:
+            return None
+        self._filled = None
+        if (len(anumber) != 9 or self.service is None
+                or self.service.profiles is None):
+            return None
+        # An A-number with no profile is looked up again on the next key, as
+        # its profile may still be being read (see `warm_profiles`).
+        profile = self.service.profiles.get(anumber)
+        if profile is None:
+            return None
+        self._filled = anumber
+        if profile.major in self.major_options:
+            self.majorvar.set(profile.major)
+        if profile.class_rank in self.rank_options:
+            self.rankvar.set(profile.class_rank)
+        if COURSE_SEARCH:
+            self.course_search.choose(profile.course_name)
+        elif (profile.course_prefix in self.prefix_options
+              and profile.course_name in self.courses.populate_names(
+                  profile.course_prefix)):
+            # Setting prefixvar runs `name_change`, which chooses the first
+            # course under the prefix, so the course is chosen after it.
+            self.prefixvar.set(profile.course_prefix)
+            self.namevar.set(profile.course_name)
+        return profile
+
+    def scan_key(self, event):
+        """Passes a keystroke to `scanner`, and signs in any swiped card.
+
+        This runs for every key pressed in the window in scanner mode. The
+        time the key was pressed is taken from the event rather than the
+        clock, so keys typed by hand are not mistaken for a scan when the
+        window is slow to handle them.
+
+        See Also
+        --------
+        BadgeScanner.BurstDetector : Tells scans apart from typing.
+
+        """
+        if event.keysym in ('Return', 'KP_Enter'):
+            char = '\n'
+        elif event.char and event.char.isprintable():
+            char = event.char
+        else:
+            return
+        widget = self._scan_widget
+        payload = self.scanner.feed(char, event.time / 1000.0)
+        if len(self.scanner) == 1:
+            self._scan_widget = event.widget
+        if payload is not None:
+            self.scanned(payload, widget)
+
+        # Ends the scan once no key has followed for a while, for scanners
+        # that do not press Return at the end.
+        if self._scan_job is not None:
+            self.master.after_cancel(self._scan_job)
+            self._scan_job = None
+        if len(self.scanner):
+            self._scan_job = self.master.after(
+                int(self.scanner.max_gap * 1000) + 20, self._scan_idle)
+
+    def _scan_idle(self):
+        self._scan_job = None
+        payload = self.scanner.finish()
+        if payload is not None:
+            self.scanned(payload, self._scan_widget)
+
+    def scanned(self, payload, widget=None):
+        """Signs in the student whose card was swiped.
+
+        The characters the scanner typed are taken back out of the entry they
+        were typed into, and the A-number read from the card is put in
+        `anumber_entry`. If the student has signed in before, their last
+        choices are filled in and they are signed in straight away;
+        otherwise they are asked to choose their course.
+
+        Parameters
+        ------------
+        payload : str
+            The characters typed by the scanner, without the final Return.
+        widget : tkinter.Widget, optional
+            The widget the scanner typed into.
+
+        See Also
+        --------
+        BadgeScanner.parse_payload : Reads the A-number from a card.
+
+        """
+        if isinstance(widget, (tk.Entry, ttk.Entry)):
+            end = widget.index('insert')
+            widget.delete(max(0, end - len(payload)), end)
+            # The course search box also searched for what the scanner
+            # typed, so it is started again.
+            if COURSE_SEARCH and widget is self.course_search:
+                self.course_search.clear()
+        anumber = BadgeScanner.parse_payload(payload)
+        if anumber is None:
+            self.notify("Card Error", "Your card could not be read. Please "
+                        "try again or type your A-Number.")
+            return
+        self.open_storage()
+        self.anumber_entry.delete(0, 'end')
+        self.anumber_entry.insert(0, anumber)
+        self._filled = None
+        if self.fill_profile() is None:
+            self.notify("Welcome", "Please choose your major, class rank and "
+                        "course, then press Sign In.")
+            if COURSE_SEARCH:
+                self.course_search.focus_set()
+            return
+        self.record_data()
+
+    def notify(self, title, message):
+        """Shows a message to the student.
+
+        In scanner mode the message is shown in `status_label` for a few
+        seconds, so the next student can swipe straight away; otherwise it
+        is shown in a message box.
+
+        Parameters
+        ------------
+        title : str
+            The title of the message.
+        message : str
+            The message.
+
+        """
+        if not SCANNER_MODE:
+            messagebox.showinfo(title, message)
+            return
+        self.status_label.config(text="%s: %s" % (title, message))
+        if self._status_job is not None:
+            self.master.after_cancel(self._status_job)
+        self._status_job = self.master.after(
+            4000, lambda: self.status_label.config(text=""))
+
+    def open_dashboard(self, event=None):
+        """Opens the live occupancy dashboard, or brings it to the front.
+
+        The dashboard only shows `counters`, which are updated as each
+        student signs in or out, so it never reads Masterfile.xlsx.
+
+        Returns
+        -------
+        dashboard : OccupancyDashboard.OccupancyDashboard
+            The open dashboard.
+
+        See Also
+        --------
+        OccupancyDashboard.OccupancyDashboard : The dashboard window.
+
+        """
+        self.open_storage()
+        if self.dashboard is None or not self.dashboard.window.winfo_exists():
+            self.dashboard = OccupancyDashboard.OccupancyDashboard(
+                self.master, self.counters)
+        else:
+            self.dashboard.window.deiconify()
+            self.dashboard.window.lift()
+        return self.dashboard
+
+    def close_stale(self):
+        """Signs out of the visits left open past closing time.
+
+        Runs again every `STALE_CHECK_MINUTES` minutes while the login system
+        is open.
+
+        See Also
+        --------
+        SignInService.SignInService.close_stale : Signs out of stale visits.
+
+        """
+        self.service.close_stale()
+        self.master.after(STALE_CHECK_MINUTES * 60000, self.close_stale)
+
+    def dump_timings(self, reschedule=True):
+        """Saves the timings to `TIMINGS_FILE`.
+
+        Runs again every `TIMINGS_MINUTES` minutes while the login system is
+        open. A failure to save is printed rather than raised.
+
+        See Also
+        --------
+        SignInTimings.SpanRecorder.dump : Saves the timings.
+
+        """
+        try:
+            self.timings.dump(TIMINGS_FILE)
+        except OSError as error:
+            print("Could not save the timings to %s: %s"
+                  % (TIMINGS_FILE, error))
+        if reschedule:
+            self.master.after(TIMINGS_MINUTES * 60000, self.dump_timings)
+
+    def toggle_profile(self, event=None):
+        """Starts a cProfile capture, or stops it and saves it.
+
+        The capture is saved to SignInProfile-YYYYMMDD-HHMMSS.prof, named by
+        the time it was stopped.
+
+        Returns
+        -------
+        path : str or None
+            The file the capture was saved to, or None if a capture was
+            started.
+
+        See Also
+        --------
+        SignInTimings.SpanRecorder.start_profile : Starts a capture.
+
+        """
+        if not self.timings.profiling:
+            self.timings.start_profile()
+            self.notify("Profiling", "Profiling started. Press the same "
+                        "keys again to stop.")
+            return None
+        path = time.strftime("SignInProfile-%Y%m%d-%H%M%S.prof")
+        self.timings.stop_profile(path)
+        self.notify("Profiling", "Profile saved to %s." % path)
+        return path
+
+    def close(self):
+        """Saves any unsaved sign-ins and closes the login system window.
+
+        The timings are saved to `TIMINGS_FILE` once the storage backend has
+        saved everything, so the last save of the Masterfile is included, and
+        a cProfile capture still running is saved.
+
+        See Also
+        --------
+        SignInService.SignInService.close : Saves and closes the storage.
+
+        """
+        if self.storage is not None:
+            self.service.close()
+        if self.timings.profiling:
+            self.timings.stop_profile(
+                time.strftime("SignInProfile-%Y%m%d-%H%M%S.prof"))
+        if TIMINGS_FILE is not None:
+            self.dump_timings(reschedule=False)
+        self.master.destroy()
+
     def record_data(self):
         """Records data input by user into the GUI.
 
-        This method records the information that is input by the student and
-        saves it in the Masterfile.xlsx Excel spreadsheet. This spreadsheet
-        must be located in the same directory as this script. Please refer to
-        the documentation for the spreadsheet for questions of upkeep.
+        This method passes the information that is input by the student to
+        the sign-in service, which checks it, adds the date and time, and
+        saves it to `storage` (which can later be exported to the
+        Masterfile.xlsx Excel spreadsheet). Please refer to the documentation
+        for the spreadsheet for questions of upkeep.
 
         See Also
         --------
         tkinter.messagebox : Creates a messagebox widget to display text after
                              an event
 
-        datetime.datetime : Returns time and date information.
+        SignInService.SignInService.sign_in : Checks, timestamps and saves a
+                                              sign-in.
+        """
 
-        openpyxl.load_workbook : Loads Excel workbook for use in saving data
-        openpyxl.utils.datafram.dataframe_to_rows : Takes a dataframe and
-                                                    places it in a row on a
-                                                    spreadsheet.
+        # Gets all of the data given by the student and signs them in. The
+        # sign-in service checks that the A-number is correct (9 characters
+        # starting with "A" or "a") and that a course has been chosen, and
+        # then saves the sign-in along with the current date and time.
+        # Each stage is timed (see `TIMINGS_FILE`). The message box waits
+        # for the student to close it, so it is timed on its own.
+        span = self.timings.span
+        with span('record_data.open_storage'):
+            self.open_storage()
+        try:
+            with span('record_data.sign_in'):
+                self.data = self.service.sign_in(self.anumber_entry.get(),
+                                                 self.majorvar.get(),
+                                                 self.rankvar.get(),
+                                                 self.prefixvar.get(),
+                                                 self.namevar.get())
 
-        pandas.DataFrame : Creates a dataframe (like a dictionary) for storing
-                           data.
-        """
+        # If the A-Number entered does not start with "A"/"a" or is not long
+        # enough, or no course was chosen, prompts the student to change their
+        # input.
+        except SignInService.SignInError as error:
+            with span('record_data.notify'):
+                self.notify(error.title, error.message)
+            return
 
-        # Checks if A-number input is correct by checking the string length and
-        # that the A-number field starts wth "A" or "a".
-        self.a_get = self.anumber_entry.get()
-        self.a_length = len(self.anumber_entry.get())
-        if self.a_length == 9 and (self.a_get.startswith('A')
-                                   or self.a_get.startswith('a')):
-
-            # Grabs information for the current date and time. This data is
-            # then saved as a full date in the form of `Day of the Week`,
-            # `Month` `Day`, `Year` in the full_date variable. The day of the
-            # week is stored (Mon-Sun), as well as the time that the student
-            # entered the Tutor Center (Hour:Minutes AM/PM).
-            self.date_and_time = datetime.datetime.now()
-            self.full_date = self.date_and_time.strftime("%A,%B %d,%Y")
-            self.day_of_week = self.date_and_time.strftime("%A")
-            self.timein = self.date_and_time.strftime("%I:%M %p")
-
-            # Loads the Masterfile spreadsheet and selects the active sheet to
-            # record the student's data.
-            self.wb = load_workbook('Masterfile.xlsx')
-            self.ws = self.wb["Main Data"]
-
-            # Gets all of the data given by the student, saves it as a pandas
-            # dataframe (dictionary_like), and then adds the values to the
-            # current worksheet in Masterfile.xlsx.
-            self.a_number = self.anumber_entry.get()
-            self.major = self.majorvar.get()
-            self.class_rank = self.rankvar.get()
-            self.course_prefix = self.prefixvar.get()
-            self.course_name = self.namevar.get()
-            self.data = pandas.DataFrame({'Date': [self.full_date],
-                                          'Day': [self.day_of_week],
-                                          'Time In': [self.timein],
-                                          'Anumber': [self.a_number],
-                                          'Major': [self.major],
-                                          'Class Rank': [self.class_rank],
-                                          'Course Prefix':
-                                              [self.course_prefix],
-                                          'Course Name': [self.course_name],
-                                          }, columns=['Anumber', 'Class Rank',
-                                                      'Major', 'Course Prefix',
-                                                      'Course Name', 'Date',
-                                                      'Day', 'Time In'])
-            # Appends data to Masterfile.
-            for r in dataframe_to_rows(self.data,
-                                       index=False, header=False):
-                self.ws.append(r)
-
-            # Re-saves the Excel file full of data and clears the A-number from
-            # anumber_entry.
-            self.wb.save('Masterfile.xlsx')
+        # Clears the A-number from anumber_entry (and the course from
+        # course_search).
+        with span('record_data.clear'):
             self.anumber_entry.delete(0, 'end')
-            messagebox.showinfo("Login Confirmation", "Thank you!")
+            self._filled = None
+            if COURSE_SEARCH:
+                self.course_search.clear()
+        with span('record_data.notify'):
+            self.notify("Login Confirmation", "Thank you!")
 
-        # If the A-Number entered does not start with "A"/"a" or is not long
-        # enough, prompts the student to change their A-Number input.
-        else:
-            messagebox.showinfo("A-Number Error",
-                                "Please check your A-Number and try again.")
+    def sign_out(self):
+        """Signs the student with the A-number entered out of their visit.
+
+        The sign-in service matches the A-number to the student's open visit
+        and saves the time they signed out to `storage`, along with the
+        sign-in.
+
+        See Also
+        --------
+        SignInService.SignInService.sign_out : Matches and saves a sign-out.
+
+        """
+        self.open_storage()
+        try:
+            visit = self.service.sign_out(self.anumber_entry.get())
+
+        # If the A-Number is not valid, or the student is not signed in,
+        # tells the student.
+        except SignInService.SignInError as error:
+            self.notify(error.title, error.message)
+            return
+
+        self.anumber_entry.delete(0, 'end')
+        self._filled = None
+        minutes = int((visit.signed_out - visit.signed_in).total_seconds()
+                      // 60)
+        self.notify("Sign-Out Confirmation",
+                    "Thank you! You were here for %d minutes." % minutes)
 
 
 # This section executes the GUI. It creates a root window for the application
 # to be run in, and then places all of the widgets and functionality defined
 # in the LoginSystem class in that root window. It then loops that root window
 # continuously until the user exits the window.
-root = tk.Tk()
-Login = LoginSystem(root)
-root.mainloop()
+if __name__ == '__main__':
+    root = tk.Tk()
+    Login = LoginSystem(root)
+    root.mainloop()
@@ -0,0 +1,93 @@
+# -*- coding: utf-8 -*-
+"""Benchmark of the returning-student profile lookup.
+
+This script fills a student profile database from a synthetic sign-in history
+(200,000 sign-ins by 30,000 students by default) in a single pass, as the
+login system does the first time it starts, and then measures how long
+`StudentProfiles.StudentProfiles.get` takes to look up a student, both for
+students already in memory and for students read from the database. Each
+lookup must take well under a millisecond.
+
+Notes
+------
+To run the benchmark, run this script from the command line:
+
+    python benchmarks/ProfileBenchmark.py
+
+"""
+
+import argparse
+import datetime
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+
+# Lets this script find the login system modules in the folder above it.
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import SignInStorage  # noqa: E402
+import StudentProfiles  # noqa: E402
+from SignInBenchmark import simulated_students  # noqa: E402
+
+
+def history(count, students, seed=0):
+    """Yields `count` sign-ins by `students` different students."""
+    generator = random.Random(seed)
+    anumbers = ['A%08d' % number for number in range(students)]
+    when = datetime.datetime(2015, 8, 24, 8, 0)
+    for student in simulated_students(count, seed):
+        yield SignInStorage.SignInRecord(generator.choice(anumbers),
+                                         student[2], student[1], student[3],
+                                         student[4], when)
+        when += datetime.timedelta(minutes=1)
+
+
+def time_lookups(profiles, anumbers):
+    """Returns the sorted times, in seconds, of looking up each A-number."""
+    times = []
+    for anumber in anumbers:
+        start = time.perf_counter()
+        profiles.get(anumber)
+        times.append(time.perf_counter() - start)
+    times.sort()
+    return times
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--signins', type=int, default=200000,
+                        help="number of sign-ins in the synthetic history")
+    parser.add_argument('--students', type=int, default=30000,
+                        help="number of different students")
+    parser.add_argument('--lookups', type=int, default=10000,
+                        help="number of lookups to time")
+    arguments = parser.parse_args()
+
+    folder = tempfile.mkdtemp(prefix='profile-benchmark-')
+    try:
+        profiles = StudentProfiles.StudentProfiles(
+            os.path.join(folder, 'StudentProfiles.db'))
+        start = time.perf_counter()
+        count = profiles.warm(history(arguments.signins, arguments.students))
+        print("warm: %.2f s for %d sign-ins, %d students"
+              % (time.perf_counter() - start, arguments.signins, count))
+
+        generator = random.Random(1)
+        anumbers = ['A%08d' % generator.randrange(arguments.students)
+                    for _ in range(arguments.lookups)]
+        # The database is opened again, so the first lookups read from the
+        # database; looking up the same students again finds them in memory.
+        profiles.close()
+        profiles = StudentProfiles.StudentProfiles(
+            os.path.join(folder, 'StudentProfiles.db'),
+            capacity=arguments.lookups)
+        for label in ('database', 'memory'):
+            times = time_lookups(profiles, anumbers)
+            print("%-8s median: %.4f ms  p99: %.4f ms  slowest: %.4f ms"
+                  % (label, times[len(times) // 2] * 1000,
+                     times[int(len(times) * 0.99)] * 1000, times[-1] * 1000))
+        profiles.close()
+    finally:
+        shutil.rmtree(folder)
@@ -0,0 +1,90 @@
+# -*- coding: utf-8 -*-
+"""Micro-benchmark of building a single sign-in record.
+
+This script compares the time `LoginSystem.record_data` (TCLogin.py) spends
+turning the values entered by a student into the row handed to storage. The
+"before" case is the original approach of building a one-row pandas DataFrame
+and passing it through `openpyxl.utils.dataframe.dataframe_to_rows`; the
+"after" case builds a `SignInStorage.SignInRecord` directly. Neither case
+writes anything to disk, so only the cost of building the row is measured.
+
+Notes
+------
+To run the benchmark, run this script from the command line:
+
+    python benchmarks/RecordBenchmark.py
+
+The "before" case needs pandas and openpyxl and is skipped if either is not
+installed.
+
+"""
+
+import argparse
+import datetime
+import os
+import sys
+import timeit
+
+# Lets this script find SignInStorage.py in the folder above it.
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import SignInStorage  # noqa: E402
+
+# The values entered by a typical student.
+VALUES = ('A01234567', 'Junior', 'MEEN/AERO', 'MAE',
+          'MAE 2300: Thermodynamics 1', 'Monday,October 01,2018', 'Monday',
+          '10:15 AM')
+
+# The time of the same sign-in, as saved by the storage backends.
+SIGNED_IN = datetime.datetime(2018, 10, 1, 10, 15)
+
+# The 8 columns of the "Main Data" sheet when `record_data` built its rows
+# with a DataFrame, before the sign-out columns were added to
+# `SignInStorage.COLUMNS`, so the "before" case times the original path.
+ORIGINAL_COLUMNS = ['Anumber', 'Class Rank', 'Major', 'Course Prefix',
+                    'Course Name', 'Date', 'Day', 'Time In']
+
+
+def dataframe_row():
+    """Builds the row the way `record_data` originally did."""
+    import pandas
+    from openpyxl.utils.dataframe import dataframe_to_rows
+
+    data = pandas.DataFrame({'Date': [VALUES[5]],
+                             'Day': [VALUES[6]],
+                             'Time In': [VALUES[7]],
+                             'Anumber': [VALUES[0]],
+                             'Major': [VALUES[2]],
+                             'Class Rank': [VALUES[1]],
+                             'Course Prefix': [VALUES[3]],
+                             'Course Name': [VALUES[4]],
+                             }, columns=ORIGINAL_COLUMNS)
+    return [r for r in dataframe_to_rows(data, index=False, header=False)]
+
+
+def record_row():
+    """Builds the record the way `record_data` does now."""
+    return SignInStorage.SignInRecord(*VALUES[:5], SIGNED_IN)
+
+
+def measure(function, number):
+    """Returns the best time per call, in microseconds, of five runs."""
+    return min(timeit.repeat(function, number=number, repeat=5)) / number * 1e6
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--number', type=int, default=2000,
+                        help="sign-ins to build in each timing run")
+    arguments = parser.parse_args()
+
+    after = measure(record_row, arguments.number * 100)
+    try:
+        before = measure(dataframe_row, arguments.number)
+    except ImportError as error:
+        print("before (DataFrame + dataframe_to_rows): skipped (%s)" % error)
+        print("after (SignInRecord): %.3f us per sign-in" % after)
+    else:
+        print("before (DataFrame + dataframe_to_rows): %.3f us per sign-in"
+              % before)
+        print("after (SignInRecord): %.3f us per sign-in" % after)
+        print("speed-up: %.0fx" % (before / after))
@@ -0,0 +1,113 @@
+# -*- coding: utf-8 -*-
+"""Benchmark of the card swipe detection, using made-up keystroke streams.
+
+This script builds a stream of keystrokes like the one a busy login station
+sees in scanner mode: a card swiped every one to two seconds (typed by the
+scanner a few milliseconds per character, in several card formats, with and
+without a final Return), with students typing their A-numbers by hand in
+between. The stream is passed through `BadgeScanner.BurstDetector` as the
+login system does, and the script reports how many swipes were read, whether
+any typing was mistaken for a swipe, and how long each keystroke took to
+handle.
+
+Notes
+------
+To run the benchmark, run this script from the command line:
+
+    python benchmarks/ScannerBenchmark.py --swipes 1000
+
+"""
+
+import argparse
+import os
+import random
+import sys
+import time
+
+# Lets this script find BadgeScanner.py in the folder above it.
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import BadgeScanner  # noqa: E402
+
+# The ways a card can hold an A-number, as typed by the scanner.
+FORMATS = ['%s',
+           '%%%s^STUDENT/TEST^?',
+           ';%s=2605?',
+           '%%%s^STUDENT/TEST^?;%s=2605?']
+
+
+def keystrokes(swipes, seed=0):
+    """Returns a made-up stream of keystrokes and the A-numbers swiped.
+
+    Returns
+    -------
+    stream : list of tuple
+        Each keystroke as (character, time in seconds). A time of None asks
+        for the burst to be finished, as the login system does once no key
+        has followed for a while.
+    swiped : list of str
+        The A-number on each card swiped, in order.
+
+    """
+    generator = random.Random(seed)
+    stream = []
+    swiped = []
+    now = 0.0
+    for _ in range(swipes):
+        anumber = 'A%08d' % generator.randrange(10 ** 8)
+        swiped.append(anumber)
+        # Track 2 of a magnetic stripe only holds the digits.
+        card = generator.choice(FORMATS)
+        if card.count('%s') == 2:
+            payload = card % (anumber, anumber[1:])
+        elif card.startswith(';'):
+            payload = card % anumber[1:]
+        else:
+            payload = card % anumber
+        for char in payload:
+            stream.append((char, now))
+            now += generator.uniform(0.002, 0.012)
+        if generator.random() < 0.8:
+            stream.append(('\n', now))
+        else:
+            stream.append(('', None))
+
+        # A student types their A-number by hand before the next swipe.
+        now += generator.uniform(0.2, 0.4)
+        if generator.random() < 0.5:
+            for char in 'A%08d\n' % generator.randrange(10 ** 8):
+                stream.append((char, now))
+                now += generator.uniform(0.06, 0.25)
+        now += generator.uniform(1.0, 2.0) - 0.3
+    return stream, swiped
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--swipes', type=int, default=1000,
+                        help="number of cards swiped")
+    arguments = parser.parse_args()
+
+    stream, swiped = keystrokes(arguments.swipes)
+    detector = BadgeScanner.BurstDetector()
+    read = []
+    times = []
+    for char, when in stream:
+        start = time.perf_counter()
+        if when is None:
+            payload = detector.finish()
+        else:
+            payload = detector.feed(char, when)
+        if payload is not None:
+            read.append(BadgeScanner.parse_payload(payload))
+        times.append(time.perf_counter() - start)
+    payload = detector.finish()
+    if payload is not None:
+        read.append(BadgeScanner.parse_payload(payload))
+
+    times.sort()
+    print("keystrokes: %d" % len(stream))
+    print("swipes: %d, read: %d, read correctly: %d"
+          % (len(swiped), len(read),
+             sum(1 for a, b in zip(swiped, read) if a == b)))
+    print("median: %.4f ms  slowest: %.4f ms"
+          % (times[len(times) // 2] * 1000, times[-1] * 1000))
@@ -0,0 +1,72 @@
+# -*- coding: utf-8 -*-
+"""Benchmark of the type-ahead course search.
+
+This script builds a synthetic course catalog (10,000 courses by default) and
+measures how long `CourseSearch.CourseIndex.search` takes for each keystroke
+of a set of typical queries. The course search must keep up with typing, so
+the slowest keystroke should stay under 10 ms.
+
+Notes
+------
+To run the benchmark, run this script from the command line:
+
+    python benchmarks/SearchBenchmark.py
+
+"""
+
+import argparse
+import os
+import random
+import sys
+import time
+
+# Lets this script find CourseInfo.py and CourseSearch.py in the folder above
+# it.
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import CourseInfo  # noqa: E402
+import CourseSearch  # noqa: E402
+
+PREFIXES = ['ACCT', 'BENG', 'BIOL', 'CEE', 'CHEM', 'CS', 'ECE', 'ENGL',
+            'ENGR', 'HIST', 'MAE', 'MATH', 'PHYS', 'STAT']
+WORDS = ['Intro', 'Advanced', 'Thermodynamics', 'Fluid', 'Systems', 'Design',
+         'Analysis', 'Methods', 'Engineering', 'Biology', 'Organic',
+         'Mechanics', 'Circuits', 'Calculus', 'Statistics', 'Writing']
+QUERIES = ['mae 2300', 'thermodynamics', 'engineering design', '1210',
+           'cs 14', 'intro to']
+
+
+def synthetic_catalog(size, seed=0):
+    """Returns a CourseCatalog of `size` made-up courses."""
+    generator = random.Random(seed)
+    courses = {}
+    for number in range(size):
+        prefix = generator.choice(PREFIXES)
+        name = ' '.join(generator.choice(WORDS) for _ in range(3))
+        courses.setdefault(prefix, []).append(
+            '%s %04d: %s' % (prefix, number % 10000, name))
+    return CourseInfo.CourseCatalog(courses)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--courses', type=int, default=10000,
+                        help="number of courses in the synthetic catalog")
+    arguments = parser.parse_args()
+
+    catalog = synthetic_catalog(arguments.courses)
+    start = time.perf_counter()
+    index = CourseSearch.CourseIndex(catalog)
+    print("index build: %.1f ms for %d courses"
+          % ((time.perf_counter() - start) * 1000, len(catalog)))
+
+    times = []
+    for query in QUERIES:
+        # Searches for every prefix of the query, as if it were being typed.
+        for end in range(1, len(query) + 1):
+            start = time.perf_counter()
+            index.search(query[:end])
+            times.append(time.perf_counter() - start)
+    times.sort()
+    print("keystrokes: %d" % len(times))
+    print("median: %.3f ms" % (times[len(times) // 2] * 1000))
+    print("slowest: %.3f ms" % (times[-1] * 1000))
@@ -0,0 +1,150 @@
+# -*- coding: utf-8 -*-
+"""Throughput benchmark of the sign-in path, without the GUI.
+
+This script drives simulated sign-ins through `SignInService.SignInService`
+(the same code the login system GUI uses when "Sign In" is pressed) as fast
+as it can, and reports how many sign-ins per second each storage backend can
+save. It then signs every simulated student out again, with all of their
+visits open, and reports the sign-outs per second the same way. It does not
+need a display, so it can be run on a headless server.
+
+Notes
+------
+To run the benchmark, run this script from the command line:
+
+    python benchmarks/SignInBenchmark.py --backend journal sqlite
+
+Each backend writes to a new temporary folder, which is deleted afterwards.
+The "workbook" backend needs a copy of Masterfile.xlsx, which is taken from
+the folder above this script. The "remote" backend sends its sign-ins to a
+sign-in aggregation server (SignInServer.py) run on the loopback address for
+the benchmark, which saves them to a SQLite database in the same folder; its
+times include waiting for the server to confirm every batch was stored.
+
+"""
+
+import argparse
+import datetime
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+
+# Lets this script find the login system modules in the folder above it.
+PACKAGE = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, PACKAGE)
+import CourseInfo  # noqa: E402
+import SignInServer  # noqa: E402
+import SignInService  # noqa: E402
+import SignInStorage  # noqa: E402
+
+
+def simulated_students(count, seed=0):
+    """Yields the entries of `count` simulated sign-ins.
+
+    Each sign-in is a tuple of (A-number, major, class rank, course prefix,
+    course name), picked at random from the course catalog.
+
+    """
+    generator = random.Random(seed)
+    info = CourseInfo.CourseInfo
+    for _ in range(count):
+        prefix = generator.choice(info.prefixoptions)
+        yield ('A%08d' % generator.randrange(10 ** 8),
+               generator.choice(info.majoroptions),
+               generator.choice(info.rankoptions),
+               prefix,
+               generator.choice(info.catalog.courses(prefix)))
+
+
+def open_backend(kind, folder, port=None):
+    """Opens a storage backend of the given kind inside `folder`.
+
+    The "remote" backend sends its sign-ins to the server on `port` of the
+    loopback address.
+
+    """
+    if kind == 'remote':
+        return SignInStorage.RemoteStorage(
+            '127.0.0.1', port, directory=os.path.join(folder, 'Outbox'))
+    if kind == 'journal':
+        return SignInStorage.JournalStorage(os.path.join(folder, 'Journal'))
+    if kind == 'sqlite':
+        return SignInStorage.SQLiteStorage(os.path.join(folder, 'SignIns.db'))
+    if kind == 'workbook':
+        workbook = os.path.join(folder, 'Masterfile.xlsx')
+        shutil.copy(os.path.join(PACKAGE, 'Masterfile.xlsx'), workbook)
+        return SignInStorage.WorkbookStorage(
+            workbook, log_directory=os.path.join(folder, 'MasterfileLog'))
+    raise ValueError("Unknown storage backend: %r" % kind)
+
+
+def run(kind, count):
+    """Signs `count` simulated students in and out again.
+
+    Both times include saving the sign-ins or sign-outs still waiting to be
+    saved (by the "workbook" backend) or sent (by the "remote" backend).
+
+    Returns
+    -------
+    elapsed : tuple of float
+        The seconds taken by the sign-ins and by the sign-outs.
+
+    """
+    folder = tempfile.mkdtemp(prefix='signin-benchmark-')
+    server = None
+    try:
+        if kind == 'remote':
+            server = SignInServer.serve_in_thread(SignInStorage.SQLiteStorage(
+                os.path.join(folder, 'Server.db')))
+        service = SignInService.SignInService(
+            open_backend(kind, folder, server and server.port),
+            CourseInfo.CourseInfo.catalog)
+        when = datetime.datetime(2018, 10, 1, 8, 0)
+        students = list(simulated_students(count))
+        start = time.perf_counter()
+        for student in students:
+            service.sign_in(*student, when=when)
+        if kind == 'workbook':
+            service.storage.flush()
+        elif kind == 'remote':
+            while service.storage.pending():
+                time.sleep(0.001)
+        signed_in = time.perf_counter() - start
+        visits = list(service.open_visits())
+        when += datetime.timedelta(hours=1)
+        start = time.perf_counter()
+        for anumber in visits:
+            service.sign_out(anumber, when=when)
+        service.close()
+        elapsed = signed_in, time.perf_counter() - start
+        if server is not None and server.server.received != count:
+            raise RuntimeError("the server stored %d of %d sign-ins"
+                               % (server.server.received, count))
+        return elapsed
+    finally:
+        if server is not None:
+            server.stop()
+            server.server.storage.close()
+        shutil.rmtree(folder)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--backend', nargs='+', default=['journal', 'sqlite'],
+                        choices=['journal', 'sqlite', 'workbook', 'remote'],
+                        help="storage backends to benchmark")
+    parser.add_argument('--count', type=int, default=5000,
+                        help="number of simulated sign-ins")
+    arguments = parser.parse_args()
+
+    for kind in arguments.backend:
+        signed_in, signed_out = run(kind, arguments.count)
+        print("%-8s %d sign-ins in %.2f s: %.0f sign-ins per second"
+              % (kind, arguments.count, signed_in,
+                 arguments.count / signed_in))
+        print("%-8s %d sign-outs in %.2f s: %.0f sign-outs per second"
+              % (kind, arguments.count, signed_out,
+                 arguments.count / signed_out))
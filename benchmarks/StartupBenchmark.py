@@ -0,0 +1,208 @@
+# -*- coding: utf-8 -*-
+"""Startup budget check for the Tutor Center login system.
+
+This script measures how long the login system (TCLogin.py) takes to start,
+and exits with an error if it is over budget. It makes two measurements, each
+in a fresh Python process so that nothing is already imported:
+
+1. An import-time report (the same as `python -X importtime`) for importing
+   TCLogin. The check fails if a heavy library that should only be loaded on
+   the first spreadsheet read or write (`DEFERRED_MODULES`) is imported at
+   startup, or if importing takes longer than `--import-budget`.
+2. The time from starting Python to the login window being drawn and ready for
+   input. The check fails if this takes longer than `--window-budget`. This
+   measurement is skipped if there is no display (for example, on a headless
+   build server).
+
+Before timing the window, the login window is also built once with
+`FAST_START` turned off and once with it turned on, with its sign-ins, rollups
+and profiles kept in a temporary folder, and the check fails if either mode
+cannot start. This is also skipped if there is no display.
+
+Notes
+------
+To run the check, run this script from the command line:
+
+    python benchmarks/StartupBenchmark.py
+
+Add `--report` to also print the slowest imports.
+
+"""
+
+import argparse
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+# The folder holding TCLogin.py.
+PACKAGE = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Libraries that must not be imported before the window appears.
+DEFERRED_MODULES = ['pandas', 'numpy', 'openpyxl']
+
+# Run in the child process to time the window. Prints "ready" once the window
+# has been drawn, or "no display" if a window cannot be created.
+WINDOW_SCRIPT = """
+import tkinter as tk
+try:
+    root = tk.Tk()
+except tk.TclError:
+    print("no display", flush=True)
+    raise SystemExit
+import TCLogin
+TCLogin.LoginSystem(root)
+root.update()
+print("ready", flush=True)
+root.destroy()
+"""
+
+# Run in the child process to build the login window in one startup mode,
+# given as the first argument ("fast" or "slow"), with its files kept in the
+# folder given as the second. Prints "ready" once the storage backend has
+# opened, or "no display" if a window cannot be created.
+BUILD_SCRIPT = """
+import os
+import sys
+import tkinter as tk
+try:
+    root = tk.Tk()
+except tk.TclError:
+    print("no display", flush=True)
+    raise SystemExit
+import TCLogin
+folder = sys.argv[2]
+TCLogin.FAST_START = sys.argv[1] == 'fast'
+TCLogin.STORAGE_BACKEND = 'journal'
+TCLogin.STORAGE_OPTIONS = {'directory': os.path.join(folder, 'journal')}
+TCLogin.ROLLUPS = os.path.join(folder, 'rollups.db')
+TCLogin.PROFILES = os.path.join(folder, 'profiles.db')
+TCLogin.TIMINGS_FILE = None
+login = TCLogin.LoginSystem(root)
+root.update()
+if login.service is None:
+    raise SystemExit("the storage backend was not opened")
+print("ready", flush=True)
+login.close()
+"""
+
+
+def build_check(mode):
+    """Builds the login window in a new process in one startup mode.
+
+    Parameters
+    ------------
+    mode : str
+        "fast" to build it with `FAST_START` turned on, or "slow" to build it
+        with `FAST_START` turned off.
+
+    Returns
+    -------
+    problem : str or None
+        What went wrong, None if the window was built, or "no display" if
+        there is no display to build it on.
+
+    """
+    with tempfile.TemporaryDirectory() as folder:
+        result = subprocess.run([sys.executable, '-c', BUILD_SCRIPT, mode,
+                                 folder], cwd=PACKAGE, capture_output=True,
+                                text=True)
+    status = result.stdout.strip().splitlines()
+    if status and status[0] in ('ready', 'no display'):
+        return None if status[0] == 'ready' else status[0]
+    lines = result.stderr.strip().splitlines()
+    return lines[-1] if lines else "exited with %d" % result.returncode
+
+
+def import_report():
+    """Imports TCLogin in a new process and returns its import times.
+
+    Returns
+    -------
+    imports : list of (str, float, float)
+        The name, own time and cumulative time (in milliseconds) of every
+        module imported, in the order they finished importing.
+
+    """
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c',
+                             'import TCLogin'],
+                            cwd=PACKAGE, capture_output=True, text=True,
+                            check=True)
+    imports = []
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        own, cumulative, name = line[len('import time:'):].split('|')
+        imports.append((name.strip(), int(own) / 1000,
+                        int(cumulative) / 1000))
+    return imports
+
+
+def window_time():
+    """Returns the seconds from starting Python to the window being ready.
+
+    Returns None if there is no display to draw the window on.
+
+    """
+    start = time.perf_counter()
+    child = subprocess.Popen([sys.executable, '-c', WINDOW_SCRIPT],
+                             cwd=PACKAGE, stdout=subprocess.PIPE, text=True)
+    status = child.stdout.readline().strip()
+    elapsed = time.perf_counter() - start
+    child.wait()
+    if status != 'ready':
+        return None
+    return elapsed
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--import-budget', type=float, default=150.0,
+                        help="longest allowed import time, in milliseconds")
+    parser.add_argument('--window-budget', type=float, default=300.0,
+                        help="longest allowed time to an interactive window, "
+                             "in milliseconds")
+    parser.add_argument('--report', action='store_true',
+                        help="print the slowest imports")
+    arguments = parser.parse_args()
+    failures = []
+
+    imports = import_report()
+    total = [cumulative for name, own, cumulative in imports
+             if name == 'TCLogin'][0]
+    print("import TCLogin: %.1f ms (budget %.0f ms)"
+          % (total, arguments.import_budget))
+    if total > arguments.import_budget:
+        failures.append("importing TCLogin is over budget")
+    for name, own, cumulative in imports:
+        if name.split('.')[0] in DEFERRED_MODULES:
+            failures.append("%s is imported at startup" % name)
+    if arguments.report:
+        for name, own, cumulative in sorted(imports, key=lambda i: -i[1])[:15]:
+            print("    %8.2f ms  %s" % (own, name))
+
+    for mode in ('slow', 'fast'):
+        problem = build_check(mode)
+        label = "login window (FAST_START = %s)" % (mode == 'fast')
+        if problem is None:
+            print("%s: started" % label)
+        elif problem == 'no display':
+            print("%s: skipped (no display)" % label)
+        else:
+            print("%s: FAILED (%s)" % (label, problem))
+            failures.append("the login window cannot start with FAST_START "
+                            "= %s" % (mode == 'fast'))
+
+    elapsed = window_time()
+    if elapsed is None:
+        print("interactive window: skipped (no display)")
+    else:
+        print("interactive window: %.1f ms (budget %.0f ms)"
+              % (elapsed * 1000, arguments.window_budget))
+        if elapsed * 1000 > arguments.window_budget:
+            failures.append("the window is over budget")
+
+    for failure in failures:
+        print("FAILED: " + failure)
+    sys.exit(1 if failures else 0)
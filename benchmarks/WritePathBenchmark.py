@@ -0,0 +1,284 @@
+# -*- coding: utf-8 -*-
+"""Benchmark suite for the sign-in write path across storage sizes.
+
+This script measures how the cost of saving a sign-in grows with the amount of
+sign-in history already stored. For each history size (1k, 10k, 100k and 500k
+rows by default) it seeds a synthetic history, then saves a number of new
+sign-ins with each write path and records:
+
+* the p50 and p99 latency of a single sign-in, in milliseconds,
+* the peak resident memory (RSS) of the process, in megabytes, and
+* the bytes written per sign-in.
+
+The write paths are the original `record_data` approach ("legacy": load
+Masterfile.xlsx, append one row, save it again) and each storage backend in
+SignInStorage.py. Every case runs in its own Python process, so the peak
+memory of one case does not affect the next.
+
+Notes
+------
+To run the full suite and save the report, run this script from the command
+line:
+
+    python benchmarks/WritePathBenchmark.py --output report.json
+
+The legacy path re-saves the whole workbook for every sign-in, so at 500k rows
+each legacy sign-in takes about a minute; use `--sizes` and `--paths` to run
+part of the suite. Seeded histories are kept in `--cache` and reused by later
+runs. Bytes written are read from /proc/self/io where it exists (Linux), and
+are reported as null elsewhere.
+
+"""
+
+import argparse
+import datetime
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+# Lets this script find the login system modules in the folder above it.
+PACKAGE = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, PACKAGE)
+import SignInStorage  # noqa: E402
+from SignInBenchmark import simulated_students  # noqa: E402
+
+SIZES = [1000, 10000, 100000, 500000]
+PATHS = ['legacy', 'workbook', 'journal', 'sqlite']
+
+
+def history(count, seed=1):
+    """Yields `count` synthetic sign-in records, oldest first."""
+    when = datetime.datetime(2015, 8, 24, 8, 0)
+    step = datetime.timedelta(minutes=7)
+    for student in simulated_students(count, seed):
+        anumber, major, rank, prefix, name = student
+        yield SignInStorage.SignInRecord(anumber, rank, major, prefix, name,
+                                         when)
+        when += step
+
+
+def seed(path, rows, cache):
+    """Creates (or reuses) a stored history of `rows` sign-ins for a path.
+
+    Parameters
+    ------------
+    path : str
+        The write path the history is for (see `PATHS`).
+    rows : int
+        The number of sign-ins in the history.
+    cache : str
+        Folder the seeded histories are kept in.
+
+    Returns
+    -------
+    seeded : str
+        The seeded workbook, journal folder or database.
+
+    """
+    os.makedirs(cache, exist_ok=True)
+    if path in ('legacy', 'workbook'):
+        seeded = os.path.join(cache, 'Masterfile-%d.xlsx' % rows)
+        if not os.path.exists(seeded):
+            from openpyxl import load_workbook, Workbook
+
+            # Copies the sheets of the real Masterfile into a write-only
+            # workbook, which can be written row by row in little memory.
+            template = load_workbook(os.path.join(PACKAGE, 'Masterfile.xlsx'))
+            wb = Workbook(write_only=True)
+            for sheet in template:
+                ws = wb.create_sheet(sheet.title)
+                for row in sheet.iter_rows(values_only=True):
+                    ws.append(row)
+                if sheet.title == "Main Data":
+                    for record in history(rows):
+                        ws.append(SignInStorage.display_row(record))
+            wb.save(seeded + '.tmp')
+            os.replace(seeded + '.tmp', seeded)
+    elif path == 'journal':
+        seeded = os.path.join(cache, 'Journal-%d' % rows)
+        if not os.path.exists(seeded):
+            storage = SignInStorage.JournalStorage(seeded + '.tmp')
+            storage.extend(history(rows))
+            storage.close()
+            os.replace(seeded + '.tmp', seeded)
+    elif path == 'sqlite':
+        seeded = os.path.join(cache, 'SignIns-%d.db' % rows)
+        if not os.path.exists(seeded):
+            storage = SignInStorage.SQLiteStorage(seeded + '.tmp')
+            storage.extend(history(rows))
+            storage.connection.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+            storage.close()
+            os.replace(seeded + '.tmp', seeded)
+    else:
+        raise ValueError("Unknown write path: %r" % path)
+    return seeded
+
+
+def legacy_sign_in(workbook, record):
+    """Saves a sign-in the way `record_data` originally did."""
+    from openpyxl import load_workbook
+
+    wb = load_workbook(workbook)
+    wb["Main Data"].append(SignInStorage.display_row(record))
+    wb.save(workbook)
+
+
+def bytes_written():
+    """Returns the bytes this process has written so far, or None."""
+    try:
+        with open('/proc/self/io') as io:
+            for line in io:
+                if line.startswith('wchar:'):
+                    return int(line.split()[1])
+    except OSError:
+        return None
+    return None
+
+
+def peak_rss():
+    """Returns the peak resident memory of this process in MB, or None."""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS reports bytes.
+    if sys.platform == 'darwin':
+        return peak / 1048576
+    return peak / 1024
+
+
+def percentile(times, fraction):
+    """Returns the nearest-rank percentile of a sorted list of times."""
+    rank = max(0, min(len(times) - 1, int(round(fraction * len(times))) - 1))
+    return times[rank]
+
+
+def run_case(path, rows, signins, cache):
+    """Measures a single write path at a single history size.
+
+    The seeded history is copied to a temporary folder first, so the cached
+    copy is never changed.
+
+    Returns
+    -------
+    result : dict
+        The measurements for this case.
+
+    """
+    seeded = seed(path, rows, cache)
+    folder = tempfile.mkdtemp(prefix='write-path-benchmark-')
+    try:
+        target = os.path.join(folder, os.path.basename(seeded))
+        if os.path.isdir(seeded):
+            shutil.copytree(seeded, target)
+        else:
+            shutil.copy(seeded, target)
+
+        if path == 'legacy':
+            storage = None
+        elif path == 'workbook':
+            storage = SignInStorage.WorkbookStorage(
+                target, log_directory=os.path.join(folder, 'MasterfileLog'))
+            storage.flush()  # Waits for the workbook to be loaded.
+        elif path == 'journal':
+            storage = SignInStorage.JournalStorage(target)
+        else:
+            storage = SignInStorage.SQLiteStorage(target)
+
+        records = list(history(signins, seed=2))
+        times = []
+        written = bytes_written()
+        for record in records:
+            start = time.perf_counter()
+            if storage is None:
+                legacy_sign_in(target, record)
+            else:
+                storage.append(record)
+            times.append(time.perf_counter() - start)
+
+        # Closing saves anything still waiting to be written (the workbook
+        # backend saves in batches), so it is timed and reported separately.
+        start = time.perf_counter()
+        if storage is not None:
+            storage.close()
+        close_time = time.perf_counter() - start
+        if written is not None:
+            written = (bytes_written() - written) / signins
+    finally:
+        shutil.rmtree(folder)
+
+    times.sort()
+    return {'path': path,
+            'rows': rows,
+            'signins': signins,
+            'p50_ms': percentile(times, 0.50) * 1000,
+            'p99_ms': percentile(times, 0.99) * 1000,
+            'mean_ms': sum(times) / len(times) * 1000,
+            'close_ms': close_time * 1000,
+            'peak_rss_mb': peak_rss(),
+            'bytes_written_per_signin': written}
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sizes', type=int, nargs='+', default=SIZES,
+                        help="history sizes (rows) to measure")
+    parser.add_argument('--paths', nargs='+', default=PATHS, choices=PATHS,
+                        help="write paths to measure")
+    parser.add_argument('--signins', type=int, default=200,
+                        help="sign-ins to time for each storage backend")
+    parser.add_argument('--legacy-signins', type=int, default=5,
+                        help="sign-ins to time for the legacy path")
+    parser.add_argument('--cache', default=os.path.join(
+                            tempfile.gettempdir(), 'signin-benchmark-cache'),
+                        help="folder to keep the seeded histories in")
+    parser.add_argument('--output', help="file to save the JSON report to")
+    parser.add_argument('--case', nargs=2, metavar=('PATH', 'ROWS'),
+                        help=argparse.SUPPRESS)
+    arguments = parser.parse_args()
+
+    # Runs a single case and prints its result. This is how the suite runs
+    # each case in its own process.
+    if arguments.case:
+        path, rows = arguments.case[0], int(arguments.case[1])
+        signins = (arguments.legacy_signins if path == 'legacy'
+                   else arguments.signins)
+        print(json.dumps(run_case(path, rows, signins, arguments.cache)))
+        sys.exit(0)
+
+    results = []
+    for rows in arguments.sizes:
+        for path in arguments.paths:
+            output = subprocess.run(
+                [sys.executable, os.path.abspath(__file__),
+                 '--case', path, str(rows),
+                 '--signins', str(arguments.signins),
+                 '--legacy-signins', str(arguments.legacy_signins),
+                 '--cache', arguments.cache],
+                capture_output=True, text=True, check=True).stdout
+            result = json.loads(output)
+            results.append(result)
+            print("%-8s %7d rows  p50 %9.3f ms  p99 %9.3f ms  "
+                  "peak RSS %7.1f MB  %s bytes/sign-in"
+                  % (path, rows, result['p50_ms'], result['p99_ms'],
+                     result['peak_rss_mb'] or 0,
+                     'n/a' if result['bytes_written_per_signin'] is None
+                     else '%.0f' % result['bytes_written_per_signin']))
+
+    report = {'created': datetime.datetime.now().isoformat(),
+              'python': platform.python_version(),
+              'platform': platform.platform(),
+              'results': results}
+    if arguments.output:
+        with open(arguments.output, 'w') as file:
+            json.dump(report, file, indent=2)
+        print("Saved the report to %s." % arguments.output)